@@ -0,0 +1,51 @@
+# This is a comparison of the adaptive rho/z grid of modules/fluence_tools.py
+# with the uniform grids of the forward-solvers scripts for the two-layer SDA
+# fluence. The adaptive grid starts from 9x9 points and is refined to a log
+# fluence tolerance; uniform grids of increasing size are evaluated directly.
+# Each is resampled onto a 400x400 reference grid and the largest error of the
+# log fluence, the number of solver evaluations and the time are reported.
+#
+import sys
+import time
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (Array, Double, DoubleRange, IOpticalPropertyRegion, LayerOpticalPropertyRegion,
+                           OpticalProperties, SourceConfiguration, TwoLayerSDAForwardSolver)
+from fluence_tools import AdaptiveGrid, adaptive_fluence_of_rho_and_z, fluence_of_rho_and_z
+
+solver = TwoLayerSDAForwardSolver()
+solver.SourceConfiguration = SourceConfiguration.Distributed
+topLayerThickness = 5
+opRegions = Array.CreateInstance(IOpticalPropertyRegion, 2)
+opRegions[0] = LayerOpticalPropertyRegion(DoubleRange(0, topLayerThickness, 2), OpticalProperties(0.1, 1, 0.8, 1.4))
+opRegions[1] = LayerOpticalPropertyRegion(DoubleRange(topLayerThickness, Double.PositiveInfinity, 2), OpticalProperties(0.01, 1, 0.8, 1.4))
+
+referenceRhos = np.linspace(0.1, 19.9, 400)
+referenceZs = np.linspace(0.1, 19.9, 400)
+logReference = np.log(fluence_of_rho_and_z(solver, opRegions, referenceRhos, referenceZs))
+
+
+def max_log_error(grid):
+    return np.max(np.abs(np.log(grid.resample(referenceRhos, referenceZs)) - logReference))
+
+
+print("%-28s %12s %12s %12s" % ("grid", "evaluations", "time [s]", "max log error"))
+for size in [25, 50, 100, 200]:
+    rhos = np.linspace(0.1, 19.9, size)
+    zs = np.linspace(0.1, 19.9, size)
+    start_time = time.perf_counter()
+    fluence = fluence_of_rho_and_z(solver, opRegions, rhos, zs)
+    elapsed_time = time.perf_counter() - start_time
+    grid = AdaptiveGrid(rhos, zs, fluence, fluence.size, True)
+    print("%-28s %12d %12.4f %12.5f" % ("uniform %dx%d" % (size, size), grid.Evaluations, elapsed_time,
+                                        max_log_error(grid)))
+
+for tolerance in [0.05, 0.01, 0.002]:
+    start_time = time.perf_counter()
+    grid = adaptive_fluence_of_rho_and_z(solver, opRegions, np.linspace(0.1, 19.9, 9), np.linspace(0.1, 19.9, 9),
+                                         tolerance=tolerance)
+    elapsed_time = time.perf_counter() - start_time
+    print("%-28s %12d %12.4f %12.5f" % ("adaptive %g (%dx%d)" % (tolerance, len(grid.Rhos), len(grid.Zs)),
+                                        grid.Evaluations, elapsed_time, max_log_error(grid)))
@@ -0,0 +1,56 @@
+# This is a check and benchmark of the analytic Jacobian in modules/inversion_tools.py.
+# For [HbO2, Hb, H2O, A, b] at wavelengths=[400:50:1000]nm the chain-rule Jacobian
+# of the NumPy point source SDA R(rho) and R(fx) models is compared with central
+# finite differences, and the same spectra are then fitted with and without the
+# analytic Jacobian to compare the number of forward evaluations per fit.
+#
+import sys
+import time
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import ChromophoreType
+from spectral_tools import ChromophoreSpectra
+from diffusion_tools import SDAROfRhoModel, SDAROfFxModel
+from inversion_tools import fit_reflectance, spectral_jacobian
+
+wavelengths = 400.0 + 50 * np.arange(13)
+spectra = ChromophoreSpectra.from_vts([ChromophoreType.HbO2, ChromophoreType.Hb, ChromophoreType.H2O], wavelengths)
+measuredData = np.array([70.0, 30.0, 0.8, 1.2, 1.42])
+initialGuess = np.array([50.0, 40.0, 0.6, 1.0, 1.2])
+
+for name, model, positions in [("R(rho)", SDAROfRhoModel(), [1.0, 3.0]), ("R(fx)", SDAROfFxModel(), [0.0, 0.2])]:
+    def forward(x):
+        return model(spectra.mua(x[:3]), spectra.musp(x[3], x[4]), positions).ravel()
+    # analytic Jacobian versus central finite differences
+    _, dRdMua, dRdMusp = model.derivatives(spectra.mua(measuredData[:3]), spectra.musp(measuredData[3], measuredData[4]), positions)
+    analytic = spectral_jacobian(spectra, measuredData, dRdMua, dRdMusp)
+    finiteDifference = np.empty_like(analytic)
+    for k in range(len(measuredData)):
+        step = np.zeros(len(measuredData))
+        step[k] = 1e-6 * measuredData[k]
+        finiteDifference[:, k] = (forward(measuredData + step) - forward(measuredData - step)) / (2 * step[k])
+    print("%-6s max relative difference analytic vs finite differences: %.2e" % (
+          name, np.max(np.abs(analytic - finiteDifference)) / np.max(np.abs(finiteDifference))))
+    # forward evaluations per fit
+    measured = forward(measuredData).reshape(len(positions), -1)
+    class CountingModel(type(model)):
+        calls = 0
+        def __call__(self, *arguments):
+            CountingModel.calls += 1
+            return super().__call__(*arguments)
+        def derivatives(self, *arguments):
+            # R and both derivatives cost about one forward evaluation
+            CountingModel.calls += 1
+            return super().derivatives(*arguments)
+    countingModel = CountingModel(model.n)
+    for jacobianName, options in [("finite differences", {'jac': '2-point'}), ("analytic", {})]:
+        CountingModel.calls = 0
+        start_time = time.time()
+        fit = fit_reflectance(measured, spectra, positions, countingModel, initialGuess, **options)
+        elapsed_time = time.time() - start_time
+        # fit.nfev leaves out the finite difference evaluations, so count model calls
+        evaluations = CountingModel.calls
+        print("%-6s %-18s forward evaluations %4d, %.4f s, max parameter error %.2e%%" % (
+              name, jacobianName, evaluations, elapsed_time, 100 * np.max(np.abs(fit.x / measuredData - 1))))
@@ -0,0 +1,39 @@
+# This is a benchmark of converting VTS results between .NET arrays and NumPy.
+# It compares the per-element list comprehension used in the sample scripts,
+# e.g. [f for f in detectorResults[0].Mean], with the block copies in
+# modules/array_tools.py for 1-D (ROfRho-sized) and 2-D (FluenceOfRhoAndZ-sized)
+# arrays, and the reverse Array[Double](values.tolist()) conversion.
+#
+import sys
+import timeit
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import Array, Double
+from array_tools import to_numpy, to_dotnet
+
+def best_time(statement, repeat=5):
+    """Return the best wall time in seconds of a callable over several runs."""
+    return min(timeit.repeat(statement, number=1, repeat=repeat))
+
+print("%-28s %14s %14s %10s" % ("case", "per-element [s]", "block copy [s]", "speedup"))
+for rowCount, columnCount in [(1, 101), (1, 10000), (100, 100), (1000, 1000)]:
+    values = np.random.rand(rowCount, columnCount)
+    # .NET -> NumPy
+    if rowCount == 1:
+        netValues = to_dotnet(values[0])
+        perElement = best_time(lambda: np.array([v for v in netValues]))
+    else:
+        netValues = to_dotnet(values)
+        perElement = best_time(lambda: np.array([v for v in netValues]).reshape(rowCount, columnCount))
+    blockCopy = best_time(lambda: to_numpy(netValues))
+    assert np.array_equal(to_numpy(netValues).reshape(values.shape), values)
+    print("%-28s %14.6f %14.6f %9.1fx" % ("to_numpy %dx%d" % (rowCount, columnCount),
+          perElement, blockCopy, perElement / blockCopy))
+    # NumPy -> .NET
+    flatValues = values.ravel()
+    perElement = best_time(lambda: Array[Double](flatValues.tolist()))
+    blockCopy = best_time(lambda: to_dotnet(flatValues))
+    print("%-28s %14.6f %14.6f %9.1fx" % ("to_dotnet %dx%d" % (rowCount, columnCount),
+          perElement, blockCopy, perElement / blockCopy))
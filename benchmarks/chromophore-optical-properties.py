@@ -0,0 +1,53 @@
+# This is a benchmark and accuracy check of the NumPy chromophore engine in
+# modules/spectral_tools.py. Optical properties for a batch of random
+# [HbO2, Hb, H2O, A, b] parameter vectors are computed once per vector with
+# Tissue.GetOpticalProperties, as in the inverse-solutions scripts, and in one
+# batched call with ChromophoreSpectra. The largest relative difference in mua
+# and musp is reported along with the time of both paths.
+#
+import sys
+import time
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (Array, ChromophoreAbsorber, ChromophoreType, IChromophoreAbsorber, PowerLawScatterer,
+                           Tissue)
+from spectral_tools import ChromophoreSpectra
+
+chromophoreTypes = [ChromophoreType.HbO2, ChromophoreType.Hb, ChromophoreType.H2O]
+wavelengths = Array.CreateInstance(float, 13)
+for i in range(0, len(wavelengths)):
+    wavelengths[i] = 400.0 + 50 * i
+parameterCount = 1000
+rng = np.random.default_rng(0)
+concentrations = rng.uniform([10, 10, 0.5], [90, 50, 1.0], size=(parameterCount, 3))
+A = rng.uniform(0.5, 2.0, parameterCount)
+b = rng.uniform(0.5, 2.0, parameterCount)
+
+# reference: one Tissue per parameter vector
+start_time = time.time()
+muaTissue = np.empty((parameterCount, len(wavelengths)))
+muspTissue = np.empty((parameterCount, len(wavelengths)))
+for k in range(parameterCount):
+    chromophores = Array.CreateInstance(IChromophoreAbsorber, 3)
+    for j in range(3):
+        chromophores[j] = ChromophoreAbsorber(chromophoreTypes[j], concentrations[k, j])
+    ops = Tissue(chromophores, PowerLawScatterer(A[k], b[k]), "", n=1.4).GetOpticalProperties(wavelengths)
+    muaTissue[k] = [op.Mua for op in ops]
+    muspTissue[k] = [op.Musp for op in ops]
+tissueTime = time.time() - start_time
+
+# engine: extinction table once, then one batched call
+start_time = time.time()
+spectra = ChromophoreSpectra.from_vts(chromophoreTypes, wavelengths)
+tableTime = time.time() - start_time
+start_time = time.time()
+mua, musp = spectra.optical_properties(concentrations, A, b)
+engineTime = time.time() - start_time
+
+print("Tissue.GetOpticalProperties: %.6f s for %d parameter vectors" % (tissueTime, parameterCount))
+print("ChromophoreSpectra: %.6f s table + %.6f s batch (%.0fx)" % (
+      tableTime, engineTime, tissueTime / (tableTime + engineTime)))
+print("max relative difference: mua %.2e, musp %.2e" % (
+      np.max(np.abs(mua - muaTissue) / muaTissue), np.max(np.abs(musp - muspTissue) / muspTissue)))
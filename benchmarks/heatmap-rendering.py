@@ -0,0 +1,40 @@
+# This is a benchmark of drawing large (rho, z) grids with graph_tools.heatmap.
+# A synthetic fluence-like grid (exp(-r)/r, which has a sharp peak at the
+# source) is drawn as a full-resolution Heatmap from nested lists, as the
+# scripts did before, from the NumPy array, reduced to the display resolution
+# by decimation and by block max, and as an embedded PNG image. For each the
+# time to build the figure, the time to write it as HTML (without plotly.js)
+# and the size of that HTML are reported.
+#
+# Pass the grid size, e.g. "python heatmap-rendering.py 1000", default 2000.
+import sys
+import time
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+from graph_tools import heatmap
+
+size = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+rhos = np.linspace(-20, 20, size)
+zs = np.linspace(0.01, 20, size)
+r = np.hypot(rhos[:, None], zs[None, :])
+logFluence = np.log(np.exp(-r) / r)
+
+cases = [
+    ("full resolution, lists", lambda: heatmap(logFluence.tolist(), rhos.tolist(), zs.tolist(), size=(size, size))),
+    ("full resolution, ndarray", lambda: heatmap(logFluence, rhos, zs, size=(size, size))),
+    ("decimated", lambda: heatmap(logFluence, rhos, zs)),
+    ("block max", lambda: heatmap(logFluence, rhos, zs, method='max')),
+    ("block max, image", lambda: heatmap(logFluence, rhos, zs, method='max', image=True)),
+]
+
+print("%dx%d grid" % (size, size))
+print("%-28s %12s %12s %14s" % ("case", "build [s]", "html [s]", "html [MB]"))
+for name, draw in cases:
+    start_time = time.perf_counter()
+    fig = draw()
+    build_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    html = fig.to_html(include_plotlyjs=False, full_html=False)
+    html_time = time.perf_counter() - start_time
+    print("%-28s %12.3f %12.3f %14.2f" % (name, build_time, html_time, len(html) / 1e6), flush=True)
@@ -0,0 +1,42 @@
+# This is a benchmark of evaluating the two-layer SDA fluence(rho, z) of many
+# tissues. fluence_tools.layered_fluence_batch passes N tissues to one
+# TwoLayerSDAForwardSolver.FluenceOfRhoAndZ call and reshapes the result to
+# (N, rhos, zs); it is compared with N separate calls of one tissue each, as
+# the forward-solvers scripts make, and the time per tissue of both is printed.
+#
+import sys
+import timeit
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import SourceConfiguration, TwoLayerSDAForwardSolver
+from fluence_tools import layered_fluence_batch
+
+solver = TwoLayerSDAForwardSolver()
+solver.SourceConfiguration = SourceConfiguration.Distributed
+rhos = np.linspace(0.1, 19.9, 50)
+zs = np.linspace(0.1, 19.9, 50)
+
+
+def two_layer_tissues(count):
+    """Return count two-layer tissues with top layer thicknesses from 1 to 10 mm."""
+    return [[(0, thickness, 0.1, 1, 0.8, 1.4), (thickness, float('inf'), 0.01, 1, 0.8, 1.4)]
+            for thickness in np.linspace(1, 10, count)]
+
+
+def best_time(statement, repeat=5):
+    """Return the best wall time in seconds of a callable over several runs."""
+    return min(timeit.repeat(statement, number=1, repeat=repeat))
+
+
+print("%-10s %18s %18s %10s" % ("tissues", "separate [s/tissue]", "batched [s/tissue]", "speedup"))
+for count in [1, 10, 100, 1000]:
+    tissues = two_layer_tissues(count)
+    batched = layered_fluence_batch(solver, tissues, rhos, zs)
+    separate = np.stack([layered_fluence_batch(solver, [tissue], rhos, zs)[0] for tissue in tissues])
+    assert np.allclose(batched, separate)
+    separate_time = best_time(lambda: [layered_fluence_batch(solver, [tissue], rhos, zs) for tissue in tissues])
+    batched_time = best_time(lambda: layered_fluence_batch(solver, tissues, rhos, zs))
+    print("%-10d %18.6f %18.6f %9.1fx" % (count, separate_time / count, batched_time / count,
+                                          separate_time / batched_time))
@@ -0,0 +1,46 @@
+# This is a benchmark of computing the photon hitting density of the two-layer
+# SDA solver at many source-detector separations. The per-separation path of
+# phd-of-rho-and-z-two-layer.py, a fluence solve followed by GetPHD for every
+# separation, is compared with fluence_tools.phd_stack, which solves for the
+# fluence once and forms every PHD from it by reciprocity. The largest
+# relative difference between the two stacks is reported as well.
+#
+import sys
+import time
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (Array, Double, DoubleRange, IOpticalPropertyRegion, LayerOpticalPropertyRegion,
+                           OpticalProperties, SourceConfiguration, TwoLayerSDAForwardSolver)
+from fluence_tools import fluence_of_rho_and_z, phd_of_rho_and_z, phd_stack
+
+solver = TwoLayerSDAForwardSolver()
+solver.SourceConfiguration = SourceConfiguration.Distributed
+topLayerThickness = 5
+opRegions = Array.CreateInstance(IOpticalPropertyRegion, 2)
+opRegions[0] = LayerOpticalPropertyRegion(DoubleRange(0, topLayerThickness, 2), OpticalProperties(0.1, 1, 0.8, 1.4))
+opRegions[1] = LayerOpticalPropertyRegion(DoubleRange(topLayerThickness, Double.PositiveInfinity, 2), OpticalProperties(0.01, 1, 0.8, 1.4))
+opArray = Array.CreateInstance(OpticalProperties, 2)
+opArray[0] = OpticalProperties(0.1, 1, 0.8, 1.4)
+opArray[1] = OpticalProperties(0.01, 1, 0.8, 1.4)
+
+rhos = np.linspace(-19.9, 19.9, 200)
+zs = np.linspace(0.1, 19.9, 100)
+separations = np.linspace(1, 30, 30)
+
+start_time = time.perf_counter()
+fluence = fluence_of_rho_and_z(solver, opRegions, rhos, zs)
+separate = np.stack([phd_of_rho_and_z(solver, fluence, sds, opArray, rhos, zs) for sds in separations])
+separate_time = time.perf_counter() - start_time
+
+start_time = time.perf_counter()
+batched = phd_stack(solver, opRegions, separations, rhos, zs)
+batched_time = time.perf_counter() - start_time
+
+with np.errstate(divide='ignore', invalid='ignore'):
+    difference = np.nanmax(np.abs(batched - separate) / np.abs(separate))
+print("%d separations on a %dx%d grid" % (len(separations), len(rhos), len(zs)))
+print("GetPHD per separation: %8.3f s" % separate_time)
+print("phd_stack:             %8.3f s  (%.1fx)" % (batched_time, separate_time / batched_time))
+print("max relative difference: %.2e" % difference)
@@ -0,0 +1,66 @@
+# This is a benchmark and accuracy check of the R(fx) lookup-table inversion in
+# modules/lookup_table_tools.py. A table of PointSourceSDA R(fx) at fx=[0 0.2]/mm
+# is built (or read from disk), random (mua, musp) samples are forward modeled
+# with the same solver and then inverted three ways: the iterative least_squares
+# fit of (mua, musp) used by the inverse-solutions scripts, the Delaunay lookup
+# and the gridded lookup. The relative errors of each with respect to the true
+# optical properties and the throughput on a million-pixel image are reported.
+#
+import os
+import sys
+import time
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+from scipy.optimize import least_squares
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import PointSourceSDAForwardSolver
+from array_tools import to_numpy
+from spectral_tools import to_optical_properties
+from lookup_table_tools import ROfFxLookupTable
+
+fxs = [0.0, 0.2]
+forwardSolver = PointSourceSDAForwardSolver()
+tablePath = 'r-of-fx-lookup-table-point-source-sda.npz'
+start_time = time.time()
+if os.path.exists(tablePath):
+    table = ROfFxLookupTable.load(tablePath)
+else:
+    table = ROfFxLookupTable.from_forward_solver(forwardSolver, fxs)
+    table.save(tablePath)
+print("table: %d x %d (mua, musp), ready in %.3f s" % (len(table.mua), len(table.musp), time.time() - start_time))
+
+def forward(mua, musp):
+    """Return R(fx) for arrays of mua and musp as an array of shape (len(fxs), len(mua))."""
+    ops = to_optical_properties(mua, musp, g=0.8, n=1.4)
+    return np.array([to_numpy(forwardSolver.ROfFx(ops, fx)) for fx in fxs])
+
+# random samples inside the table
+sampleCount = 200
+rng = np.random.default_rng(0)
+mua = np.exp(rng.uniform(np.log(1e-3), np.log(0.2), sampleCount))
+musp = np.exp(rng.uniform(np.log(0.5), np.log(3.0), sampleCount))
+r = forward(mua, musp)
+
+def report(name, muaFit, muspFit, elapsed):
+    muaError = np.abs(muaFit / mua - 1)
+    muspError = np.abs(muspFit / musp - 1)
+    print("%-14s mua error median %.2e max %.2e, musp error median %.2e max %.2e, %.2e s/pixel" % (
+          name, np.nanmedian(muaError), np.nanmax(muaError), np.nanmedian(muspError), np.nanmax(muspError),
+          elapsed / sampleCount))
+
+# iterative fit of (mua, musp) per sample
+start_time = time.time()
+fits = np.array([least_squares(lambda x: forward(x[0:1], x[1:2])[:, 0] - r[:, k], [0.01, 1.0],
+                               method='lm', ftol=1e-9, xtol=1e-9).x for k in range(sampleCount)])
+report("least_squares", fits[:, 0], fits[:, 1], time.time() - start_time)
+for method in ['delaunay', 'grid']:
+    start_time = time.time()
+    muaFit, muspFit = table.invert(r[0], r[1], method=method)
+    report(method, muaFit, muspFit, time.time() - start_time)
+
+# throughput on a million-pixel image
+pixels = np.tile(r, (1, 10 ** 6 // sampleCount))
+start_time = time.time()
+table.invert(pixels[0], pixels[1])
+print("grid lookup of %d pixels: %.3f s" % (pixels.shape[1], time.time() - start_time))
@@ -0,0 +1,64 @@
+# This is a measurement of the startup time of the example scripts, the time
+# from starting Python until the imports at the top of a script have run and
+# its first computation could start. For every script in forward-solvers,
+# inverse-solutions and monte-carlo the top-level statements up to the last
+# import are run in a fresh interpreter from the script's folder: once cold,
+# after removing the compiled modules in modules/__pycache__, and then warm
+# several times, reporting the median.
+#
+# Pass a git revision, e.g. "python script-startup.py HEAD~1", to time the
+# headers of the scripts at that revision next to the current ones.
+import ast
+import glob
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+warmRepeats = 5
+repositoryPath = os.path.abspath('..')
+scriptFolders = ['forward-solvers', 'inverse-solutions', 'monte-carlo']
+revision = sys.argv[1] if len(sys.argv) > 1 else None
+
+
+def startup_header(source):
+    """Return the top-level statements of a script up to and including its last import."""
+    statements = ast.parse(source).body
+    lastImport = max((i for i, node in enumerate(statements) if isinstance(node, (ast.Import, ast.ImportFrom))),
+                     default=-1)
+    return "\n".join(ast.unparse(node) for node in statements[:lastImport + 1])
+
+
+def time_header(header, folder):
+    """Run header in a fresh interpreter started in folder and return the wall time in seconds."""
+    start_time = time.perf_counter()
+    subprocess.run([sys.executable, '-c', header], cwd=folder, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start_time
+
+
+def time_cold_and_warm(header, folder):
+    shutil.rmtree(os.path.join(repositoryPath, 'modules', '__pycache__'), ignore_errors=True)
+    cold = time_header(header, folder)
+    warm = statistics.median(time_header(header, folder) for _ in range(warmRepeats))
+    return cold, warm
+
+
+scripts = sorted(path for folder in scriptFolders for path in glob.glob(os.path.join(repositoryPath, folder, '*.py')))
+print("%-70s %9s %9s" % ("script", "cold [s]", "warm [s]") + ("   %s cold, warm [s]" % revision if revision else ""))
+for path in scripts:
+    relativePath = os.path.relpath(path, repositoryPath)
+    folder = os.path.dirname(path)
+    with open(path, encoding='utf-8') as scriptFile:
+        cold, warm = time_cold_and_warm(startup_header(scriptFile.read()), folder)
+    line = "%-70s %9.3f %9.3f" % (relativePath, cold, warm)
+    if revision:
+        previous = subprocess.run(['git', 'show', '%s:%s' % (revision, relativePath.replace(os.sep, '/'))],
+                                  cwd=repositoryPath, capture_output=True, text=True)
+        if previous.returncode == 0:
+            line += "   %9.3f %9.3f" % time_cold_and_warm(startup_header(previous.stdout), folder)
+        else:
+            line += "   (not in %s)" % revision
+    print(line)
@@ -0,0 +1,41 @@
+# This is a validation and benchmark of the NumPy point source SDA model in
+# modules/diffusion_tools.py against PointSourceSDAForwardSolver. R(rho) and
+# R(fx) are evaluated on a grid of optical properties x rho (or fx) once per
+# rho/fx through PythonNet and in one broadcast NumPy call, and the largest
+# relative difference and the time of both paths are reported. Small differences
+# are expected from the Fresnel moments, which the NumPy model integrates
+# numerically rather than taking from the fit in n used by VTS.
+#
+import sys
+import time
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import PointSourceSDAForwardSolver
+from array_tools import to_numpy
+from spectral_tools import to_optical_properties
+from diffusion_tools import r_of_rho, r_of_fx
+
+n = 1.4
+mua, musp = np.meshgrid(np.geomspace(1e-3, 0.5, 30), np.geomspace(0.5, 3.0, 30), indexing='ij')
+mua = mua.ravel()
+musp = musp.ravel()
+rhos = np.linspace(0.5, 10.0, 20)
+fxs = np.linspace(0.0, 0.5, 11)
+forwardSolver = PointSourceSDAForwardSolver()
+ops = to_optical_properties(mua, musp, g=0.8, n=n)
+
+for name, values, vtsMethod, numpyFunction in [
+        ("R(rho)", rhos, forwardSolver.ROfRho, r_of_rho),
+        ("R(fx)", fxs, forwardSolver.ROfFx, r_of_fx)]:
+    start_time = time.time()
+    vtsResult = np.column_stack([to_numpy(vtsMethod(ops, float(v))) for v in values])
+    vtsTime = time.time() - start_time
+    start_time = time.time()
+    numpyResult = numpyFunction(mua[:, np.newaxis], musp[:, np.newaxis], values[np.newaxis, :], n)
+    numpyTime = time.time() - start_time
+    relativeDifference = np.abs(numpyResult / vtsResult - 1)
+    print("%-7s %d evaluations: VTS %.4f s, NumPy %.4f s (%.0fx), relative difference median %.2e max %.2e" % (
+          name, vtsResult.size, vtsTime, numpyTime, vtsTime / numpyTime,
+          np.median(relativeDifference), np.max(relativeDifference)))
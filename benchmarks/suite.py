@@ -0,0 +1,200 @@
+# This is the benchmark suite of the hot paths of the example scripts: Monte
+# Carlo runs at several N and detector sizes, the two-layer SDA fluence, the
+# ComputationFactory fluence and photon hitting density, the scipy and the VTS
+# MPFitLevenbergMarquardtOptimizer inversions and the .NET <-> NumPy array
+# conversions. Every run is appended to results/<machine>.jsonl and compared
+# with the previous run on the same machine, flagging benchmarks whose median
+# time changed by more than the threshold.
+#
+#   python suite.py                    run everything
+#   python suite.py "monte_carlo_run*" run the benchmarks matching a pattern
+#   python suite.py --no-save          do not record the run
+#   python suite.py --check            exit with status 1 if anything got slower
+#
+import argparse
+import os
+import sys
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (load, Array, ChromophoreAbsorber, ChromophoreType, ComputationFactory,
+                           DistributedPointSourceSDAForwardSolver, Double, DoubleRange, FluenceSolutionDomainType,
+                           ForwardSolverType, Func, IChromophoreAbsorber, IDetectorInput, IndependentVariableAxis,
+                           IOpticalPropertyRegion, LayerOpticalPropertyRegion, MonteCarloSimulation,
+                           MPFitLevenbergMarquardtOptimizer, NurbsForwardSolver, Object, OpticalProperties,
+                           PointSourceSDAForwardSolver, PowerLawScatterer, ROfRhoDetectorInput, SimulationInput,
+                           SourceConfiguration, Tissue, TwoLayerSDAForwardSolver)
+from array_tools import to_numpy, to_dotnet
+from benchmark_tools import BenchmarkSuite, compare, git_revision, load_history, new_run, save_run
+from simulation_cache import vts_version
+from spectral_tools import ChromophoreSpectra, to_optical_properties
+
+suite = BenchmarkSuite()
+
+
+@suite.case(params={'n': [1000, 10000, 100000], 'rhoBins': [101, 1001]}, repeat=3)
+def monte_carlo_run(n, rhoBins):
+    detectorInput = ROfRhoDetectorInput()
+    detectorInput.Rho = DoubleRange(start=0, stop=40, number=rhoBins)
+    detectorInput.Name = "ROfRho"
+    detectors = Array.CreateInstance(IDetectorInput, 1)
+    detectors[0] = detectorInput
+    simulationInput = SimulationInput()
+    simulationInput.N = n
+    simulationInput.DetectorInputs = detectors
+    return lambda: MonteCarloSimulation(simulationInput).Run()
+
+
+def two_layer_regions(topLayerThickness=5):
+    opRegions = Array.CreateInstance(IOpticalPropertyRegion, 2)
+    opRegions[0] = LayerOpticalPropertyRegion(DoubleRange(0, topLayerThickness, 2), OpticalProperties(0.1, 1, 0.8, 1.4))
+    opRegions[1] = LayerOpticalPropertyRegion(DoubleRange(topLayerThickness, Double.PositiveInfinity, 2),
+                                              OpticalProperties(0.01, 1, 0.8, 1.4))
+    return opRegions
+
+
+@suite.case(params={'size': [50, 100, 200]})
+def two_layer_fluence_of_rho_and_z(size):
+    solver = TwoLayerSDAForwardSolver()
+    solver.SourceConfiguration = SourceConfiguration.Distributed
+    regions = Array[Array[IOpticalPropertyRegion]]([two_layer_regions()])
+    rhos = to_dotnet(np.linspace(0.1, 19.9, size))
+    zs = to_dotnet(np.linspace(0.1, 19.9, size))
+    return lambda: solver.FluenceOfRhoAndZ(regions, rhos, zs)
+
+
+def compute_fluence_arguments(size):
+    rhos = np.linspace(0.1, 19.9, size)
+    allRhos = to_dotnet(np.concatenate((-rhos[::-1], rhos)))
+    zs = to_dotnet(np.linspace(0.1, 19.9, size))
+    opRegions = Array.CreateInstance(IOpticalPropertyRegion, 1)
+    opRegions[0] = LayerOpticalPropertyRegion(DoubleRange(0, 5, 2), OpticalProperties(0.1, 1, 0.8, 1.4))
+    independentAxes = Array.CreateInstance(IndependentVariableAxis, 1)
+    independentAxes[0] = IndependentVariableAxis.Z
+    independentValues = Array.CreateInstance(Array[Double], 2)
+    independentValues[0] = allRhos
+    independentValues[1] = zs
+    return (DistributedPointSourceSDAForwardSolver(), FluenceSolutionDomainType.FluenceOfRhoAndZ,
+            independentAxes, independentValues, opRegions, allRhos), allRhos, zs
+
+
+@suite.case(params={'size': [50, 100, 200]})
+def compute_fluence(size):
+    arguments, _, _ = compute_fluence_arguments(size)
+    return lambda: ComputationFactory.ComputeFluence(*arguments)
+
+
+@suite.case(params={'size': [50, 100, 200]})
+def get_phd(size):
+    arguments, allRhos, zs = compute_fluence_arguments(size)
+    fluence = ComputationFactory.ComputeFluence(*arguments)
+    ops = Array.CreateInstance(OpticalProperties, 2)
+    ops[0] = OpticalProperties(0.1, 1, 0.8, 1.4)
+    ops[1] = OpticalProperties(0.01, 1, 0.8, 1.4)
+    return lambda: ComputationFactory.GetPHD(ForwardSolverType.TwoLayerSDA, fluence, 10, ops, allRhos, zs)
+
+
+# R(rho) at rho=1mm and wavelengths=[400:50:1000]nm for [HbO2 Hb H2O] with a
+# fixed scatterer, as in the inverse-solutions R(rho) scripts
+inversionWavelengths = 400.0 + 50 * np.arange(13)
+inversionChromophores = [ChromophoreType.HbO2, ChromophoreType.Hb, ChromophoreType.H2O]
+inversionMeasuredData = [70.0, 30.0, 0.8]
+inversionInitialGuess = [50.0, 40.0, 0.6]
+
+
+def chromophore_tissue(concentrations, scatterer):
+    absorbers = Array.CreateInstance(IChromophoreAbsorber, len(concentrations))
+    for i, (chromophoreType, concentration) in enumerate(zip(inversionChromophores, concentrations)):
+        absorbers[i] = ChromophoreAbsorber(chromophoreType, float(concentration))
+    return Tissue(absorbers, scatterer, "", n=1.4)
+
+
+def r_of_rho_measurement(scatterer, wavelengths):
+    ops = chromophore_tissue(inversionMeasuredData, scatterer).GetOpticalProperties(wavelengths)
+    return NurbsForwardSolver().ROfRho(ops, 1.0)
+
+
+@suite.case()
+def scipy_inversion():
+    from scipy.optimize import least_squares
+    scatterer = PowerLawScatterer(1.2, 1.42)
+    wavelengths = to_dotnet(inversionWavelengths)
+    measured = to_numpy(r_of_rho_measurement(scatterer, wavelengths))
+    spectra = ChromophoreSpectra.from_vts(inversionChromophores, inversionWavelengths)
+    forwardSolver = PointSourceSDAForwardSolver()
+
+    def residual(concentrations):
+        ops = to_optical_properties(spectra.mua(concentrations), spectra.musp(scatterer.A, scatterer.B))
+        return to_numpy(forwardSolver.ROfRho(ops, 1.0)) - measured
+
+    return lambda: least_squares(residual, inversionInitialGuess, method='lm', ftol=1e-9, xtol=1e-9, max_nfev=10000)
+
+
+@suite.case()
+def mpfit_inversion():
+    scatterer = PowerLawScatterer(1.2, 1.42)
+    wavelengths = to_dotnet(inversionWavelengths)
+    measured = r_of_rho_measurement(scatterer, wavelengths)
+    forwardSolver = PointSourceSDAForwardSolver()
+
+    def forward(concentrations, params):
+        ops = chromophore_tissue(concentrations, params[2]).GetOpticalProperties(params[0])
+        return forwardSolver.ROfRho(ops, params[1])
+
+    forwardFunction = Func[Array[float], Array[Object], Array[float]](forward)
+    optimizer = MPFitLevenbergMarquardtOptimizer()
+    weights = [1] * len(measured)
+    return lambda: optimizer.Solve(list(inversionInitialGuess), [True, True, True], measured, weights,
+                                   forwardFunction, [wavelengths, 1.0, scatterer])
+
+
+@suite.case(params={'size': [101, 10000, 1000000], 'method': ['block', 'elementwise']})
+def to_numpy_conversion(size, method):
+    values = to_dotnet(np.random.rand(size))
+    if method == 'block':
+        return lambda: to_numpy(values)
+    return lambda: np.array([v for v in values])
+
+
+@suite.case(params={'size': [101, 10000, 1000000], 'method': ['block', 'elementwise']})
+def to_dotnet_conversion(size, method):
+    values = np.random.rand(size)
+    if method == 'block':
+        return lambda: to_dotnet(values)
+    return lambda: Array[Double](values.tolist())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the VTS script benchmarks and record the results.")
+    parser.add_argument('pattern', nargs='?', help="glob of the benchmark names to run, e.g. 'get_phd*'")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="ratio of median times reported as a regression (default 1.25)")
+    parser.add_argument('--results', default='results', help="folder of the per-machine result histories")
+    parser.add_argument('--no-save', action='store_true', help="do not append this run to the history")
+    parser.add_argument('--check', action='store_true', help="exit with status 1 if any benchmark got slower")
+    arguments = parser.parse_args()
+
+    vtsPath = load()
+    print("%-60s %12s %12s" % ("benchmark", "median [s]", "min [s]"))
+    results = suite.run(arguments.pattern, progress=lambda name, timings: print(
+        "%-60s %12.6f %12.6f" % (name, timings['median'], timings['min']), flush=True))
+    run = new_run(results, git_revision(os.path.dirname(os.path.abspath(__file__))), vts=vts_version(vtsPath))
+
+    historyPath = os.path.join(arguments.results, run['machine'] + '.jsonl')
+    history = load_history(historyPath)
+    regressions = []
+    if history:
+        previous = history[-1]
+        print("\ncompared with %s (revision %s):" % (previous['timestamp'], previous['revision']))
+        for name, before, after, ratio, flag in compare(previous, run, arguments.threshold):
+            print("%-60s %12.6f -> %12.6f %6.2fx %s" % (name, before, after, ratio, flag))
+            if flag == 'slower':
+                regressions.append(name)
+    if not arguments.no_save:
+        save_run(historyPath, run)
+    if regressions:
+        print("\n%d benchmark(s) slower than the previous run by more than %.2fx" % (
+              len(regressions), arguments.threshold))
+        if arguments.check:
+            sys.exit(1)
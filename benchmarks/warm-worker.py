@@ -0,0 +1,57 @@
+# This is a benchmark of the warm VTS workers in modules/vts_worker.py on short
+# forward-solver jobs like forward-solvers/fluence-of-rho-and-z-two-layer.py.
+# The same two-layer fluence(rho, z) job, with a different top layer thickness
+# each time, is run three ways: as a fresh Python process per job (CLR startup,
+# assembly load and JIT every time), with one warm worker, and with a pool of
+# warm workers. The time per job and the worker startup time are reported.
+#
+import os
+import subprocess
+import sys
+import time
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+from vts_worker import VtsWorker, WorkerPool
+
+jobCount = 16
+rhos = np.linspace(0.1, 19.9, 100)
+zs = np.linspace(0.1, 19.9, 100)
+thicknesses = np.linspace(1.0, 8.0, jobCount)
+
+
+def layers(thickness):
+    return [(0, thickness, 0.1, 1, 0.8, 1.4), (thickness, float('inf'), 0.01, 1, 0.8, 1.4)]
+
+
+# worker processes re-import this script, so only run the benchmark in the main process
+if __name__ == "__main__":
+    # a fresh interpreter per job, as when running a script per job
+    coldJob = ("import sys; sys.path.append(%r); import numpy as np; from vts_bootstrap import load; load(); "
+               "from vts_worker import layered_fluence_of_rho_and_z; "
+               "layered_fluence_of_rho_and_z(%%r, np.linspace(0.1, 19.9, 100), np.linspace(0.1, 19.9, 100))"
+               % os.path.abspath(module_path))
+    start_time = time.time()
+    for thickness in thicknesses[:4]:
+        subprocess.run([sys.executable, '-c', coldJob % (layers(thickness),)], check=True)
+    coldTime = (time.time() - start_time) / 4
+    print("fresh process per job: %.3f s/job" % coldTime)
+
+    start_time = time.time()
+    with VtsWorker() as worker:
+        print("worker startup with warm-up: %.3f s" % (time.time() - start_time))
+        with worker.client() as client:
+            start_time = time.time()
+            for thickness in thicknesses:
+                client.call('layered_fluence_of_rho_and_z', layers(thickness), rhos, zs)
+            warmTime = (time.time() - start_time) / jobCount
+    print("one warm worker: %.4f s/job (%.0fx)" % (warmTime, coldTime / warmTime))
+
+    processes = min(4, os.cpu_count())
+    start_time = time.time()
+    with WorkerPool(processes) as pool:
+        print("pool of %d workers startup: %.3f s" % (processes, time.time() - start_time))
+        start_time = time.time()
+        pool.map('layered_fluence_of_rho_and_z', [(layers(thickness), rhos, zs) for thickness in thicknesses])
+        poolTime = (time.time() - start_time) / jobCount
+    print("pool of %d warm workers: %.4f s/job (%.0fx)" % (processes, poolTime, coldTime / poolTime))
@@ -0,0 +1,37 @@
+# This is a check of the error handling of the warm VTS workers in
+# modules/vts_worker.py. A worker is sent a job whose result is a .NET
+# Array[Double], which cannot be pickled back, a request that does not
+# unpickle, and a job from a client that hangs up before the reply. Each must
+# leave the worker running: the first two come back as WorkerError and the
+# worker must still answer ping afterwards. The script exits with an
+# AssertionError if any check fails.
+#
+import sys
+module_path = '../modules'
+sys.path.append(module_path)
+from vts_worker import VtsWorker, WorkerError
+
+# worker processes re-import this script, so only run the checks in the main process
+if __name__ == "__main__":
+    with VtsWorker(warmUp=False) as worker:
+        with worker.client() as client:
+            workerPid = client.call('ping')
+            # a .NET array as the result of a "module:function" job
+            try:
+                client.call('array_tools:to_dotnet', [1.0, 2.0, 3.0])
+                raise AssertionError("a .NET Array[Double] result was pickled")
+            except WorkerError as error:
+                print("unpicklable result: %s" % str(error).strip().splitlines()[-1])
+            assert client.call('ping') == workerPid, "worker did not answer ping after an unpicklable result"
+            # bytes that are not a pickled request
+            client._connection.send_bytes(b'not a pickle')
+            status, _ = client._connection.recv()
+            assert status == 'error', "an unreadable request was not answered with an error"
+            assert client.call('ping') == workerPid, "worker did not answer ping after an unreadable request"
+        # a client that sends a job and hangs up before the reply
+        hangUp = worker.client()
+        hangUp._connection.send(('time:sleep', (0.5,), {}))
+        hangUp.close()
+        with worker.client() as client:
+            assert client.call('ping') == workerPid, "worker did not answer ping after a client hung up"
+    print("worker survived every failed request")
@@ -0,0 +1,39 @@
+# This is an example of python code using VTS to sweep the two-layer SDA fluence
+# as a function of radial extent and depth over a grid of top layer thicknesses
+# and optical properties of both layers. The combinations are evaluated in a
+# process pool and written to the folder two-layer-sweep as they complete; if
+# the script is stopped, running it again only computes the missing ones.
+# The fluence of one combination is then plotted from the memory-mapped result.
+#
+import sys
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+from graph_tools import heatmap, show
+from fluence_tools import mirror_rows, mirrored_rhos
+from sweep_tools import two_layer_fluence_sweep
+
+# worker processes re-import this script, so only run the sweep in the main process
+if __name__ == "__main__":
+    rhos = np.linspace(0.1, 19.9, 100)
+    zs = np.linspace(0.1, 19.9, 100)
+    grids = {
+        'thickness': [1.0, 2.0, 5.0, 10.0],
+        'topMua': np.linspace(0.01, 0.1, 4),
+        'topMusp': [0.8, 1.0, 1.2],
+        'bottomMua': [0.01, 0.02, 0.03, 0.05],
+        'bottomMusp': [0.8, 1.0, 1.2],
+    }
+    values, done = two_layer_fluence_sweep('two-layer-sweep', grids, rhos, zs, progress=lambda count, total: print(
+        "\r%d of %d combinations" % (count, total), end="", flush=True))
+    print()
+
+    # plot thickness=5, topMua=0.1, topMusp=1, bottomMua=0.01, bottomMusp=1, mirrored about rho=0
+    fluence = values[2, 3, 1, 0, 1]
+    allRhos = mirrored_rhos(rhos)
+    fluenceRowsToPlot = np.empty((len(allRhos), len(zs)))
+    fluenceRowsToPlot[len(allRhos) - len(rhos):] = np.log(fluence)
+    mirror_rows(fluenceRowsToPlot, len(allRhos) - len(rhos))
+    fluenceChart = heatmap(fluenceRowsToPlot, allRhos, zs, "ρ [mm]", "z [mm]", "log(Φ(ρ, z) [mm-2])")
+    fluenceChart.add_hline(y=grids['thickness'][2], line_dash="dash", line_color="white", line_width=2)
+    show(fluenceChart)
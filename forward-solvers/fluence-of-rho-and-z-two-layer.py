@@ -5,35 +5,15 @@
 # The fluence as a function of rho and z is determined and when displayed, it is mirrored
 # to show full fluence.
 #
-# Import PythonNet
-from pythonnet import load
-load('coreclr')
-import clr
-# Import the Operating System so we can access the files for the VTS library
-import os
 import sys
 module_path = '../modules'
 sys.path.append(module_path)
-file = '../libraries/Vts.dll'
-clr.AddReference(os.path.abspath(file))
 import numpy as np
-import plotly.graph_objects as go
-from Vts import *
-from Vts.Common import *
-from Vts.Extensions import *
-from Vts.Modeling.Optimizers import *
-from Vts.Modeling.ForwardSolvers import *
-from Vts.SpectralMapping import *
-from Vts.Factories import *
-from Vts.MonteCarlo import *
-from Vts.MonteCarlo.Sources import *
-from Vts.MonteCarlo.Tissues import *
-from Vts.MonteCarlo.Detectors import *
-from Vts.MonteCarlo.Factories import *
-from Vts.MonteCarlo.PhotonData import *
-from Vts.MonteCarlo.PostProcessing import *
-from System import Array, Double, Math
-from graph_tools import heatmap
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (Array, Double, DoubleRange, IOpticalPropertyRegion, LayerOpticalPropertyRegion,
+                           OpticalProperties, SourceConfiguration, TwoLayerSDAForwardSolver)
+from graph_tools import heatmap, show
+from fluence_tools import mirrored_fluence_of_rho_and_z
 
 solver = TwoLayerSDAForwardSolver()
 solver.SourceConfiguration = SourceConfiguration.Distributed
@@ -60,22 +40,13 @@ print(zs_delta)
 zs = 0.1 + zs_delta * np.arange(100)
 print(zs)
 
-arrayOP = Array[Array[IOpticalPropertyRegion]]([opRegions])
-# predict the tissue's fluence(rho, z) for the given optical properties 
-fluenceOfRhoAndZ = solver.FluenceOfRhoAndZ(arrayOP, rhos, zs );
-
-allRhos = np.concatenate((-rhos[::-1], rhos))
+# predict the tissue's fluence(rho, z) for the given optical properties; the fluence
+# is symmetric in rho, so only rho >= 0 is computed and the rest is its mirror image
+allRhos, fluenceOfRhoAndZ = mirrored_fluence_of_rho_and_z(solver, opRegions, rhos, zs)
 
 # log transform
-log_fluence = [Math.Log(f) for f in fluenceOfRhoAndZ]
-
-size = len(zs)
-# split into rows
-fluenceRowsToPlot = np.array([log_fluence[i:i+size] for i in range(0, len(log_fluence), size)])
-
-# reverse and concatenate
-allFluenceRowsToPlot = np.concatenate((fluenceRowsToPlot[::-1], fluenceRowsToPlot))
+allFluenceRowsToPlot = np.log(fluenceOfRhoAndZ)
 
-fluenceChart = heatmap(allFluenceRowsToPlot.tolist(), allRhos.tolist(), list(zs), "ρ [mm]", "z [mm]", "log(Φ(ρ, z) [mm-2])")
+fluenceChart = heatmap(allFluenceRowsToPlot, allRhos, zs, "ρ [mm]", "z [mm]", "log(Φ(ρ, z) [mm-2])")
 fluenceChart.add_hline(y=topLayerThickness, line_dash="dash", line_color="white", line_width=2)
-fluenceChart.show(renderer="browser")
+show(fluenceChart)
@@ -3,35 +3,15 @@
 # This sample uses ComputeFluence in place of calling FluenceOfRhoAndZ on the forward solver object
 # and it uses a distributed point source SDA Forward Solver
 #
-# Import PythonNet
-from pythonnet import load
-load('coreclr')
-import clr
-# Import the Operating System so we can access the files for the VTS library
-import os
 import sys
 module_path = '../modules'
 sys.path.append(module_path)
-file = '../libraries/Vts.dll'
-clr.AddReference(os.path.abspath(file))
 import numpy as np
-import plotly.graph_objects as go
-from Vts import *
-from Vts.Common import *
-from Vts.Extensions import *
-from Vts.Modeling.Optimizers import *
-from Vts.Modeling.ForwardSolvers import *
-from Vts.SpectralMapping import *
-from Vts.Factories import *
-from Vts.MonteCarlo import *
-from Vts.MonteCarlo.Sources import *
-from Vts.MonteCarlo.Tissues import *
-from Vts.MonteCarlo.Detectors import *
-from Vts.MonteCarlo.Factories import *
-from Vts.MonteCarlo.PhotonData import *
-from Vts.MonteCarlo.PostProcessing import *
-from System import Array, Double, Math
-from graph_tools import heatmap
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (Array, DistributedPointSourceSDAForwardSolver, DoubleRange, ForwardSolverType,
+                           IOpticalPropertyRegion, LayerOpticalPropertyRegion, OpticalProperties)
+from graph_tools import heatmap, show
+from fluence_tools import mirrored_fluence_of_rho_and_z, phd_of_rho_and_z
 
 solver = DistributedPointSourceSDAForwardSolver()
 
@@ -57,17 +37,9 @@ print(zs_delta)
 zs = 0.1 + zs_delta * np.arange(100)
 print(zs)
 
-allRhos = np.concatenate((-rhos[::-1], rhos))
-
-opRegionsArray = Array[Array[IOpticalPropertyRegion]]([opRegions])
-# predict the tissue's fluence(rho, z) for the given optical properties 
-independentAxes = Array.CreateInstance(IndependentVariableAxis, 1)
-independentAxes[0] = IndependentVariableAxis.Z
-independentValues = Array.CreateInstance(Array[Double], 2)
-independentValues[0] = Array[Double](allRhos.tolist())
-independentValues[1] = Array[Double](zs.tolist())
-# Call the static method ComputeFluence in ComputationFactory to get the fluence data 
-fluenceOfRhoAndZ = ComputationFactory.ComputeFluence(solver, FluenceSolutionDomainType.FluenceOfRhoAndZ, independentAxes, independentValues, opRegions, Array[Double](allRhos.tolist()))
+# Call the static method ComputeFluence in ComputationFactory to get the fluence data; the
+# fluence is symmetric in rho, so only rho >= 0 is computed and the rest is its mirror image
+allRhos, fluenceOfRhoAndZ = mirrored_fluence_of_rho_and_z(solver, opRegions, rhos, zs, method='ComputeFluence')
 
 #PHD
 sourceDetectorSeparation = 10
@@ -75,14 +47,10 @@ opArray = Array.CreateInstance(OpticalProperties, 2)
 opArray[0] = OpticalProperties(0.1, 1, 0.8, 1.4)
 opArray[1] = OpticalProperties(0.01, 1, 0.8, 1.4)
 
-phdOfRhoAndZ = ComputationFactory.GetPHD(ForwardSolverType.TwoLayerSDA, fluenceOfRhoAndZ, sourceDetectorSeparation, opArray, Array[Double](allRhos.tolist()), Array[Double](zs.tolist()))
+phdOfRhoAndZ = phd_of_rho_and_z(ForwardSolverType.TwoLayerSDA, fluenceOfRhoAndZ, sourceDetectorSeparation, opArray, allRhos, zs)
 
 # log transform
-log_phd = [Math.Log(f) for f in phdOfRhoAndZ]
-
-size = len(zs)
-# split into rows
-phdRowsToPlot = np.array([log_phd[i:i+size] for i in range(0, len(log_phd), size)])
+phdRowsToPlot = np.log(phdOfRhoAndZ)
 
-fluenceChart = heatmap(phdRowsToPlot.tolist(), allRhos.tolist(), list(zs), "ρ [mm]", "z [mm]", "log(phd(ρ, z) [mm-2])")
-fluenceChart.show(renderer="browser")
+fluenceChart = heatmap(phdRowsToPlot, allRhos, zs, "ρ [mm]", "z [mm]", "log(phd(ρ, z) [mm-2])")
+show(fluenceChart)
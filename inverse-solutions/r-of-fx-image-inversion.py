@@ -0,0 +1,63 @@
+# This is an example of python code using VTS to provide inverse solutions
+# for every pixel of a spatial frequency domain image. The image stack has
+# R(fx) at fx=[0 0.2]/mm and wavelengths=[650:50:1000]nm for each pixel and is
+# inverted for chromophore concentrations [HbO2 Hb] and power law coefficients
+# [A b]. Scaled Monte Carlo with Nurbs forward solver provides the simulated
+# measured image and PointSourceSDA provides the model used during the
+# inversion. The pixels are fitted with scipy in a pool of worker processes.
+#
+import sys
+import time
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import ChromophoreType, NurbsForwardSolver
+from array_tools import to_numpy
+from graph_tools import heatmap, show
+from spectral_tools import ChromophoreSpectra, to_optical_properties
+from inversion_tools import invert_r_of_fx_image, VtsROfFxModel
+
+# worker processes re-import this script, so only run the inversion in the main process
+if __name__ == "__main__":
+    # Setup wavelengths in visible and NIR spectral regimes and fxs
+    wavelengths = 650.0 + 50 * np.arange(8)
+    fxs = [0.0, 0.2]
+    spectra = ChromophoreSpectra.from_vts([ChromophoreType.HbO2, ChromophoreType.Hb], wavelengths)
+    # Define the parameter maps [HbO2, Hb, A, b] of a 64x64 pixel image: HbO2 varies
+    # across the image and Hb down the image
+    height, width = 64, 64
+    measuredData = np.empty((height, width, 4))
+    measuredData[..., 0] = np.linspace(15.0, 35.0, width)[np.newaxis, :]
+    measuredData[..., 1] = np.linspace(15.0, 30.0, height)[:, np.newaxis]
+    measuredData[..., 2] = 1.2
+    measuredData[..., 3] = 1.42
+    # Create the measured image using Nurbs-based white Monte Carlo forward solver with
+    # one solver call per fx for all pixels and wavelengths
+    mua, musp = spectra.optical_properties(measuredData[..., 0:2], measuredData[..., 2], measuredData[..., 3])
+    opsMeasured = to_optical_properties(mua, musp, g=0.8, n=1.4)
+    measurementForwardSolver = NurbsForwardSolver()
+    rOfFxMeasured = np.stack(
+        [to_numpy(measurementForwardSolver.ROfFx(opsMeasured, fx)).reshape(height, width, len(wavelengths))
+         for fx in fxs], axis=2)
+
+    # Run the inversion of every pixel using PointSourceSDA as the model; the
+    # 4096 pixels are split into about four chunks per worker process
+    initialGuess = [18.0, 30.0, 0.8, 1.6]
+    start_time = time.time()
+    maps = invert_r_of_fx_image(rOfFxMeasured, spectra, fxs, initialGuess,
+                                model=VtsROfFxModel('PointSourceSDAForwardSolver'))
+    elapsed_time = time.time() - start_time
+    print(f"Elapsed time: {elapsed_time:.6f} seconds for {height * width} pixels")
+    print("converged pixels: %d of %d, median Chi2=%5.3e" % (
+          np.count_nonzero(maps.success), height * width, np.nanmedian(maps.chi2)))
+
+    # plot the fitted parameter maps and their errors
+    names = ["HbO2", "Hb", "A", "b"]
+    xs = list(range(width))
+    ys = list(range(height))
+    for k in range(len(names)):
+        chart = heatmap(maps.parameters[..., k].T, xs, ys, "x [pixel]", "y [pixel]", names[k])
+        show(chart)
+        error = 100 * np.abs((measuredData[..., k] - maps.parameters[..., k]) / measuredData[..., k])
+        print("error %-4s = median %3.2f%% max %3.2f%%" % (names[k], np.nanmedian(error), np.nanmax(error)))
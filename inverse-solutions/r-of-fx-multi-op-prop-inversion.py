@@ -5,30 +5,18 @@
 # measured data and PointSourceSDA provides the model used during the inversion.
 # The optimization is performed by a python library scipy.
 #
-# Import the Operating System so we can access the files for the VTS library
-from pythonnet import load
-load('coreclr')
-import clr
-import os
-file = '../libraries/Vts.dll'
-clr.AddReference(os.path.abspath(file))
+import sys
+module_path = '../modules'
+sys.path.append(module_path)
 import numpy as np
-import plotly.graph_objects as go
-from Vts import *
-from Vts.Common import *
-from Vts.Extensions import *
-from Vts.Modeling.Optimizers import *
-from Vts.Modeling.ForwardSolvers import *
-from Vts.SpectralMapping import *
-from Vts.Factories import *
-from Vts.MonteCarlo import *
-from Vts.MonteCarlo.Sources import *
-from Vts.MonteCarlo.Tissues import *
-from Vts.MonteCarlo.Detectors import *
-from Vts.MonteCarlo.Factories import *
-from Vts.MonteCarlo.PhotonData import *
-from Vts.MonteCarlo.PostProcessing import *
-from System import Array, Object
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (lazy_import, Array, ChromophoreAbsorber, ChromophoreType, IChromophoreAbsorber,
+                           NurbsForwardSolver, PointSourceSDAForwardSolver, PowerLawScatterer, Tissue)
+go = lazy_import('plotly.graph_objects')
+from array_tools import to_numpy
+from graph_tools import show
+from forward_solver_tools import CachedForwardSolver
+from spectral_tools import ChromophoreSpectra, to_optical_properties
 # Setup wavelengths in visible and NIR spectral regimes
 wavelengths = Array.CreateInstance(float, 8)
 for i in range(0, len(wavelengths)):
@@ -49,27 +37,25 @@ opsMeasured = Tissue(chromophoresMeasuredData, scattererMeasuredData, "", n=1.4)
 measurementForwardSolver = NurbsForwardSolver()
 # len(measuredROfFx)=(#fxs)x(#wavelengths) flattened
 rOfFxMeasured=np.concatenate(
-        [np.array(measurementForwardSolver.ROfFx(opsMeasured, fxs[0]), dtype=float), 
-         np.array(measurementForwardSolver.ROfFx(opsMeasured, fxs[1]), dtype=float)])
-# Create a forward solver as a model function for inversion
-forwardSolverForInversion = PointSourceSDAForwardSolver()
+        [to_numpy(measurementForwardSolver.ROfFx(opsMeasured, fxs[0])),
+         to_numpy(measurementForwardSolver.ROfFx(opsMeasured, fxs[1]))])
+# Create a forward solver as a model function for inversion; evaluations are
+# memoized per optical property set so repeated parameter vectors are not recomputed
+forwardSolverForInversion = CachedForwardSolver(PointSourceSDAForwardSolver())
 #forwardSolverForInversion = NurbsForwardSolver() # results improved but inverse crime!
 
+# Precompute the chromophore extinction table at the wavelengths once so each
+# residual evaluation computes the optical properties with NumPy
+spectra = ChromophoreSpectra.from_vts([ChromophoreType.HbO2, ChromophoreType.Hb], wavelengths)
+
 # Declare local forward reflectance function that computes reflectance 
 # from chromophores and scatterer values
 # valuesSought = [Hb, HbO2, A, b]
 def CalculateReflectanceVsWavelengthFromChromophoreConcAndScatterer(
     valuesSought, wavelengths, fxs, forwardSolver):
-# Create a forward solve model function to solve inverse
-   forwardSolverForInversion = PointSourceSDAForwardSolver()
-   # Create an array of chromophore absorbers based on values
-   chromophoresLocal = Array.CreateInstance(IChromophoreAbsorber, 2)
-   chromophoresLocal[0] = ChromophoreAbsorber(ChromophoreType.HbO2, valuesSought[0])
-   chromophoresLocal[1] = ChromophoreAbsorber(ChromophoreType.Hb, valuesSought[1])
-   # Create a scatterr based on values
-   scattererLocal = PowerLawScatterer(valuesSought[2], valuesSought[3])
-   # Compose local tissue to obtain optical properties
-   opsLocal = Tissue(chromophoresLocal, scattererLocal, "", n=1.4).GetOpticalProperties(wavelengths)
+   # Compute local optical properties from the chromophore concentrations and scatterer
+   opsLocal = to_optical_properties(spectra.mua(valuesSought[0:2]),
+                                    spectra.musp(valuesSought[2], valuesSought[3]), g=0.8, n=1.4)
    print("iter:[Hb HbO2 A b]=[%5.3f %5.3f %5.3f %5.3f]" % (
          valuesSought[0], valuesSought[1], valuesSought[2],valuesSought[3]))
    # Compute reflectance for local absorbers
@@ -120,47 +106,37 @@ rOfFxFit=np.concatenate(
 chart1 = go.Figure()
 xLabel = "wavelength [nm]"
 yLabel = "R(wavelength)"
-wvs = [w for w in wavelengths]
+wvs = to_numpy(wavelengths)
 # plot measured data first fx first
-measR= [m for m in rOfFxMeasured]
+measR = rOfFxMeasured
 midpoint=len(measR) // 2
 chart1.add_trace(go.Scatter(x=wvs, y=measR[:midpoint], mode='markers', name='measured data: fx1'))
 chart1.add_trace(go.Scatter(x=wvs, y=measR[midpoint:], mode='markers', name='measured data: fx2'))
 # plot initial guess data
-igR = [i for i in rOfFxInitialGuess]
+igR = rOfFxInitialGuess
 chart1.add_trace(go.Scatter(x=wvs, y=igR[:midpoint], mode='markers', name='initial guess: fx1'))
 chart1.add_trace(go.Scatter(x=wvs, y=igR[midpoint:], mode='markers', name='initial guess: fx2'))
 # plot fit: need to organize by fx
-convR = [f for f in rOfFxFit]
+convR = rOfFxFit
 chart1.add_trace(go.Scatter(x=wvs, y=convR[:midpoint], mode='lines', name='converged: fx1'))
 chart1.add_trace(go.Scatter(x=wvs, y=convR[midpoint:], mode='lines', name='converged: fx2'))
 chart1.update_layout( title="ROfFx (inverse solution for chromophore concentrations, multiple wavelengths, multiple fx)", xaxis_title=xLabel, yaxis_title=yLabel)
-chart1.show(renderer="browser")
+show(chart1)
 # plot Mus': flattened so have to separate
 chart2 = go.Figure()
 xLabel = "wavelength [nm]"
 yLabel = "us'(wavelength)"
-wvs = [w for w in wavelengths]
-# plot measured data 
-scattererMeasuredDataMusp= np.zeros(len(wavelengths),dtype=float)
-for i in range(0, len(wavelengths)):
-   scattererMeasuredDataMusp[i]=opsMeasured[i].Musp
-measMusp = [m for m in scattererMeasuredDataMusp]
+# plot measured data
+measMusp = spectra.musp(measuredData[2], measuredData[3])
 chart2.add_trace(go.Scatter(x=wvs, y=measMusp, mode='markers', name='measured data'))
 # plot initial guess data
-scattererInitialGuessMusp= np.zeros(len(wavelengths),dtype=float)
-for i in range(0, len(wavelengths)):
-   scattererInitialGuessMusp[i]=opsInitialGuess[i].Musp
-igMusp = [i for i in scattererInitialGuessMusp]
+igMusp = spectra.musp(initialGuess[2], initialGuess[3])
 chart2.add_trace(go.Scatter(x=wvs, y=igMusp, mode='markers', name='initial guess'))
 # plot fit
-scattererFitMusp= np.zeros(len(wavelengths),dtype=float)
-for i in range(0, len(wavelengths)):
-   scattererFitMusp[i]=opsFit[i].Musp
-convMusp = [f for f in scattererFitMusp]
+convMusp = spectra.musp(fit.x[2], fit.x[3])
 chart2.add_trace(go.Scatter(x=wvs, y=convMusp, mode='lines', name='converged'))
 chart2.update_layout( title="ROfFx (inverse solution for chromophore concentrations, multiple wavelengths, multiple fx)", xaxis_title=xLabel, yaxis_title=yLabel)
-chart2.show(renderer="browser")
+show(chart2)
 # output results
 print("Meas =    [%5.3f %5.3f %5.3f %5.3f]" % (
                  measuredData[0], measuredData[1], measuredData[2], measuredData[3]))
@@ -174,3 +150,4 @@ print("error =   [%3.2f %3.2f %3.2f %3.2f]%%" % (
                  100*abs((measuredData[1]-fit.x[1])/measuredData[1]),
                  100*abs((measuredData[2]-fit.x[2])/measuredData[2]),
                  100*abs((measuredData[3]-fit.x[3])/measuredData[3])))
+print("forward solver cache: %(hits)d hits, %(misses)d misses" % forwardSolverForInversion.cache_info())
@@ -8,30 +8,17 @@
 # The optimization is performed by the Vts library MPFitLevenbergMarquardt
 # method Solve.
 #
-# Import the Operating System so we can access the files for the VTS library
-from pythonnet import load
-load('coreclr')
-import clr
-import os
-file = '../libraries/Vts.dll'
-clr.AddReference(os.path.abspath(file))
 import numpy as np
-import plotly.graph_objects as go
-from Vts import *
-from Vts.Common import *
-from Vts.Extensions import *
-from Vts.Modeling.Optimizers import *
-from Vts.Modeling.ForwardSolvers import *
-from Vts.SpectralMapping import *
-from Vts.Factories import *
-from Vts.MonteCarlo import *
-from Vts.MonteCarlo.Sources import *
-from Vts.MonteCarlo.Tissues import *
-from Vts.MonteCarlo.Detectors import *
-from Vts.MonteCarlo.Factories import *
-from Vts.MonteCarlo.PhotonData import *
-from Vts.MonteCarlo.PostProcessing import *
-from System import Array, Object, Func
+import sys
+module_path = '../modules'
+sys.path.append(module_path)
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (lazy_import, Array, ChromophoreAbsorber, ChromophoreType, Func,
+                           IChromophoreAbsorber, MPFitLevenbergMarquardtOptimizer, NurbsForwardSolver, Object,
+                           PointSourceSDAForwardSolver, PowerLawScatterer, Tissue)
+go = lazy_import('plotly.graph_objects')
+from array_tools import to_numpy
+from graph_tools import show
 # Construct a scatterer
 scatterer = PowerLawScatterer(1.2, 1.42)
 # Setup wavelengths in visible and NIR spectral regimes
@@ -106,19 +93,19 @@ rOfRhoFit= forwardSolverForInversion.ROfRho(opsFit, rho)
 # plot the results using Plotly
 xLabel = "wavelength [nm]"
 yLabel = "R(wavelength) [mm-2]"
-wvs = [w for w in wavelengths]
+wvs = to_numpy(wavelengths)
 # plot measured data
-meas = [m for m in rOfRhoMeasured]
+meas = to_numpy(rOfRhoMeasured)
 chart = go.Figure()
 chart.add_trace(go.Scatter(x=wvs, y=meas, mode='markers', name='measured data'))
 # plot initial guess data
-ig = [i for i in rOfRhoInitialGuess]
+ig = to_numpy(rOfRhoInitialGuess)
 chart.add_trace(go.Scatter(x=wvs, y=ig, mode='markers', name='initial guess'))
 # plot fit
-conv = [f for f in rOfRhoFit]
+conv = to_numpy(rOfRhoFit)
 chart.add_trace(go.Scatter(x=wvs, y=conv, mode='lines', name='converged'))
 chart.update_layout( title="ROfRho (inverse solution for chromophore concentrations, multiple wavelengths, single rho)", xaxis_title=xLabel, yaxis_title=yLabel)
-chart.show(renderer="browser")
+show(chart)
 # output results
 print("Meas =    [%5.3f %5.3f %5.3f]" % (measuredData[0], measuredData[1], measuredData[2]))
 print("IG   =    [%5.3f %5.3f %5.3f] Chi2=%5.3e" % (
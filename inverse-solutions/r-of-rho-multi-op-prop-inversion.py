@@ -8,30 +8,18 @@
 # The optimization is performed by a python library scipy. 
 
 #
-# Import the Operating System so we can access the files for the VTS library
-from pythonnet import load
-load('coreclr')
-import clr
-import os
-file = '../libraries/Vts.dll'
-clr.AddReference(os.path.abspath(file))
+import sys
+module_path = '../modules'
+sys.path.append(module_path)
 import numpy as np
-import plotly.graph_objects as go
-from Vts import *
-from Vts.Common import *
-from Vts.Extensions import *
-from Vts.Modeling.Optimizers import *
-from Vts.Modeling.ForwardSolvers import *
-from Vts.SpectralMapping import *
-from Vts.Factories import *
-from Vts.MonteCarlo import *
-from Vts.MonteCarlo.Sources import *
-from Vts.MonteCarlo.Tissues import *
-from Vts.MonteCarlo.Detectors import *
-from Vts.MonteCarlo.Factories import *
-from Vts.MonteCarlo.PhotonData import *
-from Vts.MonteCarlo.PostProcessing import *
-from System import Array, Object
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (lazy_import, Array, ChromophoreAbsorber, ChromophoreType, IChromophoreAbsorber,
+                           NurbsForwardSolver, PointSourceSDAForwardSolver, PowerLawScatterer, Tissue)
+go = lazy_import('plotly.graph_objects')
+from array_tools import to_numpy
+from graph_tools import show
+from forward_solver_tools import CachedForwardSolver
+from spectral_tools import ChromophoreSpectra, to_optical_properties
 # Construct a scatterer
 scatterer = PowerLawScatterer(1.2, 1.42)
 # Setup wavelengths in visible and NIR spectral regimes
@@ -50,25 +38,24 @@ opsMeasured = Tissue(chromophoresMeasuredData, scatterer, "", n=1.4).GetOpticalP
 # Create measurements using Nurbs-based white Monte Carlo forward solver
 measurementForwardSolver = NurbsForwardSolver()
 rOfRhoMeasured = measurementForwardSolver.ROfRho(opsMeasured, rho)
-# Create a forward solver as a model function for inversion
-forwardSolverForInversion = PointSourceSDAForwardSolver()
+# Create a forward solver as a model function for inversion; evaluations are
+# memoized per optical property set so repeated parameter vectors are not recomputed
+forwardSolverForInversion = CachedForwardSolver(PointSourceSDAForwardSolver())
+
+# Precompute the chromophore extinction table at the wavelengths once so each
+# residual evaluation computes the optical properties with NumPy
+spectra = ChromophoreSpectra.from_vts(
+   [ChromophoreType.HbO2, ChromophoreType.Hb, ChromophoreType.H2O], wavelengths)
 
 # Declare local forward reflectance function that computes reflectance from chromophores
 def CalculateReflectanceVsWavelengthFromChromophoreConcentration(
     chromophoreConcentration, wavelengths, rho, scatterer, forwardSolver):
-# Create a forward solve model function to solve inverse
-   forwardSolverForInversion = PointSourceSDAForwardSolver()
-   # Create an array of chromophore absorbers based on values
-   chromophoresLocal = Array.CreateInstance(IChromophoreAbsorber, 3)
-   chromophoresLocal[0] = ChromophoreAbsorber(ChromophoreType.HbO2, chromophoreConcentration[0])
-   chromophoresLocal[1] = ChromophoreAbsorber(ChromophoreType.Hb, chromophoreConcentration[1])
-   chromophoresLocal[2] = ChromophoreAbsorber(ChromophoreType.H2O, chromophoreConcentration[2])
-   # Compose local tissue to obtain optical properties
-   opsLocal = Tissue(chromophoresLocal, scatterer, "", n=1.4).GetOpticalProperties(wavelengths)
+   # Compute local optical properties from the chromophore concentrations and scatterer
+   opsLocal = to_optical_properties(spectra.mua(chromophoreConcentration),
+                                    spectra.musp(scatterer.A, scatterer.B), g=0.8, n=1.4)
    print("iter:[HbO2,Hb,H2O]=[%3.2f %3.2f %3.2f]" % (
        chromophoreConcentration[0],chromophoreConcentration[1],chromophoreConcentration[2]))
    # Compute reflectance for local absorbers
-   modelDataLocal = Array.CreateInstance(float, len(wavelengths))
    modelDataLocal = forwardSolver.ROfRho(opsLocal, rho) 
    return modelDataLocal
 
@@ -108,19 +95,19 @@ rOfRhoFit= forwardSolverForInversion.ROfRho(opsFit, rho)
 # plot the results using Plotly
 xLabel = "wavelength [nm]"
 yLabel = "R(wavelength) [mm-2]"
-wvs = [w for w in wavelengths]
+wvs = to_numpy(wavelengths)
 # plot measured data
-meas = [m for m in rOfRhoMeasured]
+meas = to_numpy(rOfRhoMeasured)
 chart = go.Figure()
 chart.add_trace(go.Scatter(x=wvs, y=meas, mode='markers', name='measured data'))
 # plot initial guess data
-ig = [i for i in rOfRhoInitialGuess]
+ig = rOfRhoInitialGuess
 chart.add_trace(go.Scatter(x=wvs, y=ig, mode='markers', name='initial guess'))
 # plot fit
-conv = [f for f in rOfRhoFit]
+conv = rOfRhoFit
 chart.add_trace(go.Scatter(x=wvs, y=conv, mode='lines', name='converged'))
 chart.update_layout( title="ROfRho (inverse solution for chromophore concentrations, multiple wavelengths, single rho)", xaxis_title=xLabel, yaxis_title=yLabel)
-chart.show(renderer="browser")
+show(chart)
 # output results
 print("Meas =    [%5.3f %5.3f %5.3f]" % (measuredData[0], measuredData[1], measuredData[2]))
 print("IG   =    [%5.3f %5.3f %5.3f] Chi2=%5.3e" % (initialGuess[0], initialGuess[1], initialGuess[2],
@@ -133,3 +120,4 @@ print("error =   [%5.3f %5.3f %5.3f]%%" % (
                 100*abs((measuredData[0]-fit.x[0])/measuredData[0]),
                 100*abs((measuredData[1]-fit.x[1])/measuredData[1]),
                 100*abs((measuredData[2]-fit.x[2])/measuredData[2])))
+print("forward solver cache: %(hits)d hits, %(misses)d misses" % forwardSolverForInversion.cache_info())
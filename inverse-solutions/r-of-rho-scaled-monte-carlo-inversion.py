@@ -0,0 +1,93 @@
+# This is an example of python code using VTS to provide inverse solution
+# for R(rho) to find chromophore concentrations [HbO2 Hb H2O] and power law
+# coefficients [A b] using rho=[1:1:6]mm and wavelengths=[600:50:1000]nm.
+# Scaled Monte Carlo with Nurbs forward solver provides the simulated
+# measured data and a scaled white Monte Carlo model, computed in NumPy from
+# one stored absorption-free R(rho,t) simulation, provides the model used
+# during the inversion. The baseline is simulated on the first run and read
+# from scaled-monte-carlo-baseline.npz afterwards.
+# The optimization is performed by a python library scipy.
+#
+import os
+import sys
+import time
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (lazy_import, Array, ChromophoreAbsorber, ChromophoreType, IChromophoreAbsorber,
+                           NurbsForwardSolver, PowerLawScatterer, Tissue)
+go = lazy_import('plotly.graph_objects')
+from array_tools import to_numpy
+from graph_tools import show
+from inversion_tools import fit_reflectance
+from scaled_monte_carlo import ScaledMonteCarloROfRhoModel
+from spectral_tools import ChromophoreSpectra
+
+baselinePath = 'scaled-monte-carlo-baseline.npz'
+
+# the baseline simulation runs in a process pool, which re-imports this script
+if __name__ == "__main__":
+    # Build the scaled Monte Carlo model once and store its baseline
+    start_time = time.perf_counter()
+    if os.path.exists(baselinePath):
+        model = ScaledMonteCarloROfRhoModel.load(baselinePath)
+    else:
+        model = ScaledMonteCarloROfRhoModel.from_simulation(photons=1000000)
+        model.save(baselinePath)
+    print(f"baseline: {time.perf_counter() - start_time:.1f} seconds")
+    # Setup wavelengths in visible and NIR spectral regimes
+    wavelengths = Array.CreateInstance(float, 9)
+    for i in range(0, len(wavelengths)):
+        wavelengths[i] = 600.0 + 50 * i
+    wvs = to_numpy(wavelengths)
+    # Setup rhos
+    rhos = np.linspace(1, 6, 6)
+    # Define parameters to fit [HbO2, Hb, H2O, A, b]
+    measuredData = [70.0, 30.0, 0.8, 1.2, 1.42]
+    chromophoresMeasuredData = Array.CreateInstance(IChromophoreAbsorber, 3)
+    chromophoresMeasuredData[0] = ChromophoreAbsorber(ChromophoreType.HbO2, measuredData[0])
+    chromophoresMeasuredData[1] = ChromophoreAbsorber(ChromophoreType.Hb, measuredData[1])
+    chromophoresMeasuredData[2] = ChromophoreAbsorber(ChromophoreType.H2O, measuredData[2])
+    scattererMeasuredData = PowerLawScatterer(measuredData[3], measuredData[4])
+    opsMeasured = Tissue(chromophoresMeasuredData, scattererMeasuredData, "", n=1.4).GetOpticalProperties(wavelengths)
+    # Create measurements using Nurbs-based white Monte Carlo forward solver, shape (rhos, wavelengths)
+    measurementForwardSolver = NurbsForwardSolver()
+    rOfRhoMeasured = np.stack([to_numpy(measurementForwardSolver.ROfRho(opsMeasured, rho))
+                               for rho in rhos])
+
+    # Precompute the chromophore extinction table at the wavelengths once so each
+    # residual evaluation computes the optical properties with NumPy
+    spectra = ChromophoreSpectra.from_vts(
+        [ChromophoreType.HbO2, ChromophoreType.Hb, ChromophoreType.H2O], wavelengths)
+    # the scaled model against the Nurbs solver at the measured optical properties
+    rOfRhoModel = model(spectra.mua(measuredData[0:3]), spectra.musp(measuredData[3], measuredData[4]), rhos)
+    print("max relative difference scaled MC vs Nurbs: %.3f" % np.max(np.abs(rOfRhoModel - rOfRhoMeasured) / rOfRhoMeasured))
+
+    # Run the levenberg-marquardt inversion; the model's analytic derivatives
+    # give the Jacobian
+    initialGuess = np.array([50.0, 40.0, 0.7, 1.0, 1.6])
+    start_time = time.perf_counter()
+    fit = fit_reflectance(rOfRhoMeasured, spectra, rhos, model, initialGuess, x_scale='jac')
+    print(f"inversion with {fit.nfev} evaluations: {time.perf_counter() - start_time:.2f} seconds")
+    rOfRhoInitialGuess = model(spectra.mua(initialGuess[0:3]), spectra.musp(initialGuess[3], initialGuess[4]), rhos)
+    rOfRhoFit = model(spectra.mua(fit.x[0:3]), spectra.musp(fit.x[3], fit.x[4]), rhos)
+
+    # plot the results using Plotly
+    chart = go.Figure()
+    for index in [0, len(rhos) - 1]:
+        chart.add_trace(go.Scatter(x=wvs, y=rOfRhoMeasured[index], mode='markers', name='measured data rho=%g mm' % rhos[index]))
+        chart.add_trace(go.Scatter(x=wvs, y=rOfRhoInitialGuess[index], mode='markers', name='initial guess rho=%g mm' % rhos[index]))
+        chart.add_trace(go.Scatter(x=wvs, y=rOfRhoFit[index], mode='lines', name='converged rho=%g mm' % rhos[index]))
+    chart.update_layout(title="ROfRho (inverse solution with scaled Monte Carlo, multiple wavelengths, multiple rho)",
+                        xaxis_title="wavelength [nm]", yaxis_title="R(wavelength) [mm-2]")
+    chart.update_yaxes(type="log")
+    show(chart)
+    # output results
+    print("Meas =    [%5.3f %5.3f %5.3f %5.3f %5.3f]" % tuple(measuredData))
+    print("IG   =    [%5.3f %5.3f %5.3f %5.3f %5.3f] Chi2=%5.3e" % (
+          *initialGuess, np.sum((rOfRhoMeasured - rOfRhoInitialGuess) ** 2)))
+    print("Conv =    [%5.3f %5.3f %5.3f %5.3f %5.3f] Chi2=%5.3e" % (
+          *fit.x, np.sum((rOfRhoMeasured - rOfRhoFit) ** 2)))
+    print("error =   [%5.3f %5.3f %5.3f %5.3f %5.3f]%%" % tuple(
+          100 * np.abs((np.array(measuredData) - fit.x) / np.array(measuredData))))
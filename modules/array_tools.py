@@ -0,0 +1,88 @@
+import ctypes
+import numpy as np
+from vts_bootstrap import load
+# the System imports below need the CLR; load it with Vts.dll unless a script already did
+load()
+from System import Array, Double, IntPtr
+from System.Runtime.InteropServices import GCHandle, GCHandleType, Marshal
+
+# Helpers to move data between .NET arrays and NumPy arrays in one block copy
+# instead of iterating element by element across the PythonNet boundary.
+
+
+# element types whose .NET memory layout matches a NumPy dtype
+_blittableTypes = {
+    "System.Double": np.float64,
+    "System.Numerics.Complex": np.complex128,
+}
+
+
+def _element_dtype(values):
+    """Return the NumPy dtype matching a .NET array's element type, or None."""
+    if not isinstance(values, Array):
+        return None
+    return _blittableTypes.get(values.GetType().GetElementType().FullName)
+
+
+def _shape(netArray):
+    """Return the shape of a (possibly multi-dimensional) .NET array."""
+    return tuple(netArray.GetLength(i) for i in range(netArray.Rank))
+
+
+def to_numpy(values, dtype=None, out=None):
+    """Copy a .NET array (double[], double[,] or Complex[]) into a new NumPy array.
+
+    With out, the values are copied into that C-contiguous array of the same
+    number of elements instead, e.g. a slice of a larger preallocated buffer,
+    and out is returned.
+    """
+    if values is None:
+        return None
+    elementDtype = _element_dtype(values)
+    if out is not None:
+        if elementDtype is None or out.dtype != elementDtype or not out.flags.c_contiguous:
+            out[...] = to_numpy(values, out.dtype).reshape(out.shape)
+            return out
+        if out.size != values.Length:
+            raise ValueError("out has %d elements but the .NET array has %d" % (out.size, values.Length))
+        result = out
+    elif elementDtype is None:
+        # IEnumerable<double> results and other arrays have no contiguous
+        # buffer, so fall back to a single pass over the sequence
+        return np.fromiter(values, dtype=dtype or float)
+    else:
+        result = np.empty(_shape(values), dtype=elementDtype)
+    if result.size == 0:
+        return result.astype(dtype or elementDtype, copy=False)
+    # pin the .NET array so the GC cannot move it while we copy the block;
+    # multi-dimensional .NET arrays are stored row major like NumPy's C order
+    handle = GCHandle.Alloc(values, GCHandleType.Pinned)
+    try:
+        address = handle.AddrOfPinnedObject().ToInt64()
+        ctypes.memmove(result.ctypes.data, address, result.nbytes)
+    finally:
+        handle.Free()
+    return result.astype(dtype or elementDtype, copy=False)
+
+
+def to_dotnet(values):
+    """Copy an array-like of numbers into a new .NET double array of the same shape."""
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    if values.ndim == 0:
+        values = values.reshape(1)
+    if values.ndim == 1:
+        netArray = Array.CreateInstance(Double, values.shape[0])
+        if values.size > 0:
+            Marshal.Copy(IntPtr(values.ctypes.data), netArray, 0, values.size)
+        return netArray
+    netArray = Array.CreateInstance(Double, *values.shape)
+    if values.size == 0:
+        return netArray
+    # Marshal.Copy only handles one-dimensional arrays, so pin and copy the block
+    handle = GCHandle.Alloc(netArray, GCHandleType.Pinned)
+    try:
+        address = handle.AddrOfPinnedObject().ToInt64()
+        ctypes.memmove(address, values.ctypes.data, values.nbytes)
+    finally:
+        handle.Free()
+    return netArray
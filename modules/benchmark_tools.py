@@ -0,0 +1,129 @@
+import fnmatch
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import timeit
+
+# A small benchmark runner in the style of asv: cases are registered on a
+# BenchmarkSuite with optional parameter grids, every parameter combination is
+# timed with timeit, and each run is appended to a JSON lines history per
+# machine so that a run can be compared with the previous one.
+#
+# A case is a function that does its setup and returns the callable to time:
+#
+#   suite = BenchmarkSuite()
+#
+#   @suite.case(params={'n': [1000, 10000]})
+#   def monte_carlo_run(n):
+#       simulationInput = ...
+#       return lambda: MonteCarloSimulation(simulationInput).Run()
+
+
+class BenchmarkSuite:
+    """Named benchmark cases, each timed for every combination of its parameters."""
+
+    def __init__(self):
+        self.cases = {}
+
+    def case(self, params=None, repeat=5):
+        """Register a case; params maps parameter names to the list of values to time."""
+        def register(function):
+            self.cases[function.__name__] = (function, params or {}, repeat)
+            return function
+        return register
+
+    def benchmarks(self, pattern=None):
+        """Yield (benchmark name, case function, parameters, repeat) for every parameter combination."""
+        for caseName, (function, params, repeat) in self.cases.items():
+            names = list(params)
+            for values in itertools.product(*(params[name] for name in names)):
+                parameters = dict(zip(names, values))
+                name = benchmark_name(caseName, parameters)
+                if pattern is None or fnmatch.fnmatch(name, pattern):
+                    yield name, function, parameters, repeat
+
+    def run(self, pattern=None, progress=None):
+        """Time every benchmark whose name matches the glob pattern and return {name: timings}."""
+        results = {}
+        for name, function, parameters, repeat in self.benchmarks(pattern):
+            results[name] = time_callable(function(**parameters), repeat)
+            if progress is not None:
+                progress(name, results[name])
+        return results
+
+
+def benchmark_name(caseName, parameters):
+    """Return the name of one parameter combination of a case, e.g. monte_carlo_run(n=1000)."""
+    if not parameters:
+        return caseName
+    return "%s(%s)" % (caseName, ", ".join("%s=%s" % item for item in parameters.items()))
+
+
+def time_callable(function, repeat=5):
+    """Return the min, median and max seconds per call of function over repeat samples."""
+    timer = timeit.Timer(function)
+    # enough calls per sample to last at least 0.2 s, one for slow cases
+    number, _ = timer.autorange()
+    samples = [t / number for t in timer.repeat(repeat, number)]
+    return {'min': min(samples), 'median': statistics.median(samples), 'max': max(samples),
+            'number': number, 'repeat': repeat}
+
+
+def machine_name():
+    """Return a file-name friendly identifier of this machine."""
+    name = "%s-%s" % (platform.node() or 'unknown', platform.machine())
+    return "".join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+
+
+def git_revision(path='.'):
+    """Return the current commit of the repository at path, or None outside git."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=path, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def new_run(results, revision=None, **environment):
+    """Return a history record of one run of a suite."""
+    return dict({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'revision': revision,
+                 'machine': machine_name(), 'python': platform.python_version(), 'results': results},
+                **environment)
+
+
+def load_history(path):
+    """Return the runs recorded in a history file, oldest first."""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as historyFile:
+        return [json.loads(line) for line in historyFile if line.strip()]
+
+
+def save_run(path, run):
+    """Append a run to a history file."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as historyFile:
+        historyFile.write(json.dumps(run) + "\n")
+
+
+def compare(previous, current, threshold=1.25):
+    """Compare the median times of two runs.
+
+    Returns (name, previous median, current median, ratio, flag) for each
+    benchmark in both runs, where flag is 'slower' or 'faster' if the ratio is
+    beyond threshold in either direction and '' otherwise.
+    """
+    rows = []
+    for name, timings in current['results'].items():
+        if name not in previous['results']:
+            continue
+        before = previous['results'][name]['median']
+        after = timings['median']
+        ratio = after / before if before > 0 else float('inf')
+        flag = 'slower' if ratio > threshold else 'faster' if ratio < 1 / threshold else ''
+        rows.append((name, before, after, ratio, flag))
+    return rows
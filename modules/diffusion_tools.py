@@ -0,0 +1,166 @@
+from functools import lru_cache
+import numpy as np
+
+# NumPy implementation of the point source standard diffusion approximation
+# (SDA) reflectance used by PointSourceSDAForwardSolver, for evaluating whole
+# arrays of optical properties and rho or fx in one broadcast call without
+# crossing into the CLR. The source is placed one transport mean free path
+# below the surface with an image source above the extrapolated boundary, and
+# reflectance is the hemispherical integral of the fluence and flux through a
+# Fresnel boundary to a medium of index 1. R(fx) is the analytic Hankel
+# transform of R(rho).
+#
+# The functions broadcast mua, musp and rho or fx with the usual NumPy rules,
+# e.g. r_of_rho(mua[:, np.newaxis], musp[:, np.newaxis], rho) has shape
+# (len(mua), len(rho)); the refractive index n is a scalar.
+
+
+@lru_cache(maxsize=None)
+def fresnel_moments(n):
+    """Return the first and second moments over cos(theta) of the Fresnel reflectance from index n to 1."""
+    # total internal reflection below the critical cosine, Gauss-Legendre above it
+    criticalCosine = np.sqrt(1 - 1 / n ** 2) if n > 1 else 0.0
+    nodes, weights = np.polynomial.legendre.leggauss(200)
+    mu = criticalCosine + (nodes + 1) * (1 - criticalCosine) / 2
+    weights = weights * (1 - criticalCosine) / 2
+    transmittedCosine = np.sqrt(np.maximum(1 - n ** 2 * (1 - mu ** 2), 0))
+    rs = (n * mu - transmittedCosine) / (n * mu + transmittedCosine)
+    rp = (mu - n * transmittedCosine) / (mu + n * transmittedCosine)
+    reflectance = (rs ** 2 + rp ** 2) / 2
+    return tuple(criticalCosine ** (m + 1) / (m + 1) + np.sum(weights * reflectance * mu ** m) for m in (1, 2))
+
+
+def _diffusion_parameters(mua, musp, n):
+    """Return D, mueff, the source depth zp, the image source depth and the fluence and flux coefficients."""
+    mua = np.asarray(mua, dtype=float)
+    musp = np.asarray(musp, dtype=float)
+    n = float(n)
+    m1, m2 = fresnel_moments(n)
+    mutr = mua + musp
+    D = 1 / (3 * mutr)
+    mueff = np.sqrt(3 * mua * mutr)
+    zp = 1 / mutr
+    # extrapolated boundary zb = 2AD
+    A = (1 + 3 * m2) / (1 - 2 * m1)
+    zImage = zp + 4 * A * D
+    return D, mueff, zp, zImage, (1 - 2 * m1) / 4, (1 - 3 * m2) / 2
+
+
+def r_of_rho(mua, musp, rho, n=1.4):
+    """Return the steady-state reflectance R(rho) [mm-2] of a semi-infinite medium."""
+    D, mueff, zp, zImage, fluenceCoefficient, fluxCoefficient = _diffusion_parameters(mua, musp, n)
+    rho = np.asarray(rho, dtype=float)
+    r1 = np.sqrt(rho ** 2 + zp ** 2)
+    r2 = np.sqrt(rho ** 2 + zImage ** 2)
+    fluence = (np.exp(-mueff * r1) / r1 - np.exp(-mueff * r2) / r2) / (4 * np.pi * D)
+    flux = (zp * (mueff + 1 / r1) * np.exp(-mueff * r1) / r1 ** 2
+            + zImage * (mueff + 1 / r2) * np.exp(-mueff * r2) / r2 ** 2) / (4 * np.pi)
+    return fluenceCoefficient * fluence + fluxCoefficient * flux
+
+
+def r_of_fx(mua, musp, fx, n=1.4):
+    """Return the spatial-frequency reflectance R(fx) [unitless], the Hankel transform of r_of_rho."""
+    D, mueff, zp, zImage, fluenceCoefficient, fluxCoefficient = _diffusion_parameters(mua, musp, n)
+    mueffPrime = np.sqrt(mueff ** 2 + (2 * np.pi * np.asarray(fx, dtype=float)) ** 2)
+    sourceTerm = np.exp(-mueffPrime * zp)
+    imageTerm = np.exp(-mueffPrime * zImage)
+    fluence = (sourceTerm - imageTerm) / (2 * D * mueffPrime)
+    flux = (sourceTerm + imageTerm) / 2
+    return fluenceCoefficient * fluence + fluxCoefficient * flux
+
+
+def _parameter_derivatives(mua, musp):
+    """Return the derivatives of (mutr, mueff^2) with respect to mua and musp, in that order."""
+    mua = np.asarray(mua, dtype=float)
+    musp = np.asarray(musp, dtype=float)
+    mutr = mua + musp
+    return [(np.ones_like(mutr), 3 * (mutr + mua)), (np.ones_like(mutr), 3 * mua)]
+
+
+def r_of_rho_derivatives(mua, musp, rho, n=1.4):
+    """Return R(rho) and its partial derivatives with respect to mua and musp."""
+    D, mueff, zp, zImage, fluenceCoefficient, fluxCoefficient = _diffusion_parameters(mua, musp, n)
+    rho = np.asarray(rho, dtype=float)
+    r1 = np.sqrt(rho ** 2 + zp ** 2)
+    r2 = np.sqrt(rho ** 2 + zImage ** 2)
+    g1 = np.exp(-mueff * r1) / r1
+    g2 = np.exp(-mueff * r2) / r2
+    h1 = (mueff + 1 / r1) * g1 / r1
+    h2 = (mueff + 1 / r2) * g2 / r2
+    fluence = (g1 - g2) / (4 * np.pi * D)
+    flux = (zp * h1 + zImage * h2) / (4 * np.pi)
+    reflectance = fluenceCoefficient * fluence + fluxCoefficient * flux
+    mutr = 1 / zp
+    derivatives = []
+    for dMutr, dMueffSquared in _parameter_derivatives(mua, musp):
+        # every length scale is inversely proportional to mutr
+        dD = -D / mutr * dMutr
+        dZp = -zp / mutr * dMutr
+        dZImage = -zImage / mutr * dMutr
+        dMueff = dMueffSquared / (2 * mueff)
+        dR1 = zp * dZp / r1
+        dR2 = zImage * dZImage / r2
+        dG1 = -g1 * (dMueff * r1 + mueff * dR1 + dR1 / r1)
+        dG2 = -g2 * (dMueff * r2 + mueff * dR2 + dR2 / r2)
+        dH1 = (dMueff - dR1 / r1 ** 2) * g1 / r1 + (mueff + 1 / r1) * (dG1 / r1 - g1 * dR1 / r1 ** 2)
+        dH2 = (dMueff - dR2 / r2 ** 2) * g2 / r2 + (mueff + 1 / r2) * (dG2 / r2 - g2 * dR2 / r2 ** 2)
+        dFluence = (dG1 - dG2) / (4 * np.pi * D) - fluence * dD / D
+        dFlux = (dZp * h1 + zp * dH1 + dZImage * h2 + zImage * dH2) / (4 * np.pi)
+        derivatives.append(fluenceCoefficient * dFluence + fluxCoefficient * dFlux)
+    return reflectance, derivatives[0], derivatives[1]
+
+
+def r_of_fx_derivatives(mua, musp, fx, n=1.4):
+    """Return R(fx) and its partial derivatives with respect to mua and musp."""
+    D, mueff, zp, zImage, fluenceCoefficient, fluxCoefficient = _diffusion_parameters(mua, musp, n)
+    mueffPrime = np.sqrt(mueff ** 2 + (2 * np.pi * np.asarray(fx, dtype=float)) ** 2)
+    sourceTerm = np.exp(-mueffPrime * zp)
+    imageTerm = np.exp(-mueffPrime * zImage)
+    fluence = (sourceTerm - imageTerm) / (2 * D * mueffPrime)
+    flux = (sourceTerm + imageTerm) / 2
+    reflectance = fluenceCoefficient * fluence + fluxCoefficient * flux
+    mutr = 1 / zp
+    derivatives = []
+    for dMutr, dMueffSquared in _parameter_derivatives(mua, musp):
+        dD = -D / mutr * dMutr
+        dZp = -zp / mutr * dMutr
+        dZImage = -zImage / mutr * dMutr
+        dMueffPrime = dMueffSquared / (2 * mueffPrime)
+        dSourceTerm = -sourceTerm * (dMueffPrime * zp + mueffPrime * dZp)
+        dImageTerm = -imageTerm * (dMueffPrime * zImage + mueffPrime * dZImage)
+        dFluence = (dSourceTerm - dImageTerm) / (2 * D * mueffPrime) - fluence * (dD / D + dMueffPrime / mueffPrime)
+        dFlux = (dSourceTerm + dImageTerm) / 2
+        derivatives.append(fluenceCoefficient * dFluence + fluxCoefficient * dFlux)
+    return reflectance, derivatives[0], derivatives[1]
+
+
+class SDAROfFxModel:
+    """NumPy R(fx) forward model for inversion_tools, equivalent to VtsROfFxModel with PointSourceSDA."""
+
+    def __init__(self, n=1.4):
+        self.n = n
+
+    def __call__(self, mua, musp, fxs):
+        """Return R(fx) with shape (number of fxs, number of wavelengths)."""
+        return r_of_fx(*self._broadcast(mua, musp, fxs), self.n)
+
+    def derivatives(self, mua, musp, fxs):
+        """Return R(fx) and its derivatives with respect to mua and musp, each (number of fxs, number of wavelengths)."""
+        return r_of_fx_derivatives(*self._broadcast(mua, musp, fxs), self.n)
+
+    @staticmethod
+    def _broadcast(mua, musp, positions):
+        return (np.asarray(mua)[np.newaxis, :], np.asarray(musp)[np.newaxis, :],
+                np.asarray(positions, dtype=float)[:, np.newaxis])
+
+
+class SDAROfRhoModel(SDAROfFxModel):
+    """NumPy R(rho) forward model for inversion_tools, equivalent to PointSourceSDAForwardSolver.ROfRho."""
+
+    def __call__(self, mua, musp, rhos):
+        """Return R(rho) with shape (number of rhos, number of wavelengths)."""
+        return r_of_rho(*self._broadcast(mua, musp, rhos), self.n)
+
+    def derivatives(self, mua, musp, rhos):
+        """Return R(rho) and its derivatives with respect to mua and musp, each (number of rhos, number of wavelengths)."""
+        return r_of_rho_derivatives(*self._broadcast(mua, musp, rhos), self.n)
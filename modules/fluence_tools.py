@@ -0,0 +1,288 @@
+import numpy as np
+from vts_bootstrap import (Array, ComputationFactory, Double, DoubleRange, FluenceSolutionDomainType,
+                           IndependentVariableAxis, IOpticalPropertyRegion, LayerOpticalPropertyRegion,
+                           OpticalProperties)
+from array_tools import to_numpy, to_dotnet
+
+# Fluence(rho, z) and photon hitting density helpers for radially symmetric
+# problems. The fluence of a point or distributed source only depends on |rho|,
+# so the solvers are evaluated once per unique |rho| instead of for every
+# negative and positive rho of a plotting grid. Results are NumPy arrays of
+# shape (number of rhos, number of zs), rho-major like the solver output.
+#
+# For plots of the full -rho..rho cross section, the mirrored functions
+# evaluate the non-negative rhos straight into the second half of a
+# preallocated grid and fill the first half with one reversed in-place copy,
+# so neither the solver nor np.concatenate touch the negative rhos.
+
+
+def _layered_fluence(solver, opRegions, rhos, zs):
+    """FluenceOfRhoAndZ of a layered forward solver such as TwoLayerSDAForwardSolver."""
+    regions = Array[Array[IOpticalPropertyRegion]]([opRegions])
+    return solver.FluenceOfRhoAndZ(regions, to_dotnet(rhos), to_dotnet(zs))
+
+
+def _computed_fluence(solver, opRegions, rhos, zs):
+    """ComputationFactory.ComputeFluence over rho and z."""
+    rhos = to_dotnet(rhos)
+    independentAxes = Array.CreateInstance(IndependentVariableAxis, 1)
+    independentAxes[0] = IndependentVariableAxis.Z
+    independentValues = Array.CreateInstance(Array[Double], 2)
+    independentValues[0] = rhos
+    independentValues[1] = to_dotnet(zs)
+    return ComputationFactory.ComputeFluence(solver, FluenceSolutionDomainType.FluenceOfRhoAndZ, independentAxes,
+                                             independentValues, opRegions, rhos)
+
+
+# ways of evaluating the fluence, by name
+_fluenceMethods = {
+    'FluenceOfRhoAndZ': _layered_fluence,
+    'ComputeFluence': _computed_fluence,
+}
+
+
+def layer_regions(layers):
+    """Return the IOpticalPropertyRegion array of layers given as (zStart, zStop, mua, musp, g, n), top layer first.
+
+    Use float('inf') as the zStop of the bottom layer.
+    """
+    regions = Array.CreateInstance(IOpticalPropertyRegion, len(layers))
+    for i, (zStart, zStop, mua, musp, g, n) in enumerate(layers):
+        regions[i] = LayerOpticalPropertyRegion(DoubleRange(float(zStart), float(zStop), 2),
+                                                OpticalProperties(float(mua), float(musp), float(g), float(n)))
+    return regions
+
+
+def layered_fluence_batch(solver, tissues, rhos, zs):
+    """Return the fluence of N tissues from one FluenceOfRhoAndZ call, shape (N, number of rhos, number of zs).
+
+    tissues is a list of IOpticalPropertyRegion arrays or of layer lists as
+    taken by layer_regions, or an (N, layers, 6) array of such layers. The
+    solver returns the tissues one after another, each rho-major, so the
+    result is a reshape of the block copy.
+    """
+    regions = Array.CreateInstance(Array[IOpticalPropertyRegion], len(tissues))
+    for i, tissue in enumerate(tissues):
+        regions[i] = layer_regions(tissue) if isinstance(tissue, (list, tuple, np.ndarray)) else tissue
+    rhos = np.asarray(rhos, dtype=float)
+    zs = np.asarray(zs, dtype=float)
+    fluence = solver.FluenceOfRhoAndZ(regions, to_dotnet(rhos), to_dotnet(zs))
+    return to_numpy(fluence).reshape(len(tissues), len(rhos), len(zs))
+
+
+def unique_radii(rhos):
+    """Return the sorted unique |rho| and the index of every rho into them."""
+    radii, inverse = np.unique(np.abs(np.asarray(rhos, dtype=float)), return_inverse=True)
+    return radii, inverse.ravel()
+
+
+def mirrored_rhos(rhos):
+    """Return the rho axis [-rhos[::-1], rhos] of non-negative ascending rhos, with rho=0 only once."""
+    rhos = np.asarray(rhos, dtype=float)
+    if rhos.ndim != 1 or np.any(rhos < 0) or np.any(np.diff(rhos) <= 0):
+        raise ValueError("rhos must be non-negative and strictly increasing")
+    negativeCount = len(rhos) - (1 if len(rhos) and rhos[0] == 0 else 0)
+    allRhos = np.empty(negativeCount + len(rhos))
+    allRhos[negativeCount:] = rhos
+    allRhos[:negativeCount] = -rhos[::-1][:negativeCount]
+    return allRhos
+
+
+def mirror_rows(grid, negativeCount):
+    """Fill the first negativeCount rows of grid with the reversed rows after them, in place, and return grid."""
+    if negativeCount:
+        grid[:negativeCount] = grid[-negativeCount:][::-1]
+    return grid
+
+
+def fluence_of_rho_and_z(solver, opRegions, rhos, zs, method='FluenceOfRhoAndZ'):
+    """Return the fluence for any rhos, evaluating the solver once per unique |rho|.
+
+    method is 'FluenceOfRhoAndZ' for layered solvers (opRegions is the
+    IOpticalPropertyRegion array of the layers) or 'ComputeFluence' for
+    ComputationFactory.ComputeFluence.
+    """
+    rhos = np.asarray(rhos, dtype=float)
+    zs = np.asarray(zs, dtype=float)
+    radii, inverse = unique_radii(rhos)
+    fluence = to_numpy(_fluenceMethods[method](solver, opRegions, radii, zs)).reshape(len(radii), len(zs))
+    if len(radii) == len(rhos) and np.array_equal(radii, rhos):
+        return fluence
+    return fluence[inverse]
+
+
+def mirrored_fluence_of_rho_and_z(solver, opRegions, rhos, zs, method='FluenceOfRhoAndZ'):
+    """Return (allRhos, fluence) on the mirrored axis of non-negative ascending rhos.
+
+    Only rhos are passed to the solver; fluence[len(allRhos) - len(rhos):] is
+    the solver result itself and the rows before it are its mirror image.
+    """
+    allRhos = mirrored_rhos(rhos)
+    zs = np.asarray(zs, dtype=float)
+    negativeCount = len(allRhos) - len(rhos)
+    fluence = np.empty((len(allRhos), len(zs)))
+    to_numpy(_fluenceMethods[method](solver, opRegions, allRhos[negativeCount:], zs), out=fluence[negativeCount:])
+    return allRhos, mirror_rows(fluence, negativeCount)
+
+
+def phd_of_rho_and_z(solver, fluence, sourceDetectorSeparation, ops, allRhos, zs):
+    """Return the photon hitting density (number of rhos, number of zs) from a fluence on the same grid.
+
+    solver is the forward solver or ForwardSolverType passed to
+    ComputationFactory.GetPHD. Unlike the fluence, the photon hitting density is
+    not symmetric in rho, so it needs the fluence on the full grid, e.g. from
+    mirrored_fluence_of_rho_and_z.
+    """
+    zs = np.asarray(zs, dtype=float)
+    phd = ComputationFactory.GetPHD(solver, to_dotnet(np.ravel(fluence)), sourceDetectorSeparation, ops,
+                                    to_dotnet(allRhos), to_dotnet(zs))
+    return to_numpy(phd).reshape(len(allRhos), len(zs))
+
+
+def phd_stack(solver, opRegions, sourceDetectorSeparations, rhos, zs, method='FluenceOfRhoAndZ'):
+    """Return the photon hitting density at every separation, shape (separations, number of rhos, number of zs).
+
+    By reciprocity the photon hitting density at (rho, z) for a detector at
+    sds is Fluence(|rho|, z) * Fluence(|sds - rho|, z), the fluence from the
+    source times the fluence of a source at the detector. This is meant to
+    match GetPHD with the same solver and tissue, but the two have not yet
+    been compared on Vts.dll; benchmarks/phd-stack.py reports their largest
+    relative difference. The fluence is evaluated once, over the union of
+    |rho| and every |sds - rho|, and all products are formed in one gather
+    and one broadcast multiply.
+    """
+    rhos = np.asarray(rhos, dtype=float)
+    zs = np.asarray(zs, dtype=float)
+    separations = np.atleast_1d(np.asarray(sourceDetectorSeparations, dtype=float))
+    radii, inverse = unique_radii(np.concatenate((rhos, (separations[:, None] - rhos[None, :]).ravel())))
+    fluence = to_numpy(_fluenceMethods[method](solver, opRegions, radii, zs)).reshape(len(radii), len(zs))
+    sourceFluence = fluence[inverse[:len(rhos)]]
+    detectorIndices = inverse[len(rhos):].reshape(len(separations), len(rhos))
+    # gather the detector fluence straight into the result, then scale it by the source fluence in place
+    stack = np.take(fluence, detectorIndices, axis=0)
+    stack *= sourceFluence
+    return stack
+
+
+class AdaptiveGrid:
+    """Values on an adaptively refined, non-uniform rho x z grid."""
+
+    def __init__(self, rhos, zs, values, evaluations, converged):
+        self.Rhos = rhos
+        self.Zs = zs
+        # shape (number of rhos, number of zs)
+        self.Values = values
+        # number of (rho, z) points the solver was evaluated at
+        self.Evaluations = evaluations
+        # False if maxLevels stopped the refinement before the tolerance was met
+        self.Converged = converged
+
+    def points(self):
+        """Return the rho, z and value of every grid point as flat arrays."""
+        rhoGrid, zGrid = np.meshgrid(self.Rhos, self.Zs, indexing='ij')
+        return rhoGrid.ravel(), zGrid.ravel(), self.Values.ravel()
+
+    def resample(self, rhos, zs):
+        """Interpolate the values linearly in log space onto the grid rhos x zs."""
+        logValues = _interpolate(_log(self.Values), self.Zs, np.asarray(zs, dtype=float), 1)
+        return np.exp(_interpolate(logValues, self.Rhos, np.asarray(rhos, dtype=float), 0))
+
+
+def _log(values):
+    # the fluence is positive; keep zeros far from the source finite
+    return np.log(np.maximum(values, np.finfo(float).tiny))
+
+
+def _interpolate(values, coordinates, newCoordinates, axis):
+    """Interpolate values linearly along one axis, clamped at the ends like np.interp."""
+    right = np.clip(np.searchsorted(coordinates, newCoordinates), 1, len(coordinates) - 1)
+    left = right - 1
+    weight = np.clip((newCoordinates - coordinates[left]) / (coordinates[right] - coordinates[left]), 0, 1)
+    weight = weight.reshape((-1, 1) if axis == 0 else (1, -1))
+    return np.take(values, left, axis=axis) * (1 - weight) + np.take(values, right, axis=axis) * weight
+
+
+def _refine_axis(evaluate, coordinates, otherCoordinates, values, active, tolerance, axis):
+    """Evaluate the midpoints of the active intervals of one axis and insert them.
+
+    Returns the new coordinates, values, active flags of the new intervals and
+    the number of points evaluated. An interval stays active, split in two, if
+    the midpoint differs from the linear interpolation of its ends by more
+    than tolerance in log space anywhere along the other axis.
+    """
+    intervals = np.flatnonzero(active)
+    if len(intervals) == 0:
+        return coordinates, values, active, 0
+    midpoints = 0.5 * (coordinates[intervals] + coordinates[intervals + 1])
+    if axis == 0:
+        midValues = evaluate(midpoints, otherCoordinates)
+    else:
+        midValues = evaluate(otherCoordinates, midpoints).T
+    logValues = _log(values) if axis == 0 else _log(values).T
+    errors = np.max(np.abs(_log(midValues) - 0.5 * (logValues[intervals] + logValues[intervals + 1])), axis=1)
+    newCoordinates = np.concatenate((coordinates, midpoints))
+    order = np.argsort(newCoordinates, kind='stable')
+    newCoordinates = newCoordinates[order]
+    if axis == 0:
+        newValues = np.concatenate((values, midValues))[order]
+    else:
+        newValues = np.concatenate((values, midValues.T), axis=1)[:, order]
+    split = np.zeros(len(coordinates) - 1, dtype=bool)
+    split[intervals] = True
+    refine = np.zeros(len(coordinates) - 1, dtype=bool)
+    refine[intervals] = errors > tolerance
+    # every split interval contributes two halves with its refine flag, the others one inactive interval
+    newActive = np.repeat(refine, np.where(split, 2, 1))
+    return newCoordinates, newValues, newActive, midValues.size
+
+
+def adaptive_grid(evaluate, rhos, zs, tolerance=0.01, maxLevels=8):
+    """Refine the grid rhos x zs where evaluate is not linear in log space to within tolerance.
+
+    evaluate(rhos, zs) returns positive values of shape (len(rhos), len(zs)).
+    Starting from the coarse ascending rhos and zs, each level evaluates the
+    midpoints of the rho intervals still being refined and then of the z
+    intervals, keeps every evaluated point and continues to refine only the
+    halves of intervals whose midpoint error exceeded tolerance. The grid stays
+    a tensor product, as FluenceOfRhoAndZ needs, so refinement near the source
+    adds whole rows and columns. Returns an AdaptiveGrid.
+    """
+    rhos = np.asarray(rhos, dtype=float)
+    zs = np.asarray(zs, dtype=float)
+    values = evaluate(rhos, zs)
+    evaluations = values.size
+    rhoActive = np.ones(len(rhos) - 1, dtype=bool)
+    zActive = np.ones(len(zs) - 1, dtype=bool)
+    for _ in range(maxLevels):
+        if not rhoActive.any() and not zActive.any():
+            break
+        rhos, values, rhoActive, count = _refine_axis(evaluate, rhos, zs, values, rhoActive, tolerance, 0)
+        evaluations += count
+        zs, values, zActive, count = _refine_axis(evaluate, zs, rhos, values, zActive, tolerance, 1)
+        evaluations += count
+    return AdaptiveGrid(rhos, zs, values, evaluations, not rhoActive.any() and not zActive.any())
+
+
+def adaptive_fluence_of_rho_and_z(solver, opRegions, rhos, zs, tolerance=0.01, maxLevels=8,
+                                  method='FluenceOfRhoAndZ'):
+    """Return an AdaptiveGrid of the fluence refined from the coarse grid rhos x zs.
+
+    tolerance is the allowed error of the log fluence, about the relative
+    error, of linear interpolation between grid points. Use resample() on the
+    result for a uniform grid to plot.
+    """
+    return adaptive_grid(lambda r, z: fluence_of_rho_and_z(solver, opRegions, r, z, method), rhos, zs,
+                         tolerance, maxLevels)
+
+
+def adaptive_phd_of_rho_and_z(solver, opRegions, phdSolver, sourceDetectorSeparation, ops, rhos, zs,
+                              tolerance=0.01, maxLevels=8, method='FluenceOfRhoAndZ'):
+    """Return an AdaptiveGrid of the photon hitting density refined from the coarse grid rhos x zs.
+
+    The fluence of solver and opRegions is evaluated at every new point and
+    passed to GetPHD with phdSolver; rhos may span both sides of the source.
+    """
+    def evaluate(r, z):
+        fluence = fluence_of_rho_and_z(solver, opRegions, r, z, method)
+        return phd_of_rho_and_z(phdSolver, fluence, sourceDetectorSeparation, ops, r, z)
+    return adaptive_grid(evaluate, rhos, zs, tolerance, maxLevels)
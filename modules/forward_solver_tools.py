@@ -0,0 +1,78 @@
+from collections import OrderedDict
+import numpy as np
+from vts_bootstrap import Array, OpticalProperties
+from array_tools import to_numpy
+
+# Helpers around the VTS forward solvers.
+
+
+def _quantize(value, significantDigits):
+    """Round a value to a number of significant digits so nearby inputs share a key."""
+    return float('%.*g' % (significantDigits, value))
+
+
+class CachedForwardSolver:
+    """Forward solver wrapper that memoizes ROfRho and ROfFx per optical property set.
+
+    Results are cached per (mua, musp, g, n, rho or fx) rounded to
+    significantDigits, in a least recently used dictionary of at most maxSize
+    entries. Keep significantDigits finer than the finite-difference step of the
+    optimizer, otherwise perturbed parameters hit the unperturbed entry.
+    """
+
+    def __init__(self, forwardSolver, significantDigits=12, maxSize=100000):
+        self.forwardSolver = forwardSolver
+        self.significantDigits = significantDigits
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def ROfRho(self, ops, rho):
+        """Return R(rho) for each optical property set as a NumPy array."""
+        return self._evaluate('ROfRho', ops, rho)
+
+    def ROfFx(self, ops, fx):
+        """Return R(fx) for each optical property set as a NumPy array."""
+        return self._evaluate('ROfFx', ops, fx)
+
+    def _key(self, methodName, op, x):
+        digits = self.significantDigits
+        return (methodName, _quantize(op.Mua, digits), _quantize(op.Musp, digits),
+                _quantize(op.G, digits), _quantize(op.N, digits), _quantize(x, digits))
+
+    def _evaluate(self, methodName, ops, x):
+        if isinstance(ops, OpticalProperties):
+            ops = [ops]
+        ops = list(ops)
+        keys = [self._key(methodName, op, x) for op in ops]
+        values = np.empty(len(ops))
+        missing = []
+        for i, key in enumerate(keys):
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                values[i] = self._cache[key]
+                self.hits += 1
+            else:
+                missing.append(i)
+        if missing:
+            self.misses += len(missing)
+            # evaluate all misses with one call to the solver
+            solve = getattr(self.forwardSolver, methodName)
+            computed = to_numpy(solve(Array[OpticalProperties]([ops[i] for i in missing]), x))
+            for i, value in zip(missing, computed):
+                values[i] = value
+                self._cache[keys[i]] = value
+            while len(self._cache) > self.maxSize:
+                self._cache.popitem(last=False)
+        return values
+
+    def cache_info(self):
+        """Return the hit and miss counters and the current number of cached entries."""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._cache)}
+
+    def clear(self):
+        """Empty the cache and reset the counters."""
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
@@ -1,21 +1,420 @@
-import plotly.graph_objects as go
+import atexit
+import base64
+import itertools
+import os
+import pickle
+import queue
+import struct
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from vts_bootstrap import lazy_import
+
+# plotly is slow to import, so it is only loaded when the first chart is made
+go = lazy_import('plotly.graph_objects')
+
+# Large (rho, z) grids are not sent to plotly at full resolution: a 2000x2000
+# grid is four million points in the HTML although the chart is at most a
+# thousand or so pixels wide. heatmap takes NumPy arrays as they are and
+# reduces them to the display resolution first, either by keeping every k-th
+# row and column ('decimate') or by taking the min, max or mean of each k x k
+# block ('min', 'max', 'mean'; min and max keep narrow peaks that decimation
+# can step over). With image=True the reduced grid is coloured here and
+# embedded as one PNG instead of a Heatmap trace, which is the smallest output
+# but has no hover values and needs evenly spaced axes. zoomable_heatmap
+# re-reduces the visible window every time the axes are zoomed, so zooming in
+# shows the full resolution.
+#
+# Scripts end with show(chart) instead of chart.show(renderer="browser") or
+# plt.show(). Normally that opens the chart as before, but when the
+# environment variable VTS_FIGURE_DIR is set the figure is written to that
+# folder instead, in the formats listed in VTS_FIGURE_FORMATS (default
+# "html,png"; matplotlib figures skip html), without blocking the script. Files
+# are named after the script and its start time unless a name is given. The files are written by a pool of
+# FigureExporter worker processes; each keeps its rendering engine (kaleido
+# for plotly images, the Agg backend for matplotlib) running across figures,
+# so thousands of plots are rendered in parallel and pay the engine start-up
+# once per worker. The workers are plain subprocesses running this module, so
+# unlike multiprocessing workers they do not re-run the calling script.
+
+# folder that figures are written to instead of being shown, when set
+FIGURE_DIR_VARIABLE = 'VTS_FIGURE_DIR'
+# comma separated formats written in headless mode
+FIGURE_FORMATS_VARIABLE = 'VTS_FIGURE_FORMATS'
+# number of export workers in headless mode
+FIGURE_WORKERS_VARIABLE = 'VTS_FIGURE_WORKERS'
+
+# the largest grid sent to plotly, (x, y), unless given
+DISPLAY_SIZE = (800, 800)
+
+# ways of reducing a block of values to one value
+_reductions = {
+    'min': np.nanmin,
+    'max': np.nanmax,
+    'mean': np.nanmean,
+}
+
+
+def _block_sizes(shape, size):
+    return tuple(max(1, -(-n // m)) for n, m in zip(shape, size))
+
+
+def reduce_grid(values, x, y, size=DISPLAY_SIZE, method='decimate'):
+    """Reduce values of shape (len(x), len(y)) to at most size points.
+
+    Returns (values, x, y) of the reduced grid. method is 'decimate' or 'min',
+    'max' or 'mean' of each block, whose coordinate is then the block mean.
+    """
+    values = np.asarray(values)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if values.shape != (len(x), len(y)):
+        raise ValueError("values has shape %s but the axes have %d and %d points" % (values.shape, len(x), len(y)))
+    bx, by = _block_sizes(values.shape, size)
+    if bx == 1 and by == 1:
+        return values, x, y
+    if method == 'decimate':
+        return values[::bx, ::by], x[::bx], y[::by]
+    if method not in _reductions:
+        raise ValueError("unknown method %r, expected 'decimate' or one of %s" % (method, sorted(_reductions)))
+    # pad with NaN to whole blocks; the nan-reductions ignore the padding
+    nx, ny = -(-len(x) // bx), -(-len(y) // by)
+    padded = np.full((nx * bx, ny * by), np.nan)
+    padded[:len(x), :len(y)] = values
+    blocks = padded.reshape(nx, bx, ny, by)
+    return (_reductions[method](blocks, axis=(1, 3)), _block_means(x, bx, nx), _block_means(y, by, ny))
+
+
+def _block_means(axis, blockSize, count):
+    padded = np.full(count * blockSize, np.nan)
+    padded[:len(axis)] = axis
+    return np.nanmean(padded.reshape(count, blockSize), axis=1)
+
+
+def _is_uniform(axis):
+    steps = np.diff(axis)
+    return len(axis) > 1 and np.allclose(steps, steps[0], rtol=1e-6, atol=0)
+
+
+def _colorize(values, colorscale, zmin, zmax):
+    """Map values to RGBA bytes with a plotly colorscale; NaN is transparent."""
+    from plotly.colors import get_colorscale, hex_to_rgb, unlabel_rgb
+    scale = get_colorscale(colorscale) if isinstance(colorscale, str) else colorscale
+    stops = np.array([stop for stop, _ in scale])
+    colors = np.array([hex_to_rgb(color) if color.startswith('#') else unlabel_rgb(color) for _, color in scale],
+                      dtype=float)
+    fraction = (values - zmin) / (zmax - zmin) if zmax > zmin else np.zeros_like(values)
+    fraction = np.clip(np.nan_to_num(fraction), 0, 1)
+    rgba = np.empty(values.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = np.interp(fraction, stops, colors[:, channel]).round()
+    rgba[..., 3] = np.where(np.isfinite(values), 255, 0)
+    return rgba
+
+
+def png_bytes(rgba):
+    """Encode an (height, width, 4) uint8 array as a PNG."""
+    height, width, _ = rgba.shape
+    # every scanline starts with filter type 0 (none); zlib does the compression
+    scanlines = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(scanlines.tobytes(), 9))
+            + chunk(b'IEND', b''))
+
+
+def _image_traces(values, x0, dx, y0, dy, colorscale, title):
+    zmin, zmax = float(np.nanmin(values)), float(np.nanmax(values))
+    # image rows are y and columns are x, values are (x, y)
+    source = 'data:image/png;base64,' + base64.b64encode(
+        png_bytes(_colorize(values.T, colorscale, zmin, zmax))).decode('ascii')
+    image = go.Image(source=source, x0=x0, dx=dx, y0=y0, dy=dy, hoverinfo='skip')
+    # an empty scatter only to draw the colorbar of the image
+    colorbar = go.Scatter(x=[None], y=[None], mode='markers', showlegend=False, hoverinfo='skip',
+                          marker=dict(colorscale=colorscale, cmin=zmin, cmax=zmax, color=[zmin],
+                                      showscale=True, colorbar=dict(title=title)))
+    return [image, colorbar]
+
+
+def _heatmap_trace(values, x, y, colorscale, title):
+    return go.Heatmap(z=values, x=x, y=y, transpose=True, colorscale=colorscale, colorbar=dict(title=title))
+
 
 # Heatmap function to convert the data into a heat map
-def heatmap(values, x, y, x_label="", y_label="", title=""):
-    """Create a heatmap chart."""
-    # values should be a 2D array-like (list of lists or 2D numpy array)
-    fig = go.Figure(data=go.Heatmap(
-        z=values,
-        x=x,
-        y=y,
-        transpose=True,
-        colorscale='Hot',
-        colorbar=dict(title=title)
-    ))
+def heatmap(values, x, y, x_label="", y_label="", title="", size=DISPLAY_SIZE, method='decimate', image=False,
+            colorscale='Hot'):
+    """Create a heatmap chart.
+
+    values is (len(x), len(y)), a NumPy array or a list of lists. Grids
+    larger than size are reduced with reduce_grid(method). With image=True
+    the grid is drawn as an embedded PNG with equally scaled axes; both axes
+    must then be evenly spaced.
+    """
+    if image:
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if not (_is_uniform(x) and _is_uniform(y)):
+            raise ValueError("image=True needs evenly spaced x and y; use image=False for this grid")
+        # the pixel pitch is the original spacing times the block size; the
+        # coordinate of a partial last block would be off that pitch
+        bx, by = _block_sizes(np.shape(values), size)
+        dx, dy = (x[1] - x[0]) * bx, (y[1] - y[0]) * by
+        values, x, y = reduce_grid(values, x, y, size, method)
+        fig = go.Figure(data=_image_traces(values, x[0], dx, y[0], dy, colorscale, title))
+    else:
+        values, x, y = reduce_grid(values, x, y, size, method)
+        fig = go.Figure(data=_heatmap_trace(values, x, y, colorscale, title))
     fig.update_layout(
         title=title,
         xaxis_title=x_label,
         yaxis_title=y_label,
         yaxis_autorange='reversed'
     )
-    return fig
\ No newline at end of file
+    return fig
+
+
+def zoomable_heatmap(values, x, y, x_label="", y_label="", title="", size=DISPLAY_SIZE, method='max',
+                     colorscale='Hot'):
+    """Create a heatmap FigureWidget that re-reduces the visible window of values whenever the axes are zoomed.
+
+    Needs a Jupyter front end with ipywidgets; the full-resolution values stay
+    in Python and only the reduced window is sent to the browser. x and y
+    must be ascending.
+    """
+    values = np.asarray(values)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    fig = go.FigureWidget(heatmap(values, x, y, x_label, y_label, title, size, method, colorscale=colorscale))
+    trace = fig.data[0]
+
+    def window(axis, axisRange):
+        if axisRange is None:
+            return slice(None)
+        low, high = sorted(axisRange)
+        start, stop = np.searchsorted(axis, low), np.searchsorted(axis, high, side='right')
+        # keep one point beyond each edge so the window has no gaps at the border
+        return slice(max(start - 1, 0), min(stop + 1, len(axis)))
+
+    def rereduce(layout, xRange, yRange):
+        xs, ys = window(x, xRange), window(y, yRange)
+        reduced, rx, ry = reduce_grid(values[xs, ys], x[xs], y[ys], size, method)
+        with fig.batch_update():
+            trace.z, trace.x, trace.y = reduced, rx, ry
+
+    fig.layout.on_change(rereduce, 'xaxis.range', 'yaxis.range')
+    return fig
+
+
+def _render(kind, data, basePath, formats):
+    """Write one figure in every format; runs in an export worker."""
+    paths = []
+    if kind == 'plotly':
+        import plotly.io as pio
+        fig = pio.from_json(data, skip_invalid=True)
+        for fileFormat in formats:
+            path = "%s.%s" % (basePath, fileFormat)
+            if fileFormat == 'html':
+                # plotly.min.js is written once next to the pages instead of into each of them
+                fig.write_html(path, include_plotlyjs='directory')
+            else:
+                fig.write_image(path, format=fileFormat)
+            paths.append(path)
+    else:
+        import matplotlib.pyplot as plt
+        fig = pickle.loads(data)
+        try:
+            for fileFormat in formats:
+                if fileFormat == 'html':
+                    raise ValueError("matplotlib figures cannot be exported as html")
+                path = "%s.%s" % (basePath, fileFormat)
+                fig.savefig(path, format=fileFormat)
+                paths.append(path)
+        finally:
+            plt.close(fig)
+    return paths
+
+
+def _export_worker():
+    """Render the figures read from stdin until it is closed, replying on stdout."""
+    requests = sys.stdin.buffer
+    # keep the reply stream to ourselves; anything printed by the renderers goes to stderr
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    while True:
+        try:
+            request = pickle.load(requests)
+        except EOFError:
+            return
+        try:
+            reply = ('ok', _render(*request))
+        except Exception as error:
+            reply = ('error', "%s: %s" % (type(error).__name__, error))
+        pickle.dump(reply, replies)
+        replies.flush()
+
+
+class _ExportProcess:
+    """One export worker process, used by one thread at a time."""
+
+    def __init__(self):
+        environment = dict(os.environ, MPLBACKEND='Agg')
+        environment.pop(FIGURE_DIR_VARIABLE, None)
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__)], stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, env=environment)
+
+    def render(self, request):
+        pickle.dump(request, self.process.stdin)
+        self.process.stdin.flush()
+        try:
+            status, result = pickle.load(self.process.stdout)
+        except EOFError:
+            raise RuntimeError("figure export worker exited with code %s" % self.process.wait()) from None
+        if status == 'error':
+            raise RuntimeError(result)
+        return result
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+        self.process.stdout.close()
+
+
+class FigureExporter:
+    """A pool of worker processes writing plotly and matplotlib figures to files in the background."""
+
+    def __init__(self, folder, formats=('html', 'png'), size=None):
+        self.folder = folder
+        self.formats = tuple(formats)
+        os.makedirs(folder, exist_ok=True)
+        size = size or min(4, os.cpu_count() or 1)
+        # workers are started on first use, so an exporter that is never used costs nothing
+        self._processes = queue.Queue()
+        self._started = 0
+        self._size = size
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(size)
+        self._names = itertools.count(1)
+        # the start time keeps repeated runs of a script into one folder from overwriting each other
+        self._prefix = "%s-%s" % (os.path.splitext(os.path.basename(sys.argv[0]))[0] or 'figure',
+                                  time.strftime('%Y%m%d-%H%M%S'))
+        self._futures = []
+
+    def _process(self):
+        with self._lock:
+            if self._processes.empty() and self._started < self._size:
+                self._started += 1
+                return _ExportProcess()
+        return self._processes.get()
+
+    def _render(self, request):
+        process = self._process()
+        try:
+            return process.render(request)
+        finally:
+            self._processes.put(process)
+
+    def _default_name(self, formats):
+        """Return the next script-time-N name whose files do not exist yet."""
+        while True:
+            name = "%s-%d" % (self._prefix, next(self._names))
+            if not any(os.path.exists(os.path.join(self.folder, "%s.%s" % (name, fileFormat)))
+                       for fileFormat in formats):
+                return name
+
+    def submit(self, figure, name=None, formats=None):
+        """Queue a plotly or matplotlib figure for export and return a Future of the written paths.
+
+        The figure is serialized before this returns, so it can be changed or
+        closed right away. name is the file name without extension, by default
+        the script name and start time followed by -1, -2, ... Matplotlib
+        figures are not written as html; with no other format they are
+        written as png.
+        """
+        formats = tuple(formats or self.formats)
+        if hasattr(figure, 'savefig'):
+            formats = tuple(fileFormat for fileFormat in formats if fileFormat != 'html') or ('png',)
+        name = name or self._default_name(formats)
+        if hasattr(figure, 'savefig'):
+            request = ('matplotlib', pickle.dumps(figure), os.path.join(self.folder, name), formats)
+        else:
+            request = ('plotly', figure.to_json(), os.path.join(self.folder, name), formats)
+        future = self._executor.submit(self._render, request)
+        self._futures.append((name, future))
+        return future
+
+    def close(self):
+        """Wait for the queued figures and stop the workers; raise RuntimeError if any figure failed."""
+        self._executor.shutdown()
+        while not self._processes.empty():
+            self._processes.get().close()
+        failures = ["%s: %s" % (name, future.exception()) for name, future in self._futures
+                    if future.exception() is not None]
+        self._futures = []
+        if failures:
+            raise RuntimeError("%d figure(s) failed to export:\n%s" % (len(failures), "\n".join(failures)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# the exporter used by show() in headless mode, created on first use
+_exporter = None
+
+
+def headless_exporter():
+    """Return the FigureExporter of VTS_FIGURE_DIR, or None if figures are shown instead."""
+    global _exporter
+    folder = os.environ.get(FIGURE_DIR_VARIABLE)
+    if not folder:
+        return None
+    if _exporter is None:
+        formats = os.environ.get(FIGURE_FORMATS_VARIABLE, 'html,png').split(',')
+        size = int(os.environ.get(FIGURE_WORKERS_VARIABLE, 0)) or None
+        _exporter = FigureExporter(folder, [f.strip() for f in formats if f.strip()], size)
+        # scripts do not close the exporter, so wait for their figures at exit
+        atexit.register(_exporter.close)
+    return _exporter
+
+
+def show(figure=None, name=None):
+    """Show a plotly or matplotlib figure, or all open pyplot figures, or export them in headless mode.
+
+    Returns the Futures of the exports in headless mode and None otherwise.
+    """
+    exporter = headless_exporter()
+    if figure is None:
+        import matplotlib.pyplot as plt
+        if exporter is None:
+            plt.show()
+            return None
+        figures = [plt.figure(number) for number in plt.get_fignums()]
+        futures = [exporter.submit(fig, name and "%s-%d" % (name, i + 1)) for i, fig in enumerate(figures)]
+        plt.close('all')
+        return futures
+    if exporter is None:
+        if hasattr(figure, 'savefig'):
+            import matplotlib.pyplot as plt
+            plt.show()
+        else:
+            figure.show(renderer="browser")
+        return None
+    futures = [exporter.submit(figure, name)]
+    if hasattr(figure, 'savefig'):
+        import matplotlib.pyplot as plt
+        plt.close(figure)
+    return futures
+
+
+if __name__ == "__main__":
+    _export_worker()
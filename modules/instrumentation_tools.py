@@ -0,0 +1,235 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:
+    # not available on Windows; peak memory is then not recorded
+    resource = None
+
+# Stage-level instrumentation of simulations and forward-solver calls. Code
+# wraps its stages in "with stage(name, **attributes):"; while a Recorder is
+# enabled every stage records its wall time, the peak resident memory of the
+# process so far (processPeakRssBytes, a high-water mark over the whole
+# process, not the stage) and how much the stage raised it (peakRssGrowthBytes,
+# zero unless the stage set a new high), the size of the .NET managed heap at
+# its end and any attributes given, such as the number of photons or the
+# detector array sizes. Stages with a photons attribute also get photons per
+# second. When no Recorder is enabled, stage() returns a shared do-nothing
+# context manager, so instrumented code costs one global lookup per stage.
+#
+#   with recording() as recorder:
+#       with stage('input'):
+#           simulationInput = ...
+#       results = run_simulation(simulationInput)
+#   recorder.print_summary()
+#   recorder.to_chrome_trace('trace.json')   # open in chrome://tracing or Perfetto
+#
+# Stages run in worker processes are not recorded.
+
+# the enabled Recorder, None while instrumentation is disabled
+_recorder = None
+
+
+class _NullStage:
+    """Stage returned while instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_nullStage = _NullStage()
+
+
+def _peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _managed_bytes():
+    # only ask the CLR if a script has already loaded it
+    if 'clr' not in sys.modules:
+        return None
+    from System import GC
+    return int(GC.GetTotalMemory(False))
+
+
+class Stage:
+    """One timed stage; attributes can be added while it runs with set()."""
+
+    def __init__(self, recorder, name, attributes):
+        self.recorder = recorder
+        self.name = name
+        self.attributes = attributes
+        self.start = None
+        self.startPeakRss = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.startPeakRss = _peak_rss_bytes()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        stop = time.perf_counter_ns()
+        seconds = (stop - self.start) / 1e9
+        peakRss = _peak_rss_bytes()
+        record = {'name': self.name, 'start': (self.start - self.recorder.origin) / 1e9, 'seconds': seconds,
+                  'pid': os.getpid(), 'thread': threading.get_ident(),
+                  'processPeakRssBytes': peakRss,
+                  'peakRssGrowthBytes': None if peakRss is None else peakRss - self.startPeakRss,
+                  'managedBytes': _managed_bytes()}
+        record.update(self.attributes)
+        if 'photons' in self.attributes and seconds > 0:
+            record['photonsPerSecond'] = self.attributes['photons'] / seconds
+        if exc_info[0] is not None:
+            record['error'] = exc_info[0].__name__
+        self.recorder.add(record)
+        return False
+
+
+class Recorder:
+    """Collects the records of the stages run while it is enabled."""
+
+    def __init__(self):
+        self.records = []
+        self.origin = time.perf_counter_ns()
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self):
+        """Return {stage name: count, total, mean and max seconds, and photons per second if known}."""
+        summary = {}
+        for record in self.records:
+            entry = summary.setdefault(record['name'], {'count': 0, 'totalSeconds': 0.0, 'maxSeconds': 0.0})
+            entry['count'] += 1
+            entry['totalSeconds'] += record['seconds']
+            entry['maxSeconds'] = max(entry['maxSeconds'], record['seconds'])
+            if 'photons' in record:
+                entry['photons'] = entry.get('photons', 0) + record['photons']
+        for entry in summary.values():
+            entry['meanSeconds'] = entry['totalSeconds'] / entry['count']
+            if 'photons' in entry and entry['totalSeconds'] > 0:
+                entry['photonsPerSecond'] = entry['photons'] / entry['totalSeconds']
+        return summary
+
+    def print_summary(self):
+        """Print a table of the stages by total time."""
+        summary = self.summary()
+        peakRss = max((r['processPeakRssBytes'] for r in self.records if r['processPeakRssBytes'] is not None),
+                      default=None)
+        print("%-32s %6s %12s %12s %12s %14s" % ("stage", "count", "total [s]", "mean [s]", "max [s]", "photons/s"))
+        for name, entry in sorted(summary.items(), key=lambda item: -item[1]['totalSeconds']):
+            print("%-32s %6d %12.6f %12.6f %12.6f %14s" % (
+                  name, entry['count'], entry['totalSeconds'], entry['meanSeconds'], entry['maxSeconds'],
+                  "%.0f" % entry['photonsPerSecond'] if 'photonsPerSecond' in entry else ""))
+        if peakRss is not None:
+            print("process peak resident memory: %.1f MiB" % (peakRss / 2 ** 20))
+
+    def to_json(self, path=None):
+        """Return the stage records and summary as a dictionary, also written to path if given."""
+        report = {'stages': self.records, 'summary': self.summary()}
+        if path is not None:
+            with open(path, 'w', encoding='utf-8') as reportFile:
+                json.dump(report, reportFile, indent=2)
+        return report
+
+    def to_chrome_trace(self, path=None):
+        """Return the stages in the Chrome trace event format, also written to path if given."""
+        events = []
+        for record in self.records:
+            arguments = {k: v for k, v in record.items() if k not in ('name', 'start', 'seconds', 'pid', 'thread')}
+            events.append({'name': record['name'], 'ph': 'X', 'ts': record['start'] * 1e6,
+                           'dur': record['seconds'] * 1e6, 'pid': record['pid'], 'tid': record['thread'],
+                           'args': arguments})
+        trace = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+        if path is not None:
+            with open(path, 'w', encoding='utf-8') as traceFile:
+                json.dump(trace, traceFile)
+        return trace
+
+
+def stage(name, **attributes):
+    """Return a context manager recording a stage, or doing nothing while instrumentation is disabled."""
+    recorder = _recorder
+    if recorder is None:
+        return _nullStage
+    return Stage(recorder, name, attributes)
+
+
+def enable(recorder=None):
+    """Start recording stages into recorder (a new Recorder by default) and return it."""
+    global _recorder
+    _recorder = recorder or Recorder()
+    return _recorder
+
+
+def disable():
+    """Stop recording and return the Recorder that was enabled, if any."""
+    global _recorder
+    recorder, _recorder = _recorder, None
+    return recorder
+
+
+@contextmanager
+def recording(recorder=None):
+    """Record the stages run inside the with block and yield the Recorder."""
+    previous = _recorder
+    try:
+        yield enable(recorder)
+    finally:
+        disable()
+        if previous is not None:
+            enable(previous)
+
+
+def array_bytes(simulationResults):
+    """Return {detector name: bytes of its Mean and SecondMoment arrays} of SimulationResults."""
+    return {name: sum(a.nbytes for a in (result.Mean, result.SecondMoment) if a is not None)
+            for name, result in simulationResults.ResultsDictionary.items()}
+
+
+class InstrumentedForwardSolver:
+    """Forward solver wrapper recording every method call as a stage named "<solver>.<method>"."""
+
+    def __init__(self, forwardSolver):
+        object.__setattr__(self, 'forwardSolver', forwardSolver)
+        object.__setattr__(self, '_prefix', type(forwardSolver).__name__ + '.')
+
+    def __getattr__(self, name):
+        value = getattr(self.forwardSolver, name)
+        if not callable(value):
+            return value
+        stageName = self._prefix + name
+
+        def call(*args, **kwargs):
+            with stage(stageName) as current:
+                result = value(*args, **kwargs)
+                length = getattr(result, 'Length', None)
+                if length is not None:
+                    current.set(values=int(length))
+                return result
+        return call
+
+    def __setattr__(self, name, value):
+        # properties such as SourceConfiguration are set on the wrapped solver
+        setattr(self.forwardSolver, name, value)
@@ -0,0 +1,188 @@
+import multiprocessing
+import os
+import numpy as np
+from scipy.optimize import least_squares
+from monte_carlo_tools import load_vts
+
+# Inversion of reflectance spectra, R(fx) or R(rho), for chromophore
+# concentrations and power law scatterer coefficients. Parameter vectors are
+# the concentrations of the chromophores in a ChromophoreSpectra followed by
+# [A, b] unless the scatterer is fixed. Forward models are callables
+# model(mua, musp, positions) returning (number of positions, number of
+# wavelengths); models that also provide derivatives(mua, musp, positions)
+# get an analytic Jacobian. Whole images are inverted pixel by pixel in a pool
+# of worker processes, each with its own forward model.
+
+# least_squares status used for pixels that were not fitted because their data are not valid
+STATUS_SKIPPED = -2
+
+
+class VtsROfFxModel:
+    """R(fx) forward model backed by a VTS forward solver that is created lazily in each process."""
+
+    def __init__(self, solverName='PointSourceSDAForwardSolver', g=0.8, n=1.4, vtsPath=None):
+        self.solverName = solverName
+        self.g = g
+        self.n = n
+        self.vtsPath = vtsPath
+        self._solver = None
+
+    def __getstate__(self):
+        # the .NET solver cannot be pickled; worker processes build their own
+        state = self.__dict__.copy()
+        state['_solver'] = None
+        return state
+
+    def __call__(self, mua, musp, fxs):
+        """Return R(fx) with shape (number of fxs, number of wavelengths)."""
+        if self._solver is None:
+            load_vts(self.vtsPath)
+            import Vts.Modeling.ForwardSolvers as forwardSolvers
+            self._solver = getattr(forwardSolvers, self.solverName)()
+        from array_tools import to_numpy
+        from spectral_tools import to_optical_properties
+        ops = to_optical_properties(mua, musp, self.g, self.n)
+        return np.array([to_numpy(self._solver.ROfFx(ops, float(fx))) for fx in fxs])
+
+
+class InversionMaps:
+    """Per-pixel results of an image inversion."""
+
+    def __init__(self, parameters, status, chi2, nfev):
+        # parameters[..., k] is the map of the k-th fitted parameter
+        self.parameters = parameters
+        # least_squares status per pixel; 1 to 4 mean converged
+        self.status = status
+        self.success = status > 0
+        self.chi2 = chi2
+        self.nfev = nfev
+
+
+def spectral_jacobian(spectra, x, dRdMua, dRdMusp, fixedScatterer=None):
+    """Chain R derivatives with respect to mua and musp to the parameter vector x.
+
+    dRdMua and dRdMusp have shape (number of positions, number of wavelengths);
+    the result has shape (number of positions * number of wavelengths, len(x)).
+    """
+    chromophoreCount = spectra.extinction.shape[1]
+    # dmua/dc is the extinction table
+    columns = [dRdMua[..., np.newaxis] * spectra.extinction[np.newaxis, :, :]]
+    if fixedScatterer is None:
+        A, b = x[chromophoreCount], x[chromophoreCount + 1]
+        scaledWavelengths = spectra.wavelengths / 1000.0
+        dMuspdA = scaledWavelengths ** -b
+        dMuspdb = -A * dMuspdA * np.log(scaledWavelengths)
+        columns.append((dRdMusp * dMuspdA)[..., np.newaxis])
+        columns.append((dRdMusp * dMuspdb)[..., np.newaxis])
+    return np.concatenate(columns, axis=-1).reshape(-1, len(x))
+
+
+def fit_reflectance(measured, spectra, positions, model, initialGuess, fixedScatterer=None, **options):
+    """Fit one (number of positions, number of wavelengths) reflectance spectrum with least_squares.
+
+    positions are the fxs or rhos passed to the model. With fixedScatterer=(A, b)
+    only the chromophore concentrations are fitted. When the model provides
+    derivatives and no jac option is given, the analytic Jacobian is used.
+    """
+    measured = np.asarray(measured, dtype=float)
+    chromophoreCount = spectra.extinction.shape[1]
+
+    def optical_properties(x):
+        A, b = fixedScatterer if fixedScatterer is not None else x[chromophoreCount:chromophoreCount + 2]
+        return spectra.mua(x[:chromophoreCount]), spectra.musp(A, b)
+
+    def residual(x):
+        return (model(*optical_properties(x), positions) - measured).ravel()
+
+    def jacobian(x):
+        _, dRdMua, dRdMusp = model.derivatives(*optical_properties(x), positions)
+        return spectral_jacobian(spectra, x, dRdMua, dRdMusp, fixedScatterer)
+
+    options = dict({'method': 'lm', 'ftol': 1e-9, 'xtol': 1e-9, 'max_nfev': 10000}, **options)
+    if 'jac' not in options and hasattr(model, 'derivatives'):
+        options['jac'] = jacobian
+    return least_squares(residual, initialGuess, **options)
+
+
+def fit_r_of_fx(measured, spectra, fxs, model, initialGuess, **options):
+    """Fit one (number of fxs, number of wavelengths) R(fx) spectrum and return the least_squares result."""
+    return fit_reflectance(measured, spectra, fxs, model, initialGuess, **options)
+
+
+def _invert_pixels(pixels, spectra, fxs, model, initialGuess, warmStart, options):
+    """Fit a block of pixels, optionally starting each fit from the previous converged pixel."""
+    parameters = np.full((len(pixels), len(initialGuess)), np.nan)
+    status = np.full(len(pixels), STATUS_SKIPPED, dtype=int)
+    chi2 = np.full(len(pixels), np.nan)
+    nfev = np.zeros(len(pixels), dtype=int)
+    guess = np.asarray(initialGuess, dtype=float)
+    for i, measured in enumerate(pixels):
+        if not np.all(np.isfinite(measured)) or not np.any(measured > 0):
+            continue
+        fit = fit_r_of_fx(measured, spectra, fxs, model, guess, **options)
+        parameters[i], status[i], nfev[i] = fit.x, fit.status, fit.nfev
+        chi2[i] = np.dot(fit.fun, fit.fun)
+        # neighbouring pixels are usually similar, so their fit is a good start
+        if warmStart and fit.status > 0:
+            guess = fit.x
+    return parameters, status, chi2, nfev
+
+
+# problem shared by every chunk a worker process inverts
+_workerProblem = None
+
+
+def _initialize_worker(problem):
+    global _workerProblem
+    _workerProblem = problem
+
+
+def _invert_chunk(chunk):
+    start, pixels = chunk
+    return (start,) + _invert_pixels(pixels, *_workerProblem)
+
+
+def invert_r_of_fx_image(reflectance, spectra, fxs, initialGuess, model=None, processes=None,
+                         chunkSize=None, warmStart=True, **options):
+    """Invert every pixel of an (H, W, number of fxs, number of wavelengths) R(fx) image stack.
+
+    Pixels are split into chunks of chunkSize that are fitted in a pool of
+    spawned processes; by default about four chunks per process, at most 1024
+    pixels each, so small images still use every process. Scripts calling this
+    must guard their top-level code with if __name__ == "__main__". Remaining
+    keyword arguments are passed to scipy.optimize.least_squares. Returns
+    InversionMaps of shape (H, W).
+    """
+    reflectance = np.asarray(reflectance, dtype=float)
+    height, width = reflectance.shape[:2]
+    pixels = reflectance.reshape((height * width,) + reflectance.shape[2:])
+    if len(pixels) == 0:
+        # an empty image has nothing to fit, so do not start a pool or load VTS
+        return InversionMaps(np.empty((height, width, len(initialGuess))), np.empty((height, width), dtype=int),
+                             np.empty((height, width)), np.empty((height, width), dtype=int))
+    model = model or VtsROfFxModel()
+    problem = (spectra, np.asarray(fxs, dtype=float), model, initialGuess, warmStart, options)
+    processes = processes or os.cpu_count()
+    chunkSize = chunkSize or min(1024, max(1, -(-len(pixels) // (4 * processes))))
+    chunks = [(start, pixels[start:start + chunkSize]) for start in range(0, len(pixels), chunkSize)]
+    parameters = np.empty((len(pixels), len(initialGuess)))
+    status = np.empty(len(pixels), dtype=int)
+    chi2 = np.empty(len(pixels))
+    nfev = np.empty(len(pixels), dtype=int)
+
+    def store(start, *results):
+        stop = start + len(results[0])
+        parameters[start:stop], status[start:stop], chi2[start:stop], nfev[start:stop] = results
+
+    if processes == 1:
+        for start, chunk in chunks:
+            store(start, *_invert_pixels(chunk, *problem))
+    else:
+        # the CLR does not survive fork, so always start fresh interpreters
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(min(processes, len(chunks)), initializer=_initialize_worker,
+                          initargs=(problem,)) as pool:
+            for results in pool.imap_unordered(_invert_chunk, chunks):
+                store(*results)
+    return InversionMaps(parameters.reshape(height, width, -1), status.reshape(height, width),
+                         chi2.reshape(height, width), nfev.reshape(height, width))
@@ -0,0 +1,99 @@
+import numpy as np
+from scipy.interpolate import LinearNDInterpolator, griddata
+from scipy.ndimage import map_coordinates
+
+# Lookup-table inversion of diffuse reflectance at two spatial frequencies,
+# (R(fx1), R(fx2)) -> (mua, musp). The forward table is computed once on a
+# regular (mua, musp) grid with a VTS forward solver and resampled onto a
+# regular grid in (log R(fx1), log R(fx2)), so inverting any number of pixels
+# is a single vectorized bilinear interpolation. save() stores both grids, so a
+# loaded table skips the resampling, which is the expensive step.
+
+
+class ROfFxLookupTable:
+    """R(fx) at two spatial frequencies on a regular (mua, musp) grid, with its inverse."""
+
+    def __init__(self, mua, musp, fxs, reflectance, inverseResolution=512, inverse=None):
+        self.mua = np.asarray(mua, dtype=float)
+        self.musp = np.asarray(musp, dtype=float)
+        self.fxs = np.asarray(fxs, dtype=float)
+        # reflectance[i, j, k] is R(fxs[k]) for mua[i] and musp[j]
+        self.reflectance = np.asarray(reflectance, dtype=float)
+        self.inverseResolution = inverseResolution
+        self._interpolator = None
+        self._build_inverse(inverse)
+
+    @classmethod
+    def from_forward_solver(cls, forwardSolver, fxs=(0.0, 0.2), mua=None, musp=None, g=0.8, n=1.4,
+                            inverseResolution=512):
+        """Compute the table with one ROfFx call per spatial frequency over the whole (mua, musp) grid."""
+        from array_tools import to_numpy
+        from spectral_tools import to_optical_properties
+        mua = np.geomspace(1e-4, 0.5, 200) if mua is None else np.asarray(mua, dtype=float)
+        musp = np.geomspace(0.1, 5.0, 200) if musp is None else np.asarray(musp, dtype=float)
+        muaGrid, muspGrid = np.meshgrid(mua, musp, indexing='ij')
+        ops = to_optical_properties(muaGrid, muspGrid, g, n)
+        reflectance = np.stack([to_numpy(forwardSolver.ROfFx(ops, float(fx))).reshape(muaGrid.shape)
+                                for fx in fxs], axis=-1)
+        return cls(mua, musp, fxs, reflectance, inverseResolution)
+
+    def _points(self):
+        """Return the table as scattered (log R1, log R2) points and (log mua, log musp) values."""
+        muaGrid, muspGrid = np.meshgrid(self.mua, self.musp, indexing='ij')
+        points = np.log(self.reflectance.reshape(-1, 2))
+        values = np.log(np.column_stack([muaGrid.ravel(), muspGrid.ravel()]))
+        return points, values
+
+    def _build_inverse(self, inverse=None):
+        """Resample (log mua, log musp) onto a regular grid in (log R1, log R2), unless the grid is given."""
+        points, values = self._points()
+        self.logRMin = points.min(axis=0)
+        self.logRMax = points.max(axis=0)
+        if inverse is not None:
+            inverse = np.asarray(inverse, dtype=float)
+            if inverse.shape != (self.inverseResolution, self.inverseResolution, 2):
+                raise ValueError("inverse grid has shape %s, expected (%d, %d, 2)" % (
+                                 inverse.shape, self.inverseResolution, self.inverseResolution))
+            self.inverse = inverse
+            return
+        axes = [np.linspace(self.logRMin[k], self.logRMax[k], self.inverseResolution) for k in range(2)]
+        logR1, logR2 = np.meshgrid(*axes, indexing='ij')
+        # cells outside the convex hull of the table are NaN
+        self.inverse = griddata(points, values, (logR1, logR2), method='linear')
+
+    def save(self, path):
+        """Write the forward table and its inverse grid to a .npz file."""
+        np.savez(path, mua=self.mua, musp=self.musp, fxs=self.fxs, reflectance=self.reflectance,
+                 inverseResolution=self.inverseResolution, inverse=self.inverse)
+
+    @classmethod
+    def load(cls, path):
+        """Read a table written by save; the inverse grid is rebuilt only for files without one."""
+        with np.load(path) as data:
+            return cls(data['mua'], data['musp'], data['fxs'], data['reflectance'],
+                       int(data['inverseResolution']), data['inverse'] if 'inverse' in data.files else None)
+
+    def invert(self, r1, r2, method='grid'):
+        """Return (mua, musp) arrays for arrays of R(fx1) and R(fx2); NaN outside the table.
+
+        method='grid' interpolates bilinearly in the precomputed inverse grid and
+        is the fast path; method='delaunay' interpolates linearly in the
+        triangulated forward table and avoids the resampling error of the grid.
+        """
+        r1, r2 = np.broadcast_arrays(np.asarray(r1, dtype=float), np.asarray(r2, dtype=float))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            logR = np.stack([np.log(r1), np.log(r2)], axis=-1)
+        if method == 'grid':
+            # fractional indices of each pixel in the inverse grid
+            coordinates = ((logR - self.logRMin) / (self.logRMax - self.logRMin)
+                           * (self.inverseResolution - 1)).reshape(-1, 2).T
+            logOps = np.stack([map_coordinates(self.inverse[..., k], coordinates, order=1,
+                                               mode='constant', cval=np.nan) for k in range(2)], axis=-1)
+        elif method == 'delaunay':
+            if self._interpolator is None:
+                self._interpolator = LinearNDInterpolator(*self._points())
+            logOps = self._interpolator(logR.reshape(-1, 2))
+        else:
+            raise ValueError("unknown inversion method %s" % method)
+        ops = np.exp(logOps).reshape(r1.shape + (2,))
+        return ops[..., 0], ops[..., 1]
@@ -0,0 +1,341 @@
+import multiprocessing
+import os
+import time
+import numpy as np
+from instrumentation_tools import array_bytes, stage
+from vts_bootstrap import find_vts, load
+
+# Helpers to run Monte Carlo simulations and work with their detector tallies
+# as NumPy arrays. Worker processes load their own copy of the CLR, so this
+# module only imports the VTS namespaces inside functions.
+
+
+class DetectorResult:
+    """Mean and SecondMoment tallies of one detector as NumPy arrays."""
+
+    def __init__(self, name, mean, secondMoment=None, tallyCount=0, axes=None):
+        self.Name = name
+        self.Mean = mean
+        self.SecondMoment = secondMoment
+        self.TallyCount = tallyCount
+        # bin edges of the detector, e.g. {"Rho": ..., "Z": ...}
+        self.Axes = axes or {}
+
+
+class SimulationResults:
+    """Python-side counterpart of SimulationOutput holding detector results for N photons."""
+
+    def __init__(self, resultsDictionary, n):
+        self.ResultsDictionary = resultsDictionary
+        self.N = n
+
+
+def default_vts_path():
+    """Return the path of Vts.dll as located by vts_bootstrap.find_vts."""
+    return find_vts()
+
+
+def load_vts(vtsPath=None):
+    """Load the CoreCLR runtime and add the reference to the VTS library."""
+    load(vtsPath)
+
+
+def _tally_to_numpy(values):
+    """Convert a detector tally (scalar, array or None) to NumPy."""
+    from array_tools import to_numpy
+    if values is None:
+        return None
+    if isinstance(values, (int, float, complex)):
+        return np.array(values)
+    return to_numpy(values)
+
+
+def get_results(simulationOutput, n):
+    """Copy every detector of a SimulationOutput for n photons into NumPy SimulationResults."""
+    resultsDictionary = {}
+    with stage('marshal') as current:
+        for name in simulationOutput.ResultsDictionary.Keys:
+            # detectors come back typed as IDetector; use the concrete object to
+            # reach Mean, SecondMoment and TallyCount
+            detector = simulationOutput.ResultsDictionary[name]
+            detector = getattr(detector, '__implementation__', detector)
+            resultsDictionary[name] = DetectorResult(
+                name,
+                _tally_to_numpy(detector.Mean),
+                _tally_to_numpy(getattr(detector, 'SecondMoment', None)),
+                int(getattr(detector, 'TallyCount', 0)))
+        simulationResults = SimulationResults(resultsDictionary, n)
+        current.set(detectorBytes=array_bytes(simulationResults))
+    return simulationResults
+
+
+def run_simulation(simulationInput):
+    """Run a simulation in this process and return its SimulationResults, recording the run and marshal stages."""
+    from Vts.MonteCarlo import MonteCarloSimulation
+    with stage('run', photons=simulationInput.N):
+        simulationOutput = MonteCarloSimulation(simulationInput).Run()
+    return get_results(simulationOutput, simulationInput.N)
+
+
+def merge_results(resultsList):
+    """Merge results of independent runs into results equivalent to one run with all photons."""
+    n = sum(results.N for results in resultsList)
+    merged = {}
+    for name in resultsList[0].ResultsDictionary:
+        detectors = [results.ResultsDictionary[name] for results in resultsList]
+        # tallies are normalized by the number of photons launched, so weight
+        # each run by its share of the photons
+        mean = sum(d.Mean * r.N for d, r in zip(detectors, resultsList)) / n
+        if detectors[0].SecondMoment is None:
+            secondMoment = None
+        else:
+            secondMoment = sum(d.SecondMoment * r.N for d, r in zip(detectors, resultsList)) / n
+        tallyCount = sum(d.TallyCount for d in detectors)
+        merged[name] = DetectorResult(name, mean, secondMoment, tallyCount, detectors[0].Axes)
+    return SimulationResults(merged, n)
+
+
+def split_photons(n, shardCount):
+    """Split n photons into shardCount nearly equal, non-empty shards."""
+    shardCount = max(1, min(shardCount, n))
+    counts = [n // shardCount] * shardCount
+    for i in range(n % shardCount):
+        counts[i] += 1
+    return counts
+
+
+def shard_seeds(seed, shardCount):
+    """Derive independent 31-bit RNG seeds for each shard from a base seed."""
+    # a negative seed asks VTS for a random seed, so draw fresh entropy instead
+    sequence = np.random.SeedSequence(seed if seed is not None and seed >= 0 else None)
+    return [int(s) for s in sequence.generate_state(shardCount) & 0x7FFFFFFF]
+
+
+def simulation_input_to_json(simulationInput):
+    """Serialize a SimulationInput to the VTS JSON format."""
+    from Vts.IO import VtsJsonSerializer
+    from Vts.MonteCarlo import SimulationInput
+    return VtsJsonSerializer.WriteToJson[SimulationInput](simulationInput)
+
+
+def simulation_input_from_json(json):
+    """Deserialize a SimulationInput from the VTS JSON format."""
+    from Vts.IO import VtsJsonSerializer
+    from Vts.MonteCarlo import SimulationInput
+    return VtsJsonSerializer.ReadFromJson[SimulationInput](json)
+
+
+def _run_shard(job):
+    """Run one shard of a simulation in a worker process and return its NumPy results."""
+    json, n, seed, index = job
+    simulationInput = simulation_input_from_json(json)
+    simulationInput.N = n
+    simulationInput.Options.Seed = seed
+    simulationInput.Options.SimulationIndex = index
+    return run_simulation(simulationInput)
+
+
+def run_parallel(simulationInput, processes=None, shardCount=None, vtsPath=None):
+    """Run a simulation split across a process pool and return the merged SimulationResults.
+
+    Each worker loads its own CLR, so scripts calling this must guard their
+    top-level code with if __name__ == "__main__".
+    """
+    processes = processes or os.cpu_count()
+    counts = split_photons(simulationInput.N, shardCount or processes)
+    seeds = shard_seeds(simulationInput.Options.Seed, len(counts))
+    json = simulation_input_to_json(simulationInput)
+    jobs = [(json, n, seed, i) for i, (n, seed) in enumerate(zip(counts, seeds))]
+    # the CLR does not survive fork, so always start fresh interpreters
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(min(processes, len(jobs)), initializer=load_vts,
+                      initargs=(vtsPath or default_vts_path(),)) as pool:
+        return merge_results(pool.map(_run_shard, jobs))
+
+
+def relative_error(detectorResult, n):
+    """Return the per-bin relative error of a detector Mean, NaN where the Mean is zero."""
+    if detectorResult.SecondMoment is None:
+        raise ValueError("detector %s does not tally the second moment" % detectorResult.Name)
+    mean = detectorResult.Mean
+    with np.errstate(divide='ignore', invalid='ignore'):
+        standardDeviation = np.sqrt(np.maximum(detectorResult.SecondMoment - mean * mean, 0) / n)
+        return np.where(mean != 0, standardDeviation / mean, np.nan)
+
+
+# reductions of the per-bin relative error used as a stopping criterion
+_relativeErrorStatistics = {
+    'max': np.nanmax,
+    'median': np.nanmedian,
+    'mean': np.nanmean,
+}
+
+
+def converged(simulationResults, targetRelativeError, statistic='max', detectorNames=None):
+    """Return True if the relative error statistic of every named detector is at or below the target."""
+    reduce = _relativeErrorStatistics.get(statistic, statistic)
+    for name in detectorNames or simulationResults.ResultsDictionary:
+        relativeErrors = relative_error(simulationResults.ResultsDictionary[name], simulationResults.N)
+        # no photon has reached the detector yet
+        if np.all(np.isnan(relativeErrors)) or reduce(relativeErrors) > targetRelativeError:
+            return False
+    return True
+
+
+def run_incremental(simulationInput, batchSizes, targetRelativeError=None, statistic='max', detectorNames=None):
+    """Run a simulation in batches, yielding the accumulated SimulationResults after every batch.
+
+    batchSizes is either a list of photon counts or a maximum batch size used to
+    split simulationInput.N photons into equal batches. When
+    targetRelativeError is given, the run stops after the first batch for which
+    converged() holds for the named detectors (all detectors by default).
+    """
+    if isinstance(batchSizes, int):
+        batchSizes = split_photons(simulationInput.N, -(-simulationInput.N // batchSizes))
+    seeds = shard_seeds(simulationInput.Options.Seed, len(batchSizes))
+    json = simulation_input_to_json(simulationInput)
+    accumulated = None
+    for i, (n, seed) in enumerate(zip(batchSizes, seeds)):
+        with stage('input'):
+            batchInput = simulation_input_from_json(json)
+            batchInput.N = n
+            batchInput.Options.Seed = seed
+            batchInput.Options.SimulationIndex = i
+        batchResults = run_simulation(batchInput)
+        with stage('statistics'):
+            accumulated = batchResults if accumulated is None else merge_results([accumulated, batchResults])
+            done = targetRelativeError is not None and converged(accumulated, targetRelativeError, statistic,
+                                                                 detectorNames)
+        yield accumulated
+        if done:
+            return
+
+
+def run_until_converged(simulationInput, batchSize, targetRelativeError, statistic='max', detectorNames=None):
+    """Run batches until the relative error target is met and return the final results and all snapshots."""
+    snapshots = list(run_incremental(simulationInput, batchSize, targetRelativeError, statistic, detectorNames))
+    return snapshots[-1], snapshots
+
+
+# absorption weighting types compared by plan_simulation
+WEIGHTING_TYPES = ('Analog', 'Discrete', 'Continuous')
+
+
+class PilotResult:
+    """Relative errors, wall time and figure of merit of a pilot run with one absorption weighting type."""
+
+    def __init__(self, weightingType, n, seconds=None, relativeErrors=None, error=None):
+        self.AbsorptionWeightingType = weightingType
+        self.N = n
+        self.Seconds = seconds
+        # {detector name: relative error statistic}
+        self.RelativeErrors = relativeErrors or {}
+        # message of the exception if the detectors do not support this weighting type
+        self.Error = error
+
+    def figure_of_merit(self):
+        """Return {detector name: 1 / (RE^2 * time)}."""
+        return {name: 1 / (relativeError ** 2 * self.Seconds) for name, relativeError in self.RelativeErrors.items()}
+
+    def required_photons(self, targetRelativeError):
+        """Return the photons for every detector to reach the target, assuming RE falls as 1/sqrt(N)."""
+        return max(int(np.ceil(self.N * max(self.RelativeErrors.values()) ** 2 / targetRelativeError ** 2)), 1)
+
+
+class SimulationPlan:
+    """Weighting type and photon count predicted to reach a relative error target in the least time."""
+
+    def __init__(self, weightingType, n, predictedSeconds, targetRelativeError, pilots):
+        self.AbsorptionWeightingType = weightingType
+        self.N = n
+        # predicted wall time of the production run in one process
+        self.PredictedSeconds = predictedSeconds
+        self.TargetRelativeError = targetRelativeError
+        # {weighting type: PilotResult}
+        self.Pilots = pilots
+
+    def configure(self, simulationInput):
+        """Return a copy of simulationInput with the planned weighting type and photon count."""
+        return _configured_input(simulation_input_to_json(simulationInput), self.AbsorptionWeightingType, self.N)
+
+
+def _configured_input(json, weightingType, n):
+    """Return a copy of the simulation input with the weighting type, n photons and second moments tallied."""
+    from Vts.MonteCarlo import AbsorptionWeightingType
+    pilotInput = simulation_input_from_json(json)
+    pilotInput.N = n
+    pilotInput.Options.AbsorptionWeightingType = getattr(AbsorptionWeightingType, weightingType)
+    for detectorInput in pilotInput.DetectorInputs:
+        detectorInput = getattr(detectorInput, '__implementation__', detectorInput)
+        if hasattr(detectorInput, 'TallySecondMoment'):
+            detectorInput.TallySecondMoment = True
+    return pilotInput
+
+
+def pilot_runs(simulationInput, pilotN=10000, weightingTypes=WEIGHTING_TYPES, statistic='max', detectorNames=None):
+    """Run a short pilot simulation per absorption weighting type and return {weighting type: PilotResult}.
+
+    Each type first runs a few photons untimed so that JIT compilation is not
+    charged to the pilot. Types that the detectors do not support are reported
+    with their error instead of timings.
+    """
+    reduce = _relativeErrorStatistics.get(statistic, statistic)
+    json = simulation_input_to_json(simulationInput)
+    pilots = {}
+    for weightingType in weightingTypes:
+        try:
+            run_simulation(_configured_input(json, weightingType, min(100, pilotN)))
+            pilotInput = _configured_input(json, weightingType, pilotN)
+            start_time = time.perf_counter()
+            with stage('pilot ' + weightingType, photons=pilotN):
+                results = run_simulation(pilotInput)
+            seconds = time.perf_counter() - start_time
+        except Exception as exception:
+            pilots[weightingType] = PilotResult(weightingType, pilotN, error=str(exception))
+            continue
+        relativeErrors = {}
+        for name in detectorNames or results.ResultsDictionary:
+            detectorRelativeErrors = relative_error(results.ResultsDictionary[name], pilotN)
+            # a detector no pilot photon reached gives no estimate
+            if not np.all(np.isnan(detectorRelativeErrors)):
+                relativeErrors[name] = float(reduce(detectorRelativeErrors))
+        pilots[weightingType] = PilotResult(weightingType, pilotN, seconds, relativeErrors)
+    return pilots
+
+
+def plan_simulation(simulationInput, targetRelativeError, pilotN=10000, weightingTypes=WEIGHTING_TYPES,
+                    statistic='max', detectorNames=None):
+    """Pick the weighting type and N that reach targetRelativeError for every detector in the least time.
+
+    The figure of merit 1/(RE^2 * time) of a detector does not depend on N, so
+    the pilots predict the time of the production run as the pilot time scaled
+    by the photons the slowest-converging detector needs.
+    """
+    pilots = pilot_runs(simulationInput, pilotN, weightingTypes, statistic, detectorNames)
+    best = None
+    for pilot in pilots.values():
+        if pilot.Error is not None or not pilot.RelativeErrors:
+            continue
+        n = pilot.required_photons(targetRelativeError)
+        predictedSeconds = pilot.Seconds * n / pilot.N
+        if best is None or predictedSeconds < best.PredictedSeconds:
+            best = SimulationPlan(pilot.AbsorptionWeightingType, n, predictedSeconds, targetRelativeError, pilots)
+    if best is None:
+        raise ValueError("no pilot run produced relative errors: %s" % {
+                         weightingType: pilot.Error or "no photons detected" for weightingType, pilot in pilots.items()})
+    return best
+
+
+def run_planned(simulationInput, targetRelativeError, pilotN=10000, weightingTypes=WEIGHTING_TYPES,
+                statistic='max', detectorNames=None, processes=None, vtsPath=None):
+    """Plan the simulation, run it with the planned configuration and return (plan, SimulationResults).
+
+    With processes other than 1 the production run is split across a process
+    pool by run_parallel, so scripts calling this must guard their top-level
+    code with if __name__ == "__main__".
+    """
+    plan = plan_simulation(simulationInput, targetRelativeError, pilotN, weightingTypes, statistic, detectorNames)
+    plannedInput = plan.configure(simulationInput)
+    if processes == 1:
+        return plan, run_simulation(plannedInput)
+    return plan, run_parallel(plannedInput, processes, vtsPath=vtsPath)
@@ -0,0 +1,176 @@
+import glob
+import os
+import tempfile
+import numpy as np
+from monte_carlo_tools import simulation_input_from_json, simulation_input_to_json
+
+# Perturbation Monte Carlo (pMC) of R(rho) in NumPy. One baseline simulation
+# with continuous (CAW) or discrete (DAW) absorption weighting writes the pMC
+# photon database of the diffusely reflected photons: their exit position and
+# weight, and per tissue region their path length L and number of collisions
+# c. For other absorption and scattering coefficients of some regions the
+# photons are not traced again but reweighted; for both weighting types a
+# photon's weight is multiplied by
+#
+#   prod over perturbed regions of (mus'/mus)^c exp(-(mut' - mut) L)
+#
+# where ' marks the perturbed coefficients and mut = mua + mus. The factors of
+# many perturbation sets are one matrix product, so a sweep over a thousand
+# optical properties costs one baseline run plus a few array operations per
+# photon. Analog weighting cannot be reweighted, since absorbed photons are
+# not in the database, and the anisotropy g and refractive index n must stay
+# those of the baseline.
+#
+#   photons = run_baseline(simulationInput)
+#   rhos = np.linspace(0, 10, 101)
+#   reflectance = photons.r_of_rho(rhos, mua=np.linspace(0.001, 0.1, 1000), musp=1.0)   # shape (1000, 100)
+
+# photons x perturbation sets weighted per block when reweighting, to bound
+# the memory of the factors (2^22 float64 values, 32 MiB, per temporary)
+_elementBudget = 2 ** 22
+
+
+class PhotonDatabase:
+    """The pMC photon database of a baseline simulation as NumPy arrays."""
+
+    def __init__(self, x, y, weight, pathLength, collisions, mua, mus, musp, n):
+        self.X = x
+        self.Y = y
+        self.Weight = weight
+        # shape (photons, tissue regions)
+        self.PathLength = pathLength
+        self.Collisions = collisions
+        # absorption, scattering and reduced scattering coefficients of the baseline, per tissue region
+        self.Mua = mua
+        self.Mus = mus
+        self.Musp = musp
+        # number of photons launched in the baseline
+        self.N = n
+
+    def save(self, path):
+        """Write the database to an .npz file."""
+        np.savez(path, x=self.X, y=self.Y, weight=self.Weight, pathLength=self.PathLength,
+                 collisions=self.Collisions, mua=self.Mua, mus=self.Mus, musp=self.Musp, n=self.N)
+
+    @classmethod
+    def load(cls, path):
+        """Read a database written by save."""
+        with np.load(path) as data:
+            return cls(data['x'], data['y'], data['weight'], data['pathLength'], data['collisions'],
+                       data['mua'], data['mus'], data['musp'], int(data['n']))
+
+    def weight_factors(self, mua, mus, regions, photons=slice(None), out=None):
+        """Return the reweighting factors of the photons, shape (photons, perturbation sets).
+
+        mua and mus are (perturbation sets, len(regions)) coefficients of the
+        perturbed regions; the other regions keep their baseline values. The
+        factors are written to out when given, without other arrays of that size.
+        """
+        referenceMua = self.Mua[regions]
+        referenceMus = self.Mus[regions]
+        logScatteringRatio = np.log(mus / referenceMus)
+        attenuationChange = (mua + mus) - (referenceMua + referenceMus)
+        # c log(mus'/mus) - L (mut' - mut) as one product, computed straight into out
+        counts = np.concatenate([self.Collisions[photons][:, regions], self.PathLength[photons][:, regions]], axis=1)
+        coefficients = np.concatenate([logScatteringRatio, -attenuationChange], axis=1)
+        exponent = np.matmul(counts, coefficients.T, out=out)
+        return np.exp(exponent, out=exponent)
+
+    def r_of_rho(self, rhos, mua, musp, regions=(1,), g=None):
+        """Return R(rho) for every perturbation set, shape (perturbation sets, len(rhos) - 1).
+
+        rhos are the bin edges. mua and musp are scalars, (sets,) arrays for one
+        perturbed region or (sets, len(regions)) arrays; regions are tissue
+        region indices, 1 being the first layer below the air. g defaults to
+        the baseline anisotropy of each region and only converts musp to mus.
+        Bins are normalized as the ROfRho detector does, by 2 pi rho dRho N
+        with rho the bin midpoint.
+        """
+        regions = list(regions)
+        mua, musp = np.broadcast_arrays(np.atleast_1d(np.asarray(mua, dtype=float)),
+                                        np.atleast_1d(np.asarray(musp, dtype=float)))
+        if mua.ndim == 1:
+            mua, musp = mua[:, None], musp[:, None]
+        if mua.shape[1] != len(regions):
+            raise ValueError("mua and musp have %d columns for %d regions" % (mua.shape[1], len(regions)))
+        # the baseline g of each region unless given
+        baselineG = 1 - self.Musp[regions] / self.Mus[regions] if g is None else np.asarray(g, dtype=float)
+        mus = musp / (1 - baselineG)
+        rhos = np.asarray(rhos, dtype=float)
+        bins = np.searchsorted(rhos, np.hypot(self.X, self.Y), side='right') - 1
+        inside = np.flatnonzero((bins >= 0) & (bins < len(rhos) - 1))
+        # photons sorted by bin, so each block's bin sums are one reduceat
+        inside = inside[np.argsort(bins[inside], kind='stable')]
+        sums = np.zeros((len(rhos) - 1, len(mua)))
+        blockSize = max(1, _elementBudget // len(mua))
+        factors = np.empty((min(blockSize, len(inside)), len(mua)))
+        for start in range(0, len(inside), blockSize):
+            block = inside[start:start + blockSize]
+            weighted = self.weight_factors(mua, mus, regions, block, factors[:len(block)])
+            weighted *= self.Weight[block, None]
+            blockBins = bins[block]
+            starts = np.flatnonzero(np.r_[True, blockBins[1:] != blockBins[:-1]])
+            sums[blockBins[starts]] += np.add.reduceat(weighted, starts, axis=0)
+        midpoints = 0.5 * (rhos[:-1] + rhos[1:])
+        return (sums / (2 * np.pi * midpoints * np.diff(rhos) * self.N)[:, None]).T
+
+
+def _region_properties(simulationInput):
+    """Return the mua, mus and musp of every tissue region of a SimulationInput."""
+    regions = list(simulationInput.Tissue.Regions)
+    ops = [region.RegionOP for region in regions]
+    return (np.array([op.Mua for op in ops]), np.array([op.Mus for op in ops]),
+            np.array([op.Musp for op in ops]))
+
+
+def read_database(folder, simulationInput):
+    """Read the pMC database written by a baseline run of simulationInput under folder."""
+    from Vts.MonteCarlo.PhotonData import pMCDatabase
+
+    def find(name):
+        paths = glob.glob(os.path.join(folder, '**', name), recursive=True)
+        if not paths:
+            raise FileNotFoundError("no %s under %s; was the simulation run with the pMC database?" % (name, folder))
+        return paths[0]
+
+    database = pMCDatabase.FromFile(find('DiffuseReflectanceDatabase'), find('CollisionInfoDatabase'))
+    x, y, weight, pathLength, collisions = [], [], [], [], []
+    # one pass over the photons; the database is a stream, not an array
+    for dataPoint in database.DataPoints:
+        photon = dataPoint.PhotonDataPoint
+        x.append(photon.Position.X)
+        y.append(photon.Position.Y)
+        weight.append(photon.Weight)
+        pathLength.append([info.PathLength for info in dataPoint.CollisionInfo])
+        collisions.append([info.NumberOfCollisions for info in dataPoint.CollisionInfo])
+    mua, mus, musp = _region_properties(simulationInput)
+    regionCount = len(mua)
+    return PhotonDatabase(np.array(x), np.array(y), np.array(weight),
+                          np.array(pathLength, dtype=float).reshape(-1, regionCount),
+                          np.array(collisions, dtype=float).reshape(-1, regionCount), mua, mus, musp,
+                          simulationInput.N)
+
+
+def run_baseline(simulationInput, folder=None, weightingType='Continuous'):
+    """Run the baseline simulation with the pMC database and return its PhotonDatabase.
+
+    The database files are written to folder, a temporary folder removed
+    afterwards by default. simulationInput itself is not changed; the run uses
+    a copy with the absorption weighting and the pMC database set.
+    """
+    from Vts.MonteCarlo import AbsorptionWeightingType, DatabaseType, MonteCarloSimulation
+    from System.Collections.Generic import List
+    if weightingType not in ('Continuous', 'Discrete'):
+        raise ValueError("pMC needs Continuous or Discrete absorption weighting, not %s" % weightingType)
+    if folder is None:
+        with tempfile.TemporaryDirectory() as temporaryFolder:
+            return run_baseline(simulationInput, temporaryFolder, weightingType)
+    simulationInput = simulation_input_from_json(simulation_input_to_json(simulationInput))
+    simulationInput.Options.AbsorptionWeightingType = getattr(AbsorptionWeightingType, weightingType)
+    databases = List[DatabaseType]()
+    databases.Add(DatabaseType.pMCDiffuseReflectance)
+    simulationInput.Options.Databases = databases
+    simulation = MonteCarloSimulation(simulationInput)
+    simulation.SetOutputPathForDatabases(folder)
+    simulation.Run()
+    return read_database(folder, simulationInput)
@@ -0,0 +1,144 @@
+import json
+import os
+import shutil
+import numpy as np
+from monte_carlo_tools import DetectorResult, SimulationResults, simulation_input_from_json, simulation_input_to_json
+from simulation_cache import detector_axes
+
+# Detector results stored on disk as a directory of .npy files, so large
+# tallies such as FluenceOfRhoAndZ or the time-resolved detectors can be
+# opened as memory maps and sliced without reading them whole or re-running
+# the simulation:
+#
+#   results/
+#     metadata.json            N, format version and the detectors with their shapes
+#     simulation-input.json    the SimulationInput in the VTS JSON format
+#     FluenceOfRhoAndZ/
+#       Mean.npy
+#       SecondMoment.npy
+#       axes/Rho.npy           bin edges of each detector axis
+#       axes/Z.npy
+#
+# Plain .npy is used rather than HDF5 or Zarr so that no dependency beyond
+# NumPy is needed and every array can be memory mapped; the price is that the
+# files are not compressed, which memory mapping rules out anyway.
+#
+#   save_results('results', simulationResults, simulationInput)
+#   stored = load_results('results')
+#   block = stored.ResultsDictionary['FluenceOfRhoAndZ'].Mean[:10, :50]   # reads only these rows
+
+# version of the directory layout written by save_results
+FORMAT_VERSION = 1
+
+_arrayNames = ('Mean', 'SecondMoment')
+
+
+class StoredResults(SimulationResults):
+    """SimulationResults opened from disk; the detector arrays are memory maps unless loaded."""
+
+    def __init__(self, path, resultsDictionary, n, metadata):
+        super().__init__(resultsDictionary, n)
+        self.Path = path
+        self.Metadata = metadata
+
+    def simulation_input_json(self):
+        """Return the stored SimulationInput in the VTS JSON format, or None if none was saved."""
+        inputPath = os.path.join(self.Path, 'simulation-input.json')
+        if not os.path.exists(inputPath):
+            return None
+        with open(inputPath, encoding='utf-8') as inputFile:
+            return inputFile.read()
+
+    def simulation_input(self):
+        """Return the stored SimulationInput as a VTS object, or None if none was saved."""
+        json = self.simulation_input_json()
+        return None if json is None else simulation_input_from_json(json)
+
+
+def _check_name(name):
+    if not name or name in ('.', '..') or '/' in name or '\\' in name:
+        raise ValueError("detector name %r cannot be used as a folder name" % name)
+
+
+def save_results(path, simulationResults, simulationInput=None, overwrite=False):
+    """Write SimulationResults to the directory path and return path.
+
+    With a SimulationInput, it is stored alongside and supplies the bin edges
+    of detectors whose Axes are empty. An existing directory is only replaced
+    with overwrite=True; it is renamed aside and deleted once the new one is in
+    place, so it is never half deleted and is missing only between two renames.
+    """
+    path = os.path.abspath(path)
+    if os.path.exists(path) and not overwrite:
+        raise FileExistsError("%s already exists; pass overwrite=True to replace it" % path)
+    inputJson = None if simulationInput is None else simulation_input_to_json(simulationInput)
+    inputAxes = {} if inputJson is None else detector_axes(json.loads(inputJson))
+    metadata = {'format': FORMAT_VERSION, 'N': int(simulationResults.N), 'detectors': {}}
+    # write next to the target first so readers never see a partial directory
+    temporaryPath = path + '.%d.tmp' % os.getpid()
+    shutil.rmtree(temporaryPath, ignore_errors=True)
+    os.makedirs(temporaryPath)
+    try:
+        for name, detector in simulationResults.ResultsDictionary.items():
+            _check_name(name)
+            detectorPath = os.path.join(temporaryPath, name)
+            os.makedirs(os.path.join(detectorPath, 'axes'))
+            entry = {'TallyCount': int(detector.TallyCount), 'arrays': {}, 'axes': []}
+            for arrayName in _arrayNames:
+                values = getattr(detector, arrayName)
+                if values is not None:
+                    values = np.ascontiguousarray(values)
+                    np.save(os.path.join(detectorPath, arrayName + '.npy'), values)
+                    entry['arrays'][arrayName] = {'shape': list(values.shape), 'dtype': values.dtype.str}
+            for axisName, edges in (detector.Axes or inputAxes.get(name, {})).items():
+                np.save(os.path.join(detectorPath, 'axes', axisName + '.npy'), np.asarray(edges))
+                entry['axes'].append(axisName)
+            metadata['detectors'][name] = entry
+        if inputJson is not None:
+            with open(os.path.join(temporaryPath, 'simulation-input.json'), 'w', encoding='utf-8') as inputFile:
+                inputFile.write(inputJson)
+        with open(os.path.join(temporaryPath, 'metadata.json'), 'w', encoding='utf-8') as metadataFile:
+            json.dump(metadata, metadataFile, indent=2)
+        if os.path.exists(path):
+            # a directory cannot be replaced by a rename, so move the old one aside first
+            oldPath = path + '.%d.old' % os.getpid()
+            shutil.rmtree(oldPath, ignore_errors=True)
+            os.replace(path, oldPath)
+            try:
+                os.replace(temporaryPath, path)
+            except BaseException:
+                os.replace(oldPath, path)
+                raise
+            # readers may still have the old arrays mapped; they keep working on POSIX
+            shutil.rmtree(oldPath, ignore_errors=True)
+        else:
+            os.replace(temporaryPath, path)
+    except BaseException:
+        shutil.rmtree(temporaryPath, ignore_errors=True)
+        raise
+    return path
+
+
+def load_results(path, mmap_mode='r', detectors=None):
+    """Open results written by save_results.
+
+    The Mean and SecondMoment arrays are memory maps opened with mmap_mode
+    (None reads them into memory); detectors limits the result to those names.
+    """
+    with open(os.path.join(path, 'metadata.json'), encoding='utf-8') as metadataFile:
+        metadata = json.load(metadataFile)
+    if metadata.get('format') != FORMAT_VERSION:
+        raise ValueError("%s has format %s, expected %d" % (path, metadata.get('format'), FORMAT_VERSION))
+    resultsDictionary = {}
+    for name, entry in metadata['detectors'].items():
+        if detectors is not None and name not in detectors:
+            continue
+        detectorPath = os.path.join(path, name)
+        arrays = {arrayName: np.load(os.path.join(detectorPath, arrayName + '.npy'), mmap_mode=mmap_mode)
+                  for arrayName in entry['arrays']}
+        # bin edges are small, so they are always read into memory
+        axes = {axisName: np.load(os.path.join(detectorPath, 'axes', axisName + '.npy'))
+                for axisName in entry['axes']}
+        resultsDictionary[name] = DetectorResult(name, arrays.get('Mean'), arrays.get('SecondMoment'),
+                                                 entry['TallyCount'], axes)
+    return StoredResults(os.path.abspath(path), resultsDictionary, metadata['N'], metadata)
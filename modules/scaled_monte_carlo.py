@@ -0,0 +1,132 @@
+import numpy as np
+
+# Scaled white Monte Carlo R(rho) in NumPy. One Monte Carlo simulation of an
+# absorption-free semi-infinite tissue with reduced scattering musp0 tallies
+# R(rho, t). Because lengths scale with 1/musp and absorption only multiplies
+# each photon by exp(-mua v t), R(rho) of any (mua, musp) with the same g and
+# n follows from that baseline as
+#
+#   R(rho) = s^2 sum over t of R0(rho s, t) exp(-mua v t / s) dt,   s = musp / musp0
+#
+# with v = c / n the speed of light in the tissue and R0 interpolated linearly
+# in rho. This is the scaling NurbsForwardSolver fits, evaluated directly from
+# the stored baseline for whole arrays of optical properties, so inversions
+# get Monte Carlo accuracy at about the cost of an analytic model.
+#
+#   model = ScaledMonteCarloROfRhoModel.from_simulation(photons=10 ** 6)   # once; save() and load() it
+#   reflectance = model(mua, musp, rhos)   # shape (number of rhos, number of wavelengths)
+
+# speed of light in vacuum [mm/ns]
+SPEED_OF_LIGHT = 299.792458
+
+
+class ScaledMonteCarloROfRhoModel:
+    """R(rho) forward model for inversion_tools scaled from an absorption-free Monte Carlo R(rho, t)."""
+
+    def __init__(self, rhos, times, reflectance, musp=1.0, g=0.8, n=1.4):
+        # bin edges of the baseline [mm] and [ns]
+        self.rhos = np.asarray(rhos, dtype=float)
+        self.times = np.asarray(times, dtype=float)
+        # baseline R(rho, t) [mm-2 ns-1] per rho and time bin at mua=0 and musp
+        self.reflectance = np.asarray(reflectance, dtype=float)
+        self.musp = musp
+        self.g = g
+        self.n = n
+        self._rhoMidpoints = 0.5 * (self.rhos[:-1] + self.rhos[1:])
+        self._timeMidpoints = 0.5 * (self.times[:-1] + self.times[1:])
+        self._timeWidths = np.diff(self.times)
+
+    @classmethod
+    def from_simulation(cls, photons=10 ** 6, rhoStop=60.0, rhoCount=601, timeStop=20.0, timeCount=2001,
+                        musp=1.0, g=0.8, n=1.4, processes=None, vtsPath=None):
+        """Run the baseline R(rho, t) simulation and return the model.
+
+        The rho bins must reach the largest rho * musp / musp0 the model is used
+        for; beyond them the model returns NaN. Runs in a pool of processes
+        unless processes=1, so scripts calling this must guard their top-level
+        code with if __name__ == "__main__".
+        """
+        from monte_carlo_tools import load_vts, run_parallel, run_simulation
+        load_vts(vtsPath)
+        from System import Array, Double
+        from Vts import OpticalProperties
+        from Vts.Common import DoubleRange
+        from Vts.MonteCarlo import (IDetectorInput, ITissueRegion, LayerTissueRegion, MultiLayerTissueInput,
+                                    ROfRhoAndTimeDetectorInput, SimulationInput)
+        detectorInput = ROfRhoAndTimeDetectorInput()
+        detectorInput.Rho = DoubleRange(start=0, stop=rhoStop, number=rhoCount)
+        detectorInput.Time = DoubleRange(start=0, stop=timeStop, number=timeCount)
+        detectorInput.Name = "ROfRhoAndTime"
+        detectors = Array.CreateInstance(IDetectorInput, 1)
+        detectors[0] = detectorInput
+        regions = Array.CreateInstance(ITissueRegion, 3)
+        regions[0] = LayerTissueRegion(zRange=DoubleRange(Double.NegativeInfinity, 0.0),
+                                       op=OpticalProperties(mua=0.0, musp=1E-10, g=1.0, n=1.0))
+        regions[1] = LayerTissueRegion(zRange=DoubleRange(0.0, 1E6),
+                                       op=OpticalProperties(mua=0.0, musp=musp, g=g, n=n))
+        regions[2] = LayerTissueRegion(zRange=DoubleRange(1E6, Double.PositiveInfinity),
+                                       op=OpticalProperties(mua=0.0, musp=1E-10, g=1.0, n=1.0))
+        simulationInput = SimulationInput()
+        simulationInput.N = photons
+        simulationInput.DetectorInputs = detectors
+        simulationInput.Tissue = MultiLayerTissueInput(regions)
+        if processes == 1:
+            simulationResults = run_simulation(simulationInput)
+        else:
+            simulationResults = run_parallel(simulationInput, processes, vtsPath=vtsPath)
+        reflectance = simulationResults.ResultsDictionary["ROfRhoAndTime"].Mean
+        return cls(np.linspace(0, rhoStop, rhoCount), np.linspace(0, timeStop, timeCount),
+                   reflectance.reshape(rhoCount - 1, timeCount - 1), musp, g, n)
+
+    def save(self, path):
+        """Write the baseline to a .npz file."""
+        np.savez(path, rhos=self.rhos, times=self.times, reflectance=self.reflectance, musp=self.musp,
+                 g=self.g, n=self.n)
+
+    @classmethod
+    def load(cls, path):
+        """Read a baseline written by save."""
+        with np.load(path) as data:
+            return cls(data['rhos'], data['times'], data['reflectance'], float(data['musp']), float(data['g']),
+                       float(data['n']))
+
+    def _scaled(self, mua, musp, rhos, derivatives):
+        """Return R(rho) and, with derivatives, dR/dmua and dR/dmusp, each (number of rhos, number of wavelengths)."""
+        mua = np.atleast_1d(np.asarray(mua, dtype=float))
+        musp = np.atleast_1d(np.asarray(musp, dtype=float))
+        rhos = np.atleast_1d(np.asarray(rhos, dtype=float))
+        scale = musp / self.musp
+        scaledRhos = rhos[:, np.newaxis] * scale[np.newaxis, :]
+        midpoints = self._rhoMidpoints
+        right = np.clip(np.searchsorted(midpoints, scaledRhos), 1, len(midpoints) - 1)
+        left = right - 1
+        spacing = midpoints[right] - midpoints[left]
+        weight = (scaledRhos - midpoints[left]) / spacing
+        # R0(rho s, t) for every rho, wavelength and time, shape (rhos, wavelengths, times)
+        baseline = ((1 - weight)[..., np.newaxis] * self.reflectance[left]
+                    + weight[..., np.newaxis] * self.reflectance[right])
+        speed = SPEED_OF_LIGHT / self.n
+        timeFactor = speed * self._timeMidpoints[np.newaxis, :] / scale[:, np.newaxis]
+        attenuation = np.exp(-mua[:, np.newaxis] * timeFactor) * self._timeWidths[np.newaxis, :]
+        reflectance = scale ** 2 * np.einsum('pwt,wt->pw', baseline, attenuation)
+        outside = (scaledRhos < midpoints[0]) | (scaledRhos > midpoints[-1])
+        reflectance[outside] = np.nan
+        if not derivatives:
+            return reflectance
+        dRdMua = -scale ** 2 * np.einsum('pwt,wt->pw', baseline, attenuation * timeFactor)
+        slope = (self.reflectance[right] - self.reflectance[left]) / spacing[..., np.newaxis]
+        # d/ds of s^2, of R0(rho s, t) and of exp(-mua v t / s)
+        dRdScale = (2 * reflectance / scale
+                    + scale ** 2 * rhos[:, np.newaxis] * np.einsum('pwt,wt->pw', slope, attenuation)
+                    + scale ** 2 * np.einsum('pwt,wt->pw', baseline, attenuation * timeFactor) * mua / scale)
+        dRdMua[outside] = np.nan
+        dRdScale[outside] = np.nan
+        return reflectance, dRdMua, dRdScale / self.musp
+
+    def __call__(self, mua, musp, rhos):
+        """Return R(rho) with shape (number of rhos, number of wavelengths)."""
+        return self._scaled(mua, musp, rhos, False)
+
+    def derivatives(self, mua, musp, rhos):
+        """Return R(rho) and its derivatives with respect to mua and musp, each (number of rhos, number of wavelengths)."""
+        return self._scaled(mua, musp, rhos, True)
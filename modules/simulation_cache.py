@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import numpy as np
+from monte_carlo_tools import (DetectorResult, SimulationResults, default_vts_path,
+                               get_results, simulation_input_to_json)
+
+# On-disk cache of Monte Carlo detector results keyed by a hash of the
+# SimulationInput. Each entry is one .npz file named by the hash; hits touch
+# the file so the least recently used entries can be evicted by modification
+# time once the cache grows past its size limit. Only runs with a fixed random
+# number seed are deterministic; runs with Options.Seed -1 are never cached.
+
+# SimulationInput fields that do not change the detector results
+_ignoredFields = ('OutputName',)
+# Options.Seed asking VTS for a different random sequence on every run
+_randomSeed = -1
+
+
+def _canonical_input(simulationInput):
+    """Return the SimulationInput as a dictionary with the result-neutral fields removed."""
+    canonical = json.loads(simulation_input_to_json(simulationInput))
+    for field in _ignoredFields:
+        canonical.pop(field, None)
+    return canonical
+
+
+def is_reproducible(simulationInput):
+    """Return whether a SimulationInput gives the same results every run, i.e. has a fixed seed."""
+    return int(simulationInput.Options.Seed) != _randomSeed
+
+
+def detector_axes(canonical):
+    """Return the bin edges of every detector input, e.g. {"ROfRho": {"Rho": edges}}."""
+    axes = {}
+    for detectorInput in canonical.get('DetectorInputs') or []:
+        axes[detectorInput['Name']] = {
+            key: np.linspace(value['Start'], value['Stop'], value['Count'])
+            for key, value in detectorInput.items()
+            if isinstance(value, dict) and {'Start', 'Stop', 'Count'} <= value.keys()}
+    return axes
+
+
+def vts_version(vtsPath=None):
+    """Return an identifier of the Vts.dll build: assembly version plus a hash of the file."""
+    from System.Reflection import AssemblyName
+    vtsPath = vtsPath or default_vts_path()
+    with open(vtsPath, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:16]
+    return "%s-%s" % (AssemblyName.GetAssemblyName(vtsPath).Version.ToString(), digest)
+
+
+class SimulationCache:
+    """Size-bounded LRU cache of SimulationResults on disk, invalidated when Vts.dll changes."""
+
+    def __init__(self, directory=None, maxBytes=2 * 1024 ** 3, vtsPath=None):
+        self.directory = os.path.abspath(directory or os.path.join(
+            os.path.dirname(__file__), '..', 'cache', 'monte-carlo'))
+        self.maxBytes = maxBytes
+        self.version = vts_version(vtsPath)
+        os.makedirs(self.directory, exist_ok=True)
+        # results from another build of the library are not trusted
+        versionFile = os.path.join(self.directory, 'vts-version.txt')
+        cachedVersion = None
+        if os.path.exists(versionFile):
+            with open(versionFile) as f:
+                cachedVersion = f.read()
+        if cachedVersion != self.version:
+            self.invalidate()
+            with open(versionFile, 'w') as f:
+                f.write(self.version)
+
+    def key(self, simulationInput):
+        """Return the content hash identifying a SimulationInput."""
+        canonical = json.dumps(_canonical_input(simulationInput), sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256((self.version + canonical).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def _entries(self):
+        """Return (path, size, last use) of every cached entry."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((os.path.join(self.directory, name), stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, simulationInput):
+        """Return the cached SimulationResults for a SimulationInput, or None on a miss or a random seed."""
+        if not is_reproducible(simulationInput):
+            return None
+        path = self._path(self.key(simulationInput))
+        if not os.path.exists(path):
+            return None
+        # mark the entry as recently used
+        os.utime(path)
+        with np.load(path) as data:
+            resultsDictionary = {}
+            for name in json.loads(str(data['names'])):
+                prefix = name + '/'
+                axes = {key[len(prefix + 'axes/'):]: data[key] for key in data.files
+                        if key.startswith(prefix + 'axes/')}
+                secondMoment = data[prefix + 'SecondMoment'] if prefix + 'SecondMoment' in data.files else None
+                resultsDictionary[name] = DetectorResult(name, data[prefix + 'Mean'], secondMoment,
+                                                         int(data[prefix + 'TallyCount']), axes)
+            return SimulationResults(resultsDictionary, int(data['N']))
+
+    def put(self, simulationInput, simulationResults):
+        """Store the SimulationResults of a SimulationInput and evict entries over the size limit."""
+        if not is_reproducible(simulationInput):
+            raise ValueError("results of a SimulationInput with Options.Seed=-1 are random and cannot be cached; "
+                             "set an explicit seed")
+        canonical = _canonical_input(simulationInput)
+        axes = detector_axes(canonical)
+        arrays = {'N': simulationResults.N, 'names': json.dumps(list(simulationResults.ResultsDictionary))}
+        for name, detector in simulationResults.ResultsDictionary.items():
+            arrays[name + '/Mean'] = detector.Mean
+            arrays[name + '/TallyCount'] = detector.TallyCount
+            if detector.SecondMoment is not None:
+                arrays[name + '/SecondMoment'] = detector.SecondMoment
+            for axisName, edges in (detector.Axes or axes.get(name, {})).items():
+                arrays[name + '/axes/' + axisName] = edges
+        # write to a temporary file first so readers never see a partial entry
+        path = self._path(self.key(simulationInput))
+        temporaryPath = path + '.%d.tmp' % os.getpid()
+        with open(temporaryPath, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temporaryPath, path)
+        self.evict()
+
+    def run(self, simulationInput, runner=None):
+        """Return cached results for a SimulationInput, running and storing the simulation on a miss.
+
+        runner takes the SimulationInput and returns SimulationResults, e.g.
+        monte_carlo_tools.run_parallel; by default the simulation runs in this process.
+        Inputs with a random seed (Options.Seed=-1) always run and are not stored.
+        """
+        simulationResults = self.get(simulationInput)
+        if simulationResults is not None:
+            return simulationResults
+        if runner is None:
+            from Vts.MonteCarlo import MonteCarloSimulation
+            simulationResults = get_results(MonteCarloSimulation(simulationInput).Run(), simulationInput.N)
+        else:
+            simulationResults = runner(simulationInput)
+        if is_reproducible(simulationInput):
+            self.put(simulationInput, simulationResults)
+        return simulationResults
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in maxBytes."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        totalBytes = sum(size for _, size, _ in entries)
+        while entries and totalBytes > self.maxBytes:
+            path, size, _ = entries.pop(0)
+            os.remove(path)
+            totalBytes -= size
+
+    def invalidate(self, simulationInput=None):
+        """Remove the entry of one SimulationInput, or every entry when none is given."""
+        if simulationInput is not None:
+            path = self._path(self.key(simulationInput))
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        for path, _, _ in self._entries():
+            os.remove(path)
+
+    def size(self):
+        """Return the total size in bytes of the cached entries."""
+        return sum(size for _, size, _ in self._entries())
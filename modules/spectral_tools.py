@@ -0,0 +1,61 @@
+import numpy as np
+
+# Vectorized calculation of optical properties from chromophore concentrations
+# and power law scatterer coefficients. The extinction table is read from VTS
+# once; everything after that is plain NumPy and works without the CLR, so the
+# tables can be handed to worker processes.
+
+
+def power_law_musp(A, b, wavelengths):
+    """Return musp = A*(wavelength/1000)^-b with shape broadcast(A, b) + (number of wavelengths,)."""
+    A = np.asarray(A, dtype=float)[..., np.newaxis]
+    b = np.asarray(b, dtype=float)[..., np.newaxis]
+    return A * (np.asarray(wavelengths, dtype=float) / 1000.0) ** -b
+
+
+class ChromophoreSpectra:
+    """Absorption per unit concentration of a set of chromophores at fixed wavelengths."""
+
+    def __init__(self, extinction, wavelengths, chromophoreNames=None):
+        # extinction[i, j] is mua at wavelengths[i] for unit concentration of chromophore j
+        self.extinction = np.asarray(extinction, dtype=float)
+        self.wavelengths = np.asarray(wavelengths, dtype=float)
+        self.chromophoreNames = chromophoreNames or [str(j) for j in range(self.extinction.shape[1])]
+
+    @classmethod
+    def from_vts(cls, chromophoreTypes, wavelengths):
+        """Read the extinction table of the given ChromophoreType values from the VTS spectral database."""
+        from System import Array
+        from Vts.SpectralMapping import ChromophoreAbsorber, IChromophoreAbsorber, PowerLawScatterer, Tissue
+        from array_tools import to_dotnet
+        netWavelengths = to_dotnet(wavelengths)
+        extinction = np.empty((len(netWavelengths), len(chromophoreTypes)))
+        for j, chromophoreType in enumerate(chromophoreTypes):
+            # mua is linear in concentration, so a tissue with unit concentration
+            # of a single chromophore gives its column of the table
+            chromophores = Array.CreateInstance(IChromophoreAbsorber, 1)
+            chromophores[0] = ChromophoreAbsorber(chromophoreType, 1.0)
+            ops = Tissue(chromophores, PowerLawScatterer(1.0, 1.0), "", n=1.4).GetOpticalProperties(netWavelengths)
+            extinction[:, j] = [op.Mua for op in ops]
+        return cls(extinction, wavelengths, [str(t) for t in chromophoreTypes])
+
+    def mua(self, concentrations):
+        """Return mua for concentrations of shape (..., number of chromophores) as (..., number of wavelengths)."""
+        return np.asarray(concentrations, dtype=float) @ self.extinction.T
+
+    def musp(self, A, b):
+        """Return the power law musp at the table wavelengths for arrays of A and b."""
+        return power_law_musp(A, b, self.wavelengths)
+
+    def optical_properties(self, concentrations, A, b):
+        """Return (mua, musp) arrays for batches of chromophore concentrations and scatterer coefficients."""
+        return self.mua(concentrations), self.musp(A, b)
+
+
+def to_optical_properties(mua, musp, g=0.8, n=1.4):
+    """Build a .NET OpticalProperties[] from 1-D mua and musp arrays for the VTS forward solvers."""
+    from System import Array
+    from Vts import OpticalProperties
+    mua, musp, g, n = np.broadcast_arrays(np.ravel(mua), np.ravel(musp), g, n)
+    return Array[OpticalProperties]([OpticalProperties(float(a), float(s), float(gi), float(ni))
+                                     for a, s, gi, ni in zip(mua, musp, g, n)])
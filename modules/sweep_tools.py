@@ -0,0 +1,166 @@
+import json
+import multiprocessing
+import os
+import numpy as np
+from monte_carlo_tools import load_vts
+
+# Parameter sweeps evaluated in a process pool and streamed into an array on
+# disk, so sweeps over thousands of combinations survive interruption. A sweep
+# is a function of named parameters returning an array of fixed shape, and a
+# grid of values per parameter; every combination is evaluated and stored at
+# its grid index in a directory:
+#
+#   sweep/
+#     sweep.json    the parameter grids, the fixed arguments, the function and the result shape
+#     values.npy    results, shape (len(grid 1), len(grid 2), ..., *result shape)
+#     done.npy      True where a combination has been evaluated
+#
+# Both arrays are .npy memory maps. Combinations are sent to the workers in
+# chunks; when a chunk is back its values are flushed to disk before its done
+# flags, so after a crash or Ctrl+C running the same sweep again evaluates
+# only what is missing. Open the results with open_sweep; values.npy can also
+# be memory mapped while the sweep is still running.
+#
+#   grids = {'thickness': [1, 2, 5], 'topMua': np.linspace(0.01, 0.1, 10), ...}
+#   values, done = two_layer_fluence_sweep('sweep', grids, rhos, zs)
+#   values[2, 0, ...]   # fluence(rho, z) for thickness 5 and the first topMua
+
+# two-layer parameters, in the order of the sweep axes
+TWO_LAYER_PARAMETERS = ('thickness', 'topMua', 'topMusp', 'bottomMua', 'bottomMusp')
+
+# function and fixed arguments shared by every chunk a worker process evaluates
+_workerFunction = None
+_workerArguments = None
+
+
+def _initialize_worker(vtsPath, function, arguments):
+    global _workerFunction, _workerArguments
+    load_vts(vtsPath)
+    _workerFunction, _workerArguments = function, arguments
+
+
+def _evaluate_chunk(chunk):
+    """Evaluate one chunk of (flat index, parameters) and return the indices and the stacked results."""
+    indices = [index for index, _ in chunk]
+    return indices, np.stack([_workerFunction(**parameters, **_workerArguments) for _, parameters in chunk])
+
+
+def _function_name(function):
+    return "%s:%s" % (function.__module__, function.__qualname__)
+
+
+def _describe(grids, function, arguments, shape):
+    """Return the sweep.json contents that must match for a sweep to be resumed."""
+    description = {'grids': {name: np.asarray(values).tolist() for name, values in grids.items()},
+                   'function': _function_name(function),
+                   'arguments': {name: np.asarray(value).tolist() if isinstance(value, np.ndarray) else value
+                                 for name, value in arguments.items()},
+                   'shape': list(shape)}
+    # round trip so it compares equal to the stored copy
+    return json.loads(json.dumps(description))
+
+
+def open_sweep(path, mmap_mode='r'):
+    """Return (description, values, done) of a sweep directory, the arrays as memory maps."""
+    with open(os.path.join(path, 'sweep.json'), encoding='utf-8') as descriptionFile:
+        description = json.load(descriptionFile)
+    return (description, np.load(os.path.join(path, 'values.npy'), mmap_mode=mmap_mode),
+            np.load(os.path.join(path, 'done.npy'), mmap_mode=mmap_mode))
+
+
+def _create_or_resume(path, description, gridShape, shape, dtype):
+    """Return the values and done memory maps of a sweep, creating its directory if needed."""
+    descriptionPath = os.path.join(path, 'sweep.json')
+    if os.path.exists(descriptionPath):
+        with open(descriptionPath, encoding='utf-8') as descriptionFile:
+            existing = json.load(descriptionFile)
+        if existing != description:
+            raise ValueError("%s holds a different sweep; use another path or delete it" % path)
+        _, values, done = open_sweep(path, mmap_mode='r+')
+        return values, done
+    os.makedirs(path, exist_ok=True)
+    values = np.lib.format.open_memmap(os.path.join(path, 'values.npy'), mode='w+', dtype=dtype,
+                                       shape=gridShape + tuple(shape))
+    done = np.lib.format.open_memmap(os.path.join(path, 'done.npy'), mode='w+', dtype=bool, shape=gridShape)
+    values.flush()
+    done.flush()
+    # written last, so a directory without it is never taken for a sweep to resume
+    with open(descriptionPath, 'w', encoding='utf-8') as descriptionFile:
+        json.dump(description, descriptionFile, indent=2)
+    return values, done
+
+
+def run_sweep(path, function, grids, shape, arguments=None, processes=None, chunkSize=16, dtype=float,
+              vtsPath=None, progress=None):
+    """Evaluate function(**parameters, **arguments) for every combination of the grids and return (values, done).
+
+    grids maps parameter names to their values, in the order of the result
+    axes; shape is the shape of one result; arguments are passed unchanged to
+    every call. function must be importable by the workers, which are spawned,
+    so scripts calling this must guard their top-level code with
+    if __name__ == "__main__". Combinations already done in path are skipped.
+    progress, if given, is called with (combinations done, total) after every
+    chunk.
+    """
+    arguments = arguments or {}
+    grids = {name: np.asarray(values) for name, values in grids.items()}
+    gridShape = tuple(len(values) for values in grids.values())
+    values, done = _create_or_resume(path, _describe(grids, function, arguments, shape), gridShape, shape, dtype)
+    flatValues = values.reshape((-1,) + tuple(shape))
+    flatDone = done.reshape(-1)
+    names = list(grids)
+    pending = np.flatnonzero(~flatDone)
+    chunks = []
+    for start in range(0, len(pending), chunkSize):
+        chunk = []
+        for index in pending[start:start + chunkSize]:
+            position = np.unravel_index(index, gridShape)
+            chunk.append((int(index), {name: grids[name][i].item() for name, i in zip(names, position)}))
+        chunks.append(chunk)
+
+    def store(indices, results):
+        flatValues[indices] = results
+        values.flush()
+        flatDone[indices] = True
+        done.flush()
+        if progress is not None:
+            progress(int(np.count_nonzero(flatDone)), flatDone.size)
+
+    if chunks:
+        processes = processes or os.cpu_count()
+        if processes == 1:
+            _initialize_worker(vtsPath, function, arguments)
+            for chunk in chunks:
+                store(*_evaluate_chunk(chunk))
+        else:
+            # the CLR does not survive fork, so always start fresh interpreters
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(min(processes, len(chunks)), initializer=_initialize_worker,
+                              initargs=(vtsPath, function, arguments)) as pool:
+                for results in pool.imap_unordered(_evaluate_chunk, chunks):
+                    store(*results)
+    return values, done
+
+
+def two_layer_fluence(thickness, topMua, topMusp, bottomMua, bottomMusp, rhos, zs, g=0.8, n=1.4,
+                      sourceConfiguration='Distributed'):
+    """Return the TwoLayerSDAForwardSolver fluence (number of rhos, number of zs) of one parameter combination."""
+    from vts_worker import layered_fluence_of_rho_and_z
+    layers = [(0, thickness, topMua, topMusp, g, n), (thickness, float('inf'), bottomMua, bottomMusp, g, n)]
+    return layered_fluence_of_rho_and_z(layers, rhos, zs, sourceConfiguration=sourceConfiguration)
+
+
+def two_layer_fluence_sweep(path, grids, rhos, zs, g=0.8, n=1.4, **options):
+    """Sweep the two-layer SDA fluence(rho, z) over grids of the TWO_LAYER_PARAMETERS.
+
+    grids maps each of thickness, topMua, topMusp, bottomMua and bottomMusp to
+    its values; the result axes follow TWO_LAYER_PARAMETERS and then rho and
+    z. Other keyword arguments are passed to run_sweep.
+    """
+    missing = set(TWO_LAYER_PARAMETERS) - set(grids)
+    if missing:
+        raise ValueError("missing grids for %s" % ", ".join(sorted(missing)))
+    rhos = np.asarray(rhos, dtype=float)
+    zs = np.asarray(zs, dtype=float)
+    return run_sweep(path, two_layer_fluence, {name: grids[name] for name in TWO_LAYER_PARAMETERS},
+                     (len(rhos), len(zs)), {'rhos': rhos, 'zs': zs, 'g': g, 'n': n}, **options)
@@ -0,0 +1,117 @@
+import importlib
+import importlib.util
+import os
+import sys
+
+# One place to start VTS from a script. Importing this module is cheap: the
+# CoreCLR runtime is loaded and Vts.dll referenced only on first use, and VTS
+# types are resolved one by one instead of with the wildcard imports of every
+# namespace, so scripts only pay for the types they use:
+#
+#   import sys
+#   sys.path.append('../modules')
+#   from vts_bootstrap import OpticalProperties, PointSourceSDAForwardSolver
+#
+# Names are looked up first in System and then in the namespaces the scripts
+# used to import with "from ... import *", later namespaces shadowing earlier
+# ones as they did there. Python packages that are slow to import, such as
+# plotly, matplotlib and scipy, can be deferred with lazy_import.
+
+# environment variable with the path of Vts.dll, or of the folder containing it
+VTS_PATH_VARIABLE = 'VTS_PATH'
+
+_vtsNamespaces = (
+    'Vts.IO',
+    'Vts',
+    'Vts.Common',
+    'Vts.Extensions',
+    'Vts.Modeling.Optimizers',
+    'Vts.Modeling.ForwardSolvers',
+    'Vts.SpectralMapping',
+    'Vts.Factories',
+    'Vts.MonteCarlo',
+    'Vts.MonteCarlo.Sources',
+    'Vts.MonteCarlo.Tissues',
+    'Vts.MonteCarlo.Detectors',
+    'Vts.MonteCarlo.Factories',
+    'Vts.MonteCarlo.PhotonData',
+    'Vts.MonteCarlo.PostProcessing',
+)
+
+# paths of the assemblies referenced so far
+_references = set()
+
+
+def find_vts(vtsPath=None):
+    """Return the absolute path of Vts.dll.
+
+    vtsPath may be the library or the folder containing it. Without it the
+    VTS_PATH environment variable, the libraries folder of this repository and
+    libraries folders next to and above the working directory are tried in turn.
+    """
+    candidates = [vtsPath, os.environ.get(VTS_PATH_VARIABLE),
+                  os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'libraries'),
+                  'libraries', os.path.join('..', 'libraries')]
+    tried = []
+    for candidate in candidates:
+        if not candidate:
+            continue
+        if not candidate.lower().endswith('.dll'):
+            candidate = os.path.join(candidate, 'Vts.dll')
+        candidate = os.path.abspath(candidate)
+        if os.path.isfile(candidate):
+            return candidate
+        if candidate not in tried:
+            tried.append(candidate)
+        # an explicit path that does not exist is an error, not a hint
+        if vtsPath:
+            break
+    raise FileNotFoundError("Vts.dll was not found (tried %s); copy the VTS libraries into the libraries folder "
+                            "as described in libraries/readme.txt or set %s" % (", ".join(tried), VTS_PATH_VARIABLE))
+
+
+def load(vtsPath=None):
+    """Load the CoreCLR runtime once and add the reference to Vts.dll; return the path of the library.
+
+    Without vtsPath, a library that is already loaded is used as it is.
+    """
+    if vtsPath is None and _references:
+        return next(iter(_references))
+    path = find_vts(vtsPath)
+    if path not in _references:
+        # pythonnet.load does nothing once a runtime is loaded
+        from pythonnet import load as load_runtime
+        load_runtime('coreclr')
+        import clr
+        clr.AddReference(path)
+        _references.add(path)
+    return path
+
+
+def lazy_import(name):
+    """Return the module name, which is executed on first attribute access instead of now."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError("No module named %r" % name, name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def __getattr__(name):
+    # module attribute hook (PEP 562): resolve VTS and System types on first use
+    if name.startswith('__'):
+        raise AttributeError(name)
+    load()
+    for namespace in ('System',) + _vtsNamespaces[::-1]:
+        module = importlib.import_module(namespace)
+        value = getattr(module, name, None)
+        if value is not None:
+            globals()[name] = value
+            return value
+    raise AttributeError("no VTS or System type named %r" % name)
@@ -0,0 +1,348 @@
+import importlib
+import multiprocessing
+import os
+import queue
+import sys
+import tempfile
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+import numpy as np
+from vts_bootstrap import load
+
+# Long-lived worker processes that keep Vts.dll loaded and JIT-warm, so batch
+# pipelines pay the CLR startup, assembly load and JIT cost once instead of
+# per job. A worker listens on a Unix socket (a named pipe on Windows) and
+# runs jobs sent by a WorkerClient: the request is (job name, args, kwargs) and
+# the reply is ("ok", result) or ("error", traceback), pickled by
+# multiprocessing.connection so NumPy arrays travel as arrays. Jobs are the
+# functions registered with @job below, or any importable "module:function".
+#
+# Jobs are unpickled, so every connection must present the worker's
+# authentication key; Unix sockets are also created in a private directory.
+# Start workers from a script with VtsWorker or WorkerPool, which own their
+# processes, or keep one running across scripts from a terminal:
+#
+#   VTS_WORKER_AUTHKEY=<secret> python vts_worker.py /tmp/vts-worker.sock
+#
+# and connect with WorkerClient('/tmp/vts-worker.sock') from a process with the
+# same VTS_WORKER_AUTHKEY. Without it the worker generates a key and prints it.
+
+# environment variable with the key shared by a worker started from the command line and its clients
+AUTHKEY_VARIABLE = 'VTS_WORKER_AUTHKEY'
+
+# jobs by name
+_jobs = {}
+
+
+class WorkerError(RuntimeError):
+    """A job raised an exception in the worker; the message is the remote traceback."""
+
+
+def job(function):
+    """Register a function as a job that clients can call by name."""
+    _jobs[function.__name__] = function
+    return function
+
+
+def default_authkey():
+    """Return the authentication key from the VTS_WORKER_AUTHKEY environment variable, or None."""
+    key = os.environ.get(AUTHKEY_VARIABLE)
+    return key.encode() if key else None
+
+
+def new_address():
+    """Return an unused local address: a named pipe on Windows, a Unix socket in a new 0700 directory elsewhere."""
+    name = 'vts-worker-%d-%s' % (os.getpid(), os.urandom(4).hex())
+    if sys.platform == 'win32':
+        return r'\\.\pipe\%s' % name
+    return os.path.join(tempfile.mkdtemp(prefix='vts-worker-'), name + '.sock')
+
+
+# per-worker state kept warm between jobs
+_forwardSolvers = {}
+_models = {}
+
+
+def _forward_solver(solverName):
+    if solverName not in _forwardSolvers:
+        import Vts.Modeling.ForwardSolvers as forwardSolvers
+        _forwardSolvers[solverName] = getattr(forwardSolvers, solverName)()
+    return _forwardSolvers[solverName]
+
+
+@job
+def ping():
+    """Return the process id of the worker."""
+    return os.getpid()
+
+
+@job
+def r_of_rho(mua, musp, rhos, solverName='PointSourceSDAForwardSolver', g=0.8, n=1.4):
+    """Return R(rho) with shape (number of rhos, number of optical property sets)."""
+    from array_tools import to_numpy
+    from spectral_tools import to_optical_properties
+    solver = _forward_solver(solverName)
+    ops = to_optical_properties(np.atleast_1d(mua), np.atleast_1d(musp), g, n)
+    return np.array([to_numpy(solver.ROfRho(ops, float(rho))) for rho in np.atleast_1d(rhos)])
+
+
+@job
+def r_of_fx(mua, musp, fxs, solverName='PointSourceSDAForwardSolver', g=0.8, n=1.4):
+    """Return R(fx) with shape (number of fxs, number of optical property sets)."""
+    from array_tools import to_numpy
+    from spectral_tools import to_optical_properties
+    solver = _forward_solver(solverName)
+    ops = to_optical_properties(np.atleast_1d(mua), np.atleast_1d(musp), g, n)
+    return np.array([to_numpy(solver.ROfFx(ops, float(fx))) for fx in np.atleast_1d(fxs)])
+
+
+@job
+def layered_fluence_of_rho_and_z(layers, rhos, zs, solverName='TwoLayerSDAForwardSolver',
+                                 sourceConfiguration='Distributed'):
+    """Return the fluence of a layered forward solver with shape (number of rhos, number of zs).
+
+    layers is a list of (zStart, zStop, mua, musp, g, n), top layer first; use
+    float('inf') as the zStop of the bottom layer.
+    """
+    from Vts.Modeling.ForwardSolvers import SourceConfiguration
+    from fluence_tools import layered_fluence_batch
+    solver = _forward_solver(solverName)
+    solver.SourceConfiguration = getattr(SourceConfiguration, sourceConfiguration)
+    return layered_fluence_batch(solver, [layers], rhos, zs)[0]
+
+
+@job
+def monte_carlo(simulationInputJson):
+    """Run a simulation given as VTS JSON and return its SimulationResults."""
+    from Vts.MonteCarlo import MonteCarloSimulation
+    from monte_carlo_tools import get_results, simulation_input_from_json
+    simulationInput = simulation_input_from_json(simulationInputJson)
+    return get_results(MonteCarloSimulation(simulationInput).Run(), simulationInput.N)
+
+
+@job
+def fit_r_of_fx(measured, spectra, fxs, initialGuess, solverName='PointSourceSDAForwardSolver', **options):
+    """Fit one R(fx) spectrum with a VTS forward solver and return the least_squares result."""
+    from inversion_tools import VtsROfFxModel, fit_r_of_fx as fit
+    if solverName not in _models:
+        _models[solverName] = VtsROfFxModel(solverName)
+    return fit(measured, spectra, fxs, _models[solverName], initialGuess, **options)
+
+
+def _warm_up():
+    """Run each forward job once on small inputs so the first real job does not pay the JIT cost."""
+    r_of_rho([0.01], [1.0], [1.0])
+    r_of_fx([0.01], [1.0], [0.0])
+    layered_fluence_of_rho_and_z([(0, 5, 0.1, 1, 0.8, 1.4), (5, float('inf'), 0.01, 1, 0.8, 1.4)], [1.0], [1.0])
+
+
+def _resolve(jobName):
+    if jobName in _jobs:
+        return _jobs[jobName]
+    moduleName, separator, functionName = jobName.partition(':')
+    if not separator:
+        raise KeyError("unknown job %r; register it with @job or pass 'module:function'" % jobName)
+    return getattr(importlib.import_module(moduleName), functionName)
+
+
+def _send(connection, reply):
+    """Send a reply, or an error reply if it cannot be pickled; return False if the client is gone."""
+    try:
+        # Connection.send pickles the whole reply before writing, so a failed pickle sends nothing
+        connection.send(reply)
+    except (EOFError, OSError):
+        return False
+    except Exception:
+        try:
+            connection.send(('error', traceback.format_exc()))
+        except (EOFError, OSError):
+            return False
+    return True
+
+
+def _handle(connection):
+    """Run the jobs sent over one connection until the client closes it; return False on shutdown.
+
+    Failures of one request, including requests that do not unpickle and
+    results that do not pickle, are replied as errors; a client that hangs up
+    only ends its own connection.
+    """
+    while True:
+        try:
+            request = connection.recv()
+        except (EOFError, OSError):
+            return True
+        except Exception:
+            if not _send(connection, ('error', traceback.format_exc())):
+                return True
+            continue
+        try:
+            jobName, args, kwargs = request
+            if jobName is None:
+                _send(connection, ('ok', None))
+                return False
+            reply = ('ok', _resolve(jobName)(*args, **kwargs))
+        except Exception:
+            reply = ('error', traceback.format_exc())
+        if not _send(connection, reply):
+            return True
+
+
+def serve(address, authkey=None, vtsPath=None, warmUp=True, ready=None):
+    """Load VTS and run jobs from clients, one connection at a time, until a client asks to shut down.
+
+    authkey is required: named pipes get no access control and requests are
+    unpickled, so the key is what keeps other users from running code here.
+    """
+    if not authkey:
+        raise ValueError("a VTS worker needs an authentication key")
+    load(vtsPath)
+    if warmUp:
+        _warm_up()
+    family = 'AF_PIPE' if sys.platform == 'win32' else 'AF_UNIX'
+    # create the socket owner-only rather than chmod it after bind
+    oldUmask = os.umask(0o177) if family == 'AF_UNIX' else None
+    try:
+        listener = Listener(address, family, authkey=authkey)
+    finally:
+        if oldUmask is not None:
+            os.umask(oldUmask)
+    with listener:
+        if ready is not None:
+            ready.set()
+        running = True
+        while running:
+            try:
+                connection = listener.accept()
+            except (OSError, multiprocessing.AuthenticationError):
+                continue
+            with connection:
+                running = _handle(connection)
+    folder = os.path.dirname(address)
+    if family == 'AF_UNIX' and os.path.basename(folder).startswith('vts-worker-'):
+        # the private directory made by new_address; the listener removed the socket
+        try:
+            os.rmdir(folder)
+        except OSError:
+            pass
+
+
+class WorkerClient:
+    """Connection to a running worker."""
+
+    def __init__(self, address, authkey=None):
+        self.address = address
+        self._connection = Client(address, authkey=authkey if authkey is not None else default_authkey())
+
+    def call(self, jobName, *args, **kwargs):
+        """Run a job in the worker and return its result; raise WorkerError if the job failed."""
+        self._connection.send((jobName, args, kwargs))
+        status, result = self._connection.recv()
+        if status == 'error':
+            raise WorkerError(result)
+        return result
+
+    def shutdown(self):
+        """Ask the worker to exit once this request is answered."""
+        self._connection.send((None, (), {}))
+        self._connection.recv()
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class VtsWorker:
+    """A worker process started and owned by this process.
+
+    Workers are spawned, so scripts using them must guard their top-level code
+    with if __name__ == "__main__".
+    """
+
+    def __init__(self, vtsPath=None, address=None, warmUp=True):
+        self.address = address or new_address()
+        self.authkey = os.urandom(32)
+        # the CLR does not survive fork, so always start a fresh interpreter
+        context = multiprocessing.get_context('spawn')
+        ready = context.Event()
+        self.process = context.Process(target=serve, args=(self.address, self.authkey, vtsPath, warmUp, ready),
+                                       daemon=True)
+        self.process.start()
+        while not ready.wait(0.1):
+            if not self.process.is_alive():
+                raise RuntimeError("VTS worker exited with code %s during startup" % self.process.exitcode)
+
+    def client(self):
+        """Return a new WorkerClient connected to this worker."""
+        return WorkerClient(self.address, self.authkey)
+
+    def stop(self):
+        """Shut the worker down and wait for it to exit; close its other clients first."""
+        if self.process.is_alive():
+            self.client().shutdown()
+        self.process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class WorkerPool:
+    """A pool of warm workers running jobs concurrently, one job per worker at a time."""
+
+    def __init__(self, size=None, vtsPath=None, warmUp=True):
+        self.workers = [VtsWorker(vtsPath, warmUp=warmUp) for _ in range(size or os.cpu_count())]
+        self._clients = queue.Queue()
+        for worker in self.workers:
+            self._clients.put(worker.client())
+        self._executor = ThreadPoolExecutor(len(self.workers))
+
+    def _call(self, jobName, args, kwargs):
+        client = self._clients.get()
+        try:
+            return client.call(jobName, *args, **kwargs)
+        finally:
+            self._clients.put(client)
+
+    def submit(self, jobName, *args, **kwargs):
+        """Queue a job and return a concurrent.futures.Future of its result."""
+        return self._executor.submit(self._call, jobName, args, kwargs)
+
+    def map(self, jobName, argsList):
+        """Run a job once per tuple of positional arguments and return the results in order."""
+        return [future.result() for future in [self.submit(jobName, *args) for args in argsList]]
+
+    def close(self):
+        """Wait for queued jobs and shut every worker down."""
+        self._executor.shutdown()
+        while not self._clients.empty():
+            self._clients.get().close()
+        for worker in self.workers:
+            worker.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    # python vts_worker.py [address] keeps a worker running until a client calls shutdown
+    workerAddress = sys.argv[1] if len(sys.argv) > 1 else new_address()
+    workerAuthkey = default_authkey()
+    if workerAuthkey is None:
+        workerAuthkey = os.urandom(16).hex().encode()
+        print("%s is not set; clients must set %s=%s" % (AUTHKEY_VARIABLE, AUTHKEY_VARIABLE, workerAuthkey.decode()),
+              flush=True)
+    print("starting VTS worker on %s" % workerAddress, flush=True)
+    serve(workerAddress, workerAuthkey)
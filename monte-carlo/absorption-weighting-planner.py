@@ -0,0 +1,63 @@
+# This is an example of python code using VTS to plan a Monte Carlo simulation
+# of R(rho). Short pilot simulations are run with Analog, Discrete (DAW) and
+# Continuous (CAW) absorption weighting, and the efficiency figure of merit
+# 1/(RE^2 time) of each is used to pick the weighting type and the number of
+# photons that reach the target median relative error in the least wall time.
+# The production simulation is then run split across all cores with that
+# configuration and its relative error is plotted.
+#
+import sys
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (lazy_import, Array, Double, DoubleRange, IDetectorInput, ITissueRegion, LayerTissueRegion,
+                           MultiLayerTissueInput, OpticalProperties, ROfRhoDetectorInput, SimulationInput)
+go = lazy_import('plotly.graph_objects')
+from array_tools import to_numpy
+from graph_tools import show
+from monte_carlo_tools import relative_error, run_planned
+
+# worker processes re-import this script, so only run the simulations in the main process
+if __name__ == "__main__":
+    # Setup the detector input for the simulation
+    detectorRange = DoubleRange(start=0, stop=10, number=101)
+    detectorInput = ROfRhoDetectorInput()
+    detectorInput.Rho = detectorRange
+    detectorInput.TallySecondMoment = True
+    detectorInput.Name = "ROfRho"
+    detectors = Array.CreateInstance(IDetectorInput, 1)
+    detectors[0] = detectorInput
+
+    # Setup the tissue input for the simulation
+    regions = Array.CreateInstance(ITissueRegion, 3)
+    regions[0] = LayerTissueRegion(zRange=DoubleRange(Double.NegativeInfinity, 0.0), op=OpticalProperties(mua=0.0, musp=1E-10, g=1.0, n=1.0)) # air
+    regions[1] = LayerTissueRegion(zRange=DoubleRange(0.0, 100.0), op=OpticalProperties(mua=0.01, musp=1.0, g=0.8, n=1.4)) # tissue
+    regions[2] = LayerTissueRegion(zRange=DoubleRange(100.0, Double.PositiveInfinity), op=OpticalProperties(mua=0.0, musp=1E-10, g=1.0, n=1.0)) # air
+
+    simulationInput = SimulationInput()
+    simulationInput.DetectorInputs = detectors
+    simulationInput.Tissue = MultiLayerTissueInput(regions)
+
+    # plan with pilot runs of 10000 photons, then run the production simulation
+    targetRelativeError = 0.01
+    plan, simulationResults = run_planned(simulationInput, targetRelativeError, pilotN=10000, statistic='median')
+    print("%-12s %10s %12s %14s" % ("weighting", "time [s]", "median RE", "FOM [1/s]"))
+    for weightingType, pilot in plan.Pilots.items():
+        if pilot.Error is not None:
+            print("%-12s not supported: %s" % (weightingType, pilot.Error))
+        else:
+            print("%-12s %10.3f %12.4f %14.1f" % (weightingType, pilot.Seconds, pilot.RelativeErrors["ROfRho"],
+                                                 pilot.figure_of_merit()["ROfRho"]))
+    print("planned: %s weighting with N=%d, predicted %.1f s in one process" % (
+          plan.AbsorptionWeightingType, plan.N, plan.PredictedSeconds))
+
+    # plot the relative error of the production run against the target
+    relativeErrors = relative_error(simulationResults.ResultsDictionary["ROfRho"], simulationResults.N)
+    print("achieved median relative error: %.4f" % np.nanmedian(relativeErrors))
+    detectorMidpoints = to_numpy(detectorRange)
+    chart = go.Figure()
+    chart.add_trace(go.Scatter(x=detectorMidpoints, y=relativeErrors, mode='markers', name=plan.AbsorptionWeightingType))
+    chart.add_hline(y=targetRelativeError, line_dash="dash")
+    chart.update_layout(title="Relative error of R(ρ) with N=%d" % plan.N, xaxis_title="ρ [mm]", yaxis_title="relative error")
+    show(chart)
@@ -4,32 +4,20 @@
 # reflectance using Analog versus Continuous Absorption Weighting (CAW) i
 # simulations. 
 #
-# Import the Operating System so we can access the files for the VTS library
-from pythonnet import load
-load('coreclr')
-import clr
-import os
-import time
-file = '../libraries/Vts.dll'
-clr.AddReference(os.path.abspath(file))
+import sys
+module_path = '../modules'
+sys.path.append(module_path)
 import numpy as np
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from Vts import *
-from Vts.Common import *
-from Vts.Extensions import *
-from Vts.Modeling.Optimizers import *
-from Vts.Modeling.ForwardSolvers import *
-from Vts.SpectralMapping import *
-from Vts.Factories import *
-from Vts.MonteCarlo import *
-from Vts.MonteCarlo.Sources import *
-from Vts.MonteCarlo.Tissues import *
-from Vts.MonteCarlo.Detectors import *
-from Vts.MonteCarlo.Factories import *
-from Vts.MonteCarlo.PhotonData import *
-from Vts.MonteCarlo.PostProcessing import *
-from System import Array, Object, Double
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (lazy_import, AbsorptionWeightingType, Array, Double, DoubleRange, IDetectorInput,
+                           ITissueRegion, LayerTissueRegion, MonteCarloSimulation, MultiLayerTissueInput,
+                           OpticalProperties, ROfRhoDetector, ROfRhoDetectorInput, SimulationInput,
+                           SimulationOptions)
+go = lazy_import('plotly.graph_objects')
+subplots = lazy_import('plotly.subplots')
+from graph_tools import show
+from array_tools import to_numpy
+from instrumentation_tools import recording, stage
 # Setup the values for the Analog and CAW simulations and plot the results
 # Setup the detector input for the simulation
 detectorRange = DoubleRange(start=0, stop=10, number=101)
@@ -70,37 +58,33 @@ simulationInput2.Tissue = MultiLayerTissueInput(regions)
 simulation1 = MonteCarloSimulation(simulationInput1)
 simulation2 = MonteCarloSimulation(simulationInput2)
 
-# run the simulations
-start_time = time.time()
-simulationOutput1 = simulation1.Run()
-end_time = time.time()
-elapsed_time = end_time - start_time
-print(f"Elapsed time Analog: {elapsed_time:.6f} seconds")
-start_time = time.time()
-simulationOutput2 = simulation2.Run()
-end_time = time.time()
-elapsed_time = end_time - start_time
-print(f"Elapsed time CAW: {elapsed_time:.6f} seconds")
+# run the simulations, recording the elapsed time and photons per second of each
+with recording() as recorder:
+    with stage('Run Analog', photons=simulationInput1.N):
+        simulationOutput1 = simulation1.Run()
+    with stage('Run CAW', photons=simulationInput2.N):
+        simulationOutput2 = simulation2.Run()
+recorder.print_summary()
 
 # determine standard deviation and plot the results using Plotly
 detectorResults1 = Array.CreateInstance(ROfRhoDetector,1)
 detectorResults1[0] = simulationOutput1.ResultsDictionary["ROfRho"]
-Reflectance1 = [r for r in detectorResults1[0].Mean]
-SecondMoment1 = [s for s in detectorResults1[0].SecondMoment]
+Reflectance1 = to_numpy(detectorResults1[0].Mean)
+SecondMoment1 = to_numpy(detectorResults1[0].SecondMoment)
 StandardDeviation1 = np.sqrt((SecondMoment1 - np.multiply(Reflectance1, Reflectance1)) / simulationInput1.N)
 RelativeError1 = np.divide(StandardDeviation1, Reflectance1)
-detectorMidpoints1 = [mp for mp in detectorRange]
+detectorMidpoints1 = to_numpy(detectorRange)
 
 detectorResults2 = Array.CreateInstance(ROfRhoDetector,1)
 detectorResults2[0] = simulationOutput2.ResultsDictionary["ROfRho"]
-Reflectance2 = [r for r in detectorResults2[0].Mean]
-SecondMoment2 = [s for s in detectorResults2[0].SecondMoment]
+Reflectance2 = to_numpy(detectorResults2[0].Mean)
+SecondMoment2 = to_numpy(detectorResults2[0].SecondMoment)
 StandardDeviation2 = np.sqrt((SecondMoment2 - np.multiply(Reflectance2, Reflectance2)) / simulationInput2.N)
 RelativeError2 = np.divide(StandardDeviation2, Reflectance2)
-detectorMidpoints2 = [mp for mp in detectorRange]
+detectorMidpoints2 = to_numpy(detectorRange)
 
 # plot reflectance with 1-sigma error bars and relative error difference
-chart = make_subplots(rows=2, cols=1)
+chart = subplots.make_subplots(rows=2, cols=1)
 xLabel = "ρ [mm]"
 yLabel = "log(R(ρ)) [mm-2]"
 # reflectance with 1-sigma error bars: omit last data point because includes reflectance beyond last rho bin
@@ -117,4 +101,4 @@ chart['layout']['yaxis2']['title']='Analog RE - CAW RE'
 chart['layout']['xaxis2']['title']=xLabel
 chart['layout']['xaxis2']['range']=[0,10]
 
-chart.show(renderer="browser")
+show(chart)
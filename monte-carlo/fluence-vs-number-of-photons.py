@@ -3,34 +3,20 @@
 # Goal: This exercise explores how fluence estimates change with the 
 # number of photons simulated. 
 # 
-# Import the Operating System so we can access the files for the VTS library
-from pythonnet import load
-load('coreclr')
-import clr
-import os
-file = '../libraries/Vts.dll'
-clr.AddReference(os.path.abspath(file))
+import sys
+module_path = '../modules'
+sys.path.append(module_path)
 import numpy as np
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (lazy_import, AbsorptionWeightingType, Array, DirectionalPointSourceInput, Double,
+                           DoubleRange, FluenceOfRhoAndZDetectorInput, IDetectorInput, ITissueRegion,
+                           LayerTissueRegion, MultiLayerTissueInput, OpticalProperties, SimulationInput,
+                           SimulationOptions)
 # use matplotlib.pyplot
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-from Vts import *
-from Vts.Common import *
-from Vts.Extensions import *
-from Vts.Modeling.Optimizers import *
-from Vts.Modeling.ForwardSolvers import *
-from Vts.SpectralMapping import *
-from Vts.Factories import *
-from Vts.MonteCarlo import *
-from Vts.MonteCarlo.Sources import *
-from Vts.MonteCarlo.Tissues import *
-from Vts.MonteCarlo.Detectors import *
-from Vts.MonteCarlo.Factories import *
-from Vts.MonteCarlo.PhotonData import *
-from Vts.MonteCarlo.PostProcessing import *
-from System import Array, Object, Double, Math
+mpl = lazy_import('matplotlib')
+plt = lazy_import('matplotlib.pyplot')
+from graph_tools import show
+from monte_carlo_tools import run_incremental, relative_error
 # Setup the detector input for the simulation
 rhoStart = 0
 rhoStop = 10  # [mm]
@@ -72,33 +58,29 @@ title = "log(Φ(ρ,z)) [mm-2]"
 # ignore divide by zero warning when calculating relative error
 np.seterr(divide='ignore', invalid='ignore')
 
+simulationOptions = SimulationOptions()
+simulationOptions.AbsorptionWeightingType = AbsorptionWeightingType.Analog  # variation: set to Discrete
+# create a SimulationInput object to define the simulation
+simulationInput = SimulationInput()
+simulationInput.N = nPhot[-1]
+simulationInput.OutputName = "MonteCarloFluence"
+simulationInput.DetectorInputs = detectors
+simulationInput.Options = simulationOptions
+simulationInput.Tissue = MultiLayerTissueInput(regions)
+# run the photons in batches so each N adds to the photons of the previous one
+# and a snapshot of the accumulated tallies is taken after every batch
+batchSizes = np.diff([0] + nPhot).tolist()
+snapshots = list(run_incremental(simulationInput, batchSizes))
+
 for i in range(0, len(nPhot)):
-  simulationOptions = SimulationOptions()
-  simulationOptions.AbsorptionWeightingType = AbsorptionWeightingType.Analog  # variation: set to Discrete
-  # create a SimulationInput object to define the simulation
-  simulationInput = SimulationInput()
-  simulationInput.N = nPhot[i]
-  simulationInput.OutputName = "MonteCarloFluence"
-  simulationInput.DetectorInputs = detectors
-  simulationInput.Options = simulationOptions
-  simulationInput.Tissue = MultiLayerTissueInput(regions)
-  # create the simulations
-  simulation = MonteCarloSimulation(simulationInput)
-  # run the simulations
-  simulationOutput = simulation.Run()
-  # determine standard deviation and plot the results using Plotly
-  detectorResults = Array.CreateInstance(FluenceOfRhoAndZDetector, 1)
-  detectorResults[0] = simulationOutput.ResultsDictionary["FluenceOfRhoAndZ"]
-  Fluence = Array.CreateInstance(FluenceOfRhoAndZDetector, 1)
-  RelativeError = Array.CreateInstance(FluenceOfRhoAndZDetector, 1)
-  FluenceArray[i] = [f for f in detectorResults[0].Mean]
-  SecondMoment = [s for s in detectorResults[0].SecondMoment]
-  StandardDeviation = np.sqrt((SecondMoment - np.multiply(FluenceArray[i], FluenceArray[i]) / simulationInput.N))
-  RelativeErrorArray[i] = np.divide(StandardDeviation, FluenceArray[i])
+  # determine relative error from the accumulated tallies of the first nPhot[i] photons
+  detectorResults = snapshots[i].ResultsDictionary["FluenceOfRhoAndZ"]
+  FluenceArray[i] = detectorResults.Mean.ravel()
+  RelativeErrorArray[i] = relative_error(detectorResults, snapshots[i].N).ravel()
 
   # plot fluence as a function of N, number of photons simulated
   # plot log of fluence and mirror fluence(rho,z) about rho=0 axis
-  logFluence = [Math.Log(f) for f in FluenceArray[i]]
+  logFluence = np.log(FluenceArray[i])
   # Convert to .NET array
   rhoDelta = detectorRhoRange.GetDelta()
   rhos = rhoStart + rhoDelta * np.arange(rhoCount - 1)
@@ -106,7 +88,7 @@ for i in range(0, len(nPhot)):
   allRhos = np.concatenate((-rhos[::-1], rhos))
   zDelta = detectorZRange.GetDelta()
   zs = zStart + zDelta * np.arange(zCount - 1)
-  fluenceRowsToPlot = np.array([logFluence[i:i+len(zs)] for i in range(0, len(logFluence), len(zs))])
+  fluenceRowsToPlot = logFluence.reshape(-1, len(zs))
 
   colormap=mpl.colormaps['magma']
   cbar_ticks = [-6, -4, -2, 0]
@@ -158,8 +140,7 @@ title = "relerror(Φ(ρ,z))"
 
 for i in range(0, len(nPhot)):
   # plot fluence relative error and mirror about rho=0 axis
-  relativeError = [r for r in RelativeErrorArray[i]]
-  relativeErrorRowsToPlot = np.array([relativeError[i:i+len(zs)] for i in range(0, len(relativeError), len(zs))])
+  relativeErrorRowsToPlot = RelativeErrorArray[i].reshape(-1, len(zs))
 
   colormap=mpl.colormaps['magma']
   cbar_ticks = [0.0, 0.5, 1.0]
@@ -198,5 +179,5 @@ for i in range(0, len(nPhot)):
     axes[1,1].text(10, 90, 'N=10000')
     cbar = fig.colorbar(im3, cmap=colormap, location='right', shrink=0.6, pad=0.05)
 
-plt.show()
+show()
 
@@ -0,0 +1,72 @@
+# This is an example of python code using VTS to compute R(rho) for many optical
+# properties from one Monte Carlo simulation with perturbation Monte Carlo
+# (pMC). A baseline simulation with continuous absorption weighting stores the
+# pMC photon database, and R(rho) for a sweep of 1000 absorption coefficients
+# at three scattering coefficients is computed by reweighting its photons. One
+# of the perturbed cases is checked against a full simulation.
+#
+import sys
+import time
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (lazy_import, Array, Double, DoubleRange, IDetectorInput, ITissueRegion, LayerTissueRegion,
+                           MultiLayerTissueInput, OpticalProperties, ROfRhoDetectorInput, SimulationInput)
+go = lazy_import('plotly.graph_objects')
+from graph_tools import show
+from monte_carlo_tools import run_simulation
+from perturbation_tools import run_baseline
+
+
+def simulation_input(mua, musp, n):
+    """Return a SimulationInput of a semi-infinite tissue with R(rho) detected at 0 to 10 mm."""
+    detectorInput = ROfRhoDetectorInput()
+    detectorInput.Rho = DoubleRange(start=0, stop=10, number=101)
+    detectorInput.Name = "ROfRho"
+    detectors = Array.CreateInstance(IDetectorInput, 1)
+    detectors[0] = detectorInput
+    regions = Array.CreateInstance(ITissueRegion, 3)
+    regions[0] = LayerTissueRegion(zRange=DoubleRange(Double.NegativeInfinity, 0.0), op=OpticalProperties(mua=0.0, musp=1E-10, g=1.0, n=1.0)) # air
+    regions[1] = LayerTissueRegion(zRange=DoubleRange(0.0, 100.0), op=OpticalProperties(mua=mua, musp=musp, g=0.8, n=1.4)) # tissue
+    regions[2] = LayerTissueRegion(zRange=DoubleRange(100.0, Double.PositiveInfinity), op=OpticalProperties(mua=0.0, musp=1E-10, g=1.0, n=1.0)) # air
+    simulationInput = SimulationInput()
+    simulationInput.N = n
+    simulationInput.DetectorInputs = detectors
+    simulationInput.Tissue = MultiLayerTissueInput(regions)
+    return simulationInput
+
+
+rhos = np.linspace(0, 10, 101)
+rhoMidpoints = 0.5 * (rhos[:-1] + rhos[1:])
+photonCount = 100000
+
+# one baseline simulation at mua=0.01, musp=1
+start_time = time.perf_counter()
+photons = run_baseline(simulation_input(0.01, 1.0, photonCount))
+print(f"baseline with {len(photons.Weight)} reflected photons: {time.perf_counter() - start_time:.1f} seconds")
+
+# R(rho) for 1000 absorption coefficients at each of three scattering coefficients
+muas = np.geomspace(0.001, 0.1, 1000)
+start_time = time.perf_counter()
+reflectance = {musp: photons.r_of_rho(rhos, muas, musp) for musp in [0.8, 1.0, 1.2]}
+print(f"pMC sweep of {3 * len(muas)} optical properties: {time.perf_counter() - start_time:.2f} seconds")
+
+# check one perturbed case against a full simulation
+checkMua, checkMusp = muas[500], 1.2
+start_time = time.perf_counter()
+simulated = run_simulation(simulation_input(checkMua, checkMusp, photonCount)).ResultsDictionary["ROfRho"].Mean
+print(f"one full simulation: {time.perf_counter() - start_time:.1f} seconds")
+perturbed = reflectance[checkMusp][500]
+with np.errstate(divide='ignore', invalid='ignore'):
+    print("median relative difference pMC vs MC for rho < 5 mm: %.3f" % np.nanmedian(
+          np.abs(perturbed - simulated)[rhoMidpoints < 5] / simulated[rhoMidpoints < 5]))
+
+chart = go.Figure()
+chart.add_trace(go.Scatter(x=rhoMidpoints, y=simulated, mode='markers', name="MC mua=%.4f musp=%.1f" % (checkMua, checkMusp)))
+for index in [0, 500, 999]:
+    chart.add_trace(go.Scatter(x=rhoMidpoints, y=reflectance[checkMusp][index], mode='lines',
+                               name="pMC mua=%.4f musp=%.1f" % (muas[index], checkMusp)))
+chart.update_layout(title="R(ρ) by perturbation Monte Carlo", xaxis_title="ρ [mm]", yaxis_title="R(ρ) [mm-2]")
+chart.update_yaxes(type="log")
+show(chart)
@@ -1,35 +1,19 @@
 # This is an example of python code using VTS to plot R(rho) using MCCL
 #
-# Import the Operating System so we can access the files for the VTS library
-from pythonnet import load
-load('coreclr')
-import clr
-import os
-file = '../libraries/Vts.dll'
-print('Does this filepath exist?', os.path.isfile(file))
-clr.AddReference(os.path.abspath(file))
-
-print('Import numpy')
-import numpy as np
-print('Import pyplot')
-import matplotlib.pyplot as plt
+import sys
+module_path = '../modules'
+sys.path.append(module_path)
+
 print('Import Vts')
-from Vts import *
-from Vts.Common import *
-from Vts.Extensions import *
-from Vts.Modeling.Optimizers import *
-from Vts.Modeling.ForwardSolvers import *
-from Vts.SpectralMapping import *
-from Vts.Factories import *
-from Vts.MonteCarlo import *
-from Vts.MonteCarlo.Sources import *
-from Vts.MonteCarlo.Tissues import *
-from Vts.MonteCarlo.Detectors import *
-from Vts.MonteCarlo.Factories import *
-from Vts.MonteCarlo.PhotonData import *
-from Vts.MonteCarlo.PostProcessing import *
-print('Import System')
-from System import Array, Double
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (lazy_import, Array, Double, DoubleRange, IDetectorInput, ITissueRegion,
+                           LayerTissueRegion, MonteCarloSimulation, MultiLayerTissueInput, OpticalProperties,
+                           RDiffuseDetector, RDiffuseDetectorInput, ROfRhoDetector, ROfRhoDetectorInput,
+                           RSpecularDetector, RSpecularDetectorInput, SimulationInput, TDiffuseDetector,
+                           TDiffuseDetectorInput)
+plt = lazy_import('matplotlib.pyplot')
+from array_tools import to_numpy
+from graph_tools import show
 
 # SimulationInput defines the simulation. I think the default is collimated point source illumination normal to the surface.
 simulationInput = SimulationInput()
@@ -86,8 +70,8 @@ print(" diffuse T = %.5f" % tDiffuse[0].Mean)
 detectorResults = Array.CreateInstance(ROfRhoDetector, 1)
 detectorResults[0] = simulationOutput.ResultsDictionary["ROfRho"]
 
-reflectance = np.array([r for r in detectorResults[0].Mean])
-edges = np.array([mp for mp in detectorResults[0].Rho])[:-1]
+reflectance = to_numpy(detectorResults[0].Mean)
+edges = to_numpy(detectorResults[0].Rho)[:-1]
 
 plt.figure(figsize=(8,4.5))
 plt.plot(edges, reflectance, 'ob', markersize=2)
@@ -108,4 +92,4 @@ plt.text(0.8, 0.90, r'$\mu_a$=%.2f mm⁻¹' % mua, **text_args)
 plt.text(0.8, 0.85, r"${\mu_s}'$=%.2f mm⁻¹" % musp, **text_args)
 plt.text(0.8, 0.80, 'g=%.2f' % g, **text_args)
 plt.text(0.8, 0.75, 'd=%.1f mm' % d, **text_args)
-plt.show()
\ No newline at end of file
+show()
\ No newline at end of file
@@ -0,0 +1,53 @@
+# This is an example of python code using VTS to plot R(rho) using MCCL with the
+# photons split across all cores. Each worker process runs a shard of the photons
+# with its own random number seed and the Mean and SecondMoment tallies are merged
+# into the result of one large simulation.
+#
+import sys
+import time
+module_path = '../modules'
+sys.path.append(module_path)
+import numpy as np
+# Import the VTS bootstrap, which locates Vts.dll and loads the runtime on first use
+from vts_bootstrap import (lazy_import, Array, DoubleRange, IDetectorInput, ROfRhoDetectorInput,
+                           SimulationInput)
+go = lazy_import('plotly.graph_objects')
+from array_tools import to_numpy
+from graph_tools import show
+from monte_carlo_tools import run_parallel
+
+# worker processes re-import this script, so only run the simulation in the main process
+if __name__ == "__main__":
+    # Setup the detector input for the simulation
+    detectorRange = DoubleRange(start=0, stop=40, number=201)
+    detectorInput = ROfRhoDetectorInput()
+    detectorInput.Rho = detectorRange
+    detectorInput.TallySecondMoment = True
+    detectorInput.Name = "ROfRho"
+    detectors = Array.CreateInstance(IDetectorInput,1)
+    detectors[0] = detectorInput
+
+    simulationInput = SimulationInput()
+    simulationInput.N = 1000000
+    simulationInput.DetectorInputs = detectors
+
+    # run the simulation split across all cores
+    start_time = time.time()
+    simulationResults = run_parallel(simulationInput)
+    elapsed_time = time.time() - start_time
+    print(f"Elapsed time: {elapsed_time:.6f} seconds")
+
+    # plot the results using Plotly
+    reflectance = simulationResults.ResultsDictionary["ROfRho"].Mean
+    secondMoment = simulationResults.ResultsDictionary["ROfRho"].SecondMoment
+    standardDeviation = np.sqrt((secondMoment - reflectance * reflectance) / simulationResults.N)
+    detectorMidpoints = to_numpy(detectorRange)
+
+    xLabel = "ρ [mm]"
+    yLabel = "log(R(ρ)) [mm-2]"
+
+    chart = go.Figure()
+    chart.add_trace(go.Scatter(x=detectorMidpoints, y=reflectance, error_y=dict(type='data', array=standardDeviation, visible=True), mode='markers'))
+    chart.update_layout( title="log(R(ρ)) [mm-2]", xaxis_title=xLabel, yaxis_title=yLabel)
+    chart.update_yaxes(type="log")
+    show(chart)